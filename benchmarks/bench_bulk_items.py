@@ -0,0 +1,76 @@
+# Time to create N items one POST /items/ at a time and with POST /items/bulk.
+#
+#   PYTHONPATH=. python benchmarks/bench_bulk_items.py --items 500
+#
+# Requests go straight to the ASGI app over httpx, so the numbers are the
+# routers, the ORM and the database without a network in between.
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+
+# Read by the settings the routers load at import time; replaced in run()
+os.environ.setdefault("SQLDB_URL", "sqlite+aiosqlite://")
+
+from rubhew import config, main, models, security
+
+
+async def populate():
+    async with models.new_session() as session:
+        user = models.DBUser(
+            username="seller", email="seller@bench.local", password="x",
+            first_name="Firstname", last_name="Lastname",
+        )
+        category = models.Category(name_category="Bench", category_image="img")
+        tags = [models.Tags(name_tags=f"tag{i}") for i in range(10)]
+        session.add_all([user, category, *tags])
+        await session.commit()
+        return user.id, category.id_category, [tag.id_tags for tag in tags]
+
+
+def payloads(count, category_id, tag_ids):
+    return [
+        dict(
+            name_item=f"Item {i}", description="Benchmark item", price=i,
+            category_id=category_id, tags=tag_ids[i % 3: i % 3 + 3],
+            detail={"condition": "used"},
+        )
+        for i in range(count)
+    ]
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(), "bench-bulk.db")
+    settings = config.Settings(SQLDB_URL=f"sqlite+aiosqlite:///{path}", THUMBNAIL_WORKERS=0)
+    app = main.create_app(settings)
+    models.engine.echo = False
+    await models.recreate_table()
+    user_id, category_id, tag_ids = await populate()
+
+    token = security.create_access_token(data={"sub": user_id})
+    headers = {"Authorization": f"Bearer {token}"}
+    items = payloads(args.items, category_id, tag_ids)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        started = time.perf_counter()
+        for item in items:
+            (await client.post("/items/", json=item, headers=headers)).raise_for_status()
+        single = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for start in range(0, len(items), args.batch):
+            response = await client.post("/items/bulk", json=items[start:start + args.batch], headers=headers)
+            response.raise_for_status()
+        bulk = time.perf_counter() - started
+
+    for name, elapsed in (("single", single), ("bulk", bulk)):
+        print(f"{name:>6}  {elapsed * 1000:>8.1f} ms  {args.items / elapsed:>8.0f} items/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=500)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,134 @@
+# Memory of one worker per idle GET /events connection, and the time for one
+# request event to reach all of them.
+#
+#   PYTHONPATH=. python benchmarks/bench_event_connections.py --connections 2000
+#
+# The app runs in a uvicorn subprocess (one worker) so that its resident
+# memory can be read from /proc; the connections are opened from this
+# process with plain sockets. The event is sent by POST /requests/ for an
+# item of the connected user, so the time includes the request itself.
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+# Read by the settings the routers load at import time; replaced in run()
+os.environ.setdefault("SQLDB_URL", "sqlite+aiosqlite://")
+
+from rubhew import config, models, security
+
+
+async def populate(url):
+    models.init_db(config.Settings(SQLDB_URL=url))
+    models.engine.echo = False
+    await models.recreate_table()
+    async with models.new_session() as session:
+        owner = models.DBUser(
+            username="owner", email="owner@bench.local", password="x",
+            first_name="Firstname", last_name="Lastname",
+        )
+        buyer = models.DBUser(
+            username="buyer", email="buyer@bench.local", password="x",
+            first_name="Firstname", last_name="Lastname",
+        )
+        category = models.Category(name_category="Bench", category_image="img")
+        session.add_all([owner, buyer, category])
+        await session.commit()
+        item = models.Item(
+            name_item="Item", description="Benchmark item", price=1,
+            category_id=category.id_category, id_user=owner.id,
+        )
+        session.add(item)
+        await session.commit()
+        ids = owner.id, buyer.id, item.id_item
+    await models.close_session()
+    return ids
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def resident_kb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+
+async def open_stream(port, token):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET /events HTTP/1.1\r\nHost: bench\r\nAuthorization: Bearer {token}\r\n\r\n".encode()
+    )
+    await writer.drain()
+    await reader.readuntil(b"retry: 5000\n\n")  # Subscribed
+    return reader, writer
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(), "bench-events.db")
+    url = f"sqlite+aiosqlite:///{path}"
+    owner_id, buyer_id, item_id = await populate(url)
+    owner_token = security.create_access_token(data={"sub": owner_id})
+    buyer_token = security.create_access_token(data={"sub": buyer_id})
+
+    port = free_port()
+    # The asyncio loop: aiosqlite's thread never wakes uvloop once gevent has
+    # patched threading (rubhew.main)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--factory", "rubhew.main:create_app",
+         "--loop", "asyncio", "--port", str(port), "--log-level", "warning"],
+        env=dict(os.environ, SQLDB_URL=url, THUMBNAIL_WORKERS="0"),
+        stdout=subprocess.DEVNULL,
+    )
+    streams = []
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            for _ in range(100):
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            baseline = resident_kb(server.pid)
+
+            for start in range(0, args.connections, 100):
+                streams += await asyncio.gather(*(
+                    open_stream(port, owner_token) for _ in range(min(100, args.connections - start))
+                ))
+            await asyncio.sleep(1)
+            connected = resident_kb(server.pid)
+
+            started = time.perf_counter()
+            response = await client.post(
+                "/requests/", json={"id_item": item_id},
+                headers={"Authorization": f"Bearer {buyer_token}"},
+            )
+            response.raise_for_status()
+            await asyncio.gather(*(reader.readuntil(b"event: request.created") for reader, _ in streams))
+            fan_out = time.perf_counter() - started
+    finally:
+        for _, writer in streams:
+            writer.close()
+        server.kill()  # A graceful shutdown would wait for the streams to end
+        server.wait()
+
+    print(f"connections      {args.connections:>8}")
+    print(f"worker RSS       {baseline / 1024:>8.1f} MB idle, {connected / 1024:.1f} MB connected")
+    print(f"per connection   {(connected - baseline) / args.connections:>8.1f} KB")
+    print(f"event to all     {fan_out * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=1000)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,142 @@
+# Many buyers requesting the same items at once while their owner marks some
+# of them sold: latency of POST /requests/, outcomes, and how often the
+# conditional item UPDATE lost a race and was retried.
+#
+#   PYTHONPATH=. python benchmarks/bench_item_contention.py --requesters 200 --items 5
+#   PYTHONPATH=. python benchmarks/bench_item_contention.py --db-url postgresql+asyncpg://...
+#
+# Requests go straight to the ASGI app over httpx. Run it against PostgreSQL:
+# SQLite (the default, a smoke run) lets one transaction write at a time, and
+# concurrent writers mostly end in "database is locked" (counted as 500s)
+# after its busy timeout, whatever the application does. Afterwards every
+# item must have been written once per real status change, and the inbox
+# counters must match a rebuild from scratch.
+import argparse
+import asyncio
+import collections
+import os
+import statistics
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.orm.exc import StaleDataError
+
+# Read by the settings the routers load at import time; replaced in run()
+os.environ.setdefault("SQLDB_URL", "sqlite+aiosqlite://")
+
+from rubhew import concurrency, config, main, models, security
+
+
+async def populate(requesters, items):
+    async with models.new_session() as session:
+        users = [
+            models.DBUser(
+                username=f"user{i}", email=f"user{i}@bench.local", password="x",
+                first_name="Firstname", last_name="Lastname",
+            )
+            for i in range(requesters + 1)
+        ]
+        category = models.Category(name_category="Bench", category_image="img")
+        session.add_all([*users, category])
+        await session.commit()
+        rows = [
+            models.Item(
+                name_item=f"Item {i}", description="Benchmark item", price=i,
+                category_id=category.id_category, id_user=users[0].id,
+            )
+            for i in range(items)
+        ]
+        session.add_all(rows)
+        await session.commit()
+        return [user.id for user in users], [item.id_item for item in rows]
+
+
+def count_lost_races(counter):
+    # Wraps the conditional UPDATE to count the attempts that matched no row
+    transition = concurrency.transition_item_status
+
+    async def counting_transition(*args, **kwargs):
+        try:
+            return await transition(*args, **kwargs)
+        except StaleDataError:
+            counter["lost races"] += 1
+            raise
+
+    concurrency.transition_item_status = counting_transition
+
+
+async def run(args):
+    url = args.db_url or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench-contention.db')}"
+    settings = config.Settings(SQLDB_URL=url, THUMBNAIL_WORKERS=0)
+    app = main.create_app(settings)
+    models.engine.echo = False
+    await models.recreate_table()
+    user_ids, item_ids = await populate(args.requesters, args.items)
+    headers = [
+        {"Authorization": f"Bearer {security.create_access_token(data={'sub': user_id})}"}
+        for user_id in user_ids
+    ]
+    counter = collections.Counter()
+    count_lost_races(counter)
+    sold = item_ids[: len(item_ids) // 2]  # Marked sold by the owner during the rush
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app, raise_app_exceptions=False), base_url="http://bench"
+    ) as client:
+        latencies = []
+
+        async def request_item(buyer_headers, item_id):
+            started = time.perf_counter()
+            response = await client.post("/requests/", json={"id_item": item_id}, headers=buyer_headers)
+            latencies.append(time.perf_counter() - started)
+            counter[f"POST /requests/ {response.status_code}"] += 1
+
+        async def sell(item_id):
+            await asyncio.sleep(0.01)
+            response = await client.put(
+                f"/items/change_status/{item_id}", json={"status": "Sold"}, headers=headers[0]
+            )
+            counter[f"PUT change_status {response.status_code}"] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                request_item(buyer_headers, item_id)
+                for buyer_headers in headers[1:]
+                for item_id in item_ids
+            ),
+            *(sell(item_id) for item_id in sold),
+        )
+        elapsed = time.perf_counter() - started
+
+    async with models.new_session() as session:
+        items = (await session.exec(models.select(models.Item).where(models.Item.id_item.in_(item_ids)))).all()
+        counters = {
+            row.user_id: (row.incoming_pending, row.outgoing_pending, row.unread_responses)
+            for row in (await session.exec(models.select(models.RequestCounter))).all()
+        }
+        await models.rebuild_request_counters(session)
+        rebuilt = {
+            row.user_id: (row.incoming_pending, row.outgoing_pending, row.unread_responses)
+            for row in (await session.exec(models.select(models.RequestCounter))).all()
+        }
+
+    total = len(latencies)
+    latencies.sort()
+    print(f"requests        {total:>8}  in {elapsed * 1000:.0f} ms ({total / elapsed:.0f}/s)")
+    print(f"latency         p50 {statistics.median(latencies) * 1000:.1f} ms  "
+          f"p99 {latencies[int(total * 0.99) - 1] * 1000:.1f} ms")
+    for name, count in sorted(counter.items()):
+        print(f"{name:<28} {count:>6}")
+    for item in items:
+        print(f"item {item.id_item}: {item.status:<9} version {item.version}")
+    print(f"counters match a rebuild: {counters == rebuilt}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-url", default=None)
+    parser.add_argument("--requesters", type=int, default=200)
+    parser.add_argument("--items", type=int, default=4)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,100 @@
+# Time to first byte, total time and peak Python memory of GET /users/ as one
+# JSON body and as an NDJSON stream.
+#
+#   PYTHONPATH=. python benchmarks/bench_streaming.py --users 100000
+#
+# Requests are sent straight to the ASGI app, so the numbers include the ORM,
+# serialization and the response machinery but no network. Body chunks are
+# counted and dropped as they are sent, like a client writing them out.
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import insert
+
+# Read by the settings the routers load at import time; replaced in run()
+os.environ.setdefault("SQLDB_URL", "sqlite+aiosqlite://")
+
+from rubhew import config, main, models, security
+
+
+async def populate(count, batch_size=10_000):
+    async with models.new_session() as session:
+        for start in range(0, count, batch_size):
+            await session.execute(insert(models.DBUser), [
+                dict(
+                    username=f"user{i}",
+                    email=f"user{i}@bench.local",
+                    first_name="Firstname",
+                    last_name="Lastname",
+                    password="x",
+                    role="admin" if i == 0 else "user",
+                )
+                for i in range(start, min(start + batch_size, count))
+            ])
+        await session.commit()
+        return (await session.exec(models.select(models.DBUser.id).limit(1))).one()
+
+
+async def measure(app, headers):
+    scope = dict(
+        type="http", asgi={"version": "3.0"}, http_version="1.1", method="GET",
+        scheme="http", path="/users/", raw_path=b"/users/", root_path="", query_string=b"",
+        headers=[(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        client=("127.0.0.1", 1234), server=("localhost", 80),
+    )
+    first_byte, size = None, 0
+    requested, finished = False, asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal first_byte, size
+        if message["type"] == "http.response.body":
+            if first_byte is None and message.get("body"):
+                first_byte = time.perf_counter() - started
+            size += len(message.get("body", b""))
+            if not message.get("more_body"):
+                finished.set()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_byte, elapsed, peak, size
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(), "bench-streaming.db")
+    settings = config.Settings(SQLDB_URL=f"sqlite+aiosqlite:///{path}", THUMBNAIL_WORKERS=0)
+    app = main.create_app(settings)
+    models.engine.echo = False
+    await models.recreate_table()
+    admin_id = await populate(args.users)
+
+    token = security.create_access_token(data={"sub": admin_id})
+    for name, accept in (("json", "application/json"), ("ndjson", "application/x-ndjson")):
+        first_byte, elapsed, peak, size = await measure(
+            app, {"Authorization": f"Bearer {token}", "Accept": accept}
+        )
+        print(
+            f"{name:>6}  first byte {first_byte * 1000:>8.1f} ms  total {elapsed * 1000:>8.1f} ms"
+            f"  peak memory {peak / 2**20:>7.1f} MB  ({size / 2**20:.1f} MB sent)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    asyncio.run(run(parser.parse_args()))
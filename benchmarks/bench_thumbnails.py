@@ -0,0 +1,70 @@
+# Thumbnail rendering throughput in images per second, on one core and
+# through the worker pool used by the API.
+#
+#   PYTHONPATH=. python benchmarks/bench_thumbnails.py --images 200 --workers 4
+#
+# Sources are photo-sized JPEGs (noise over a gradient, so the encoder cannot
+# take shortcuts), each rendered at every size in THUMBNAIL_SIZES.
+import argparse
+import asyncio
+import io
+import os
+import random
+import time
+import types
+
+from PIL import Image
+
+from rubhew import thumbnails
+
+
+def source_images(count, width, height, rng):
+    images = []
+    for _ in range(count):
+        gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        noise = Image.effect_noise((width, height), rng.randint(20, 60)).convert("RGB")
+        output = io.BytesIO()
+        Image.blend(gradient, noise, 0.5).save(output, "JPEG", quality=90)
+        images.append(output.getvalue())
+    return images
+
+
+def run_single(images):
+    started = time.perf_counter()
+    for data in images:
+        thumbnails.render_thumbnails(data)
+    return time.perf_counter() - started
+
+
+async def run_pool(images, workers):
+    thumbnails.init_thumbnails(types.SimpleNamespace(THUMBNAIL_WORKERS=workers))
+    # Start the workers before timing
+    await asyncio.gather(*(thumbnails.render(images[0]) for _ in range(workers)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(thumbnails.render(data) for data in images))
+    elapsed = time.perf_counter() - started
+    thumbnails.shutdown_thumbnails()
+    return elapsed
+
+
+def run(args):
+    images = source_images(args.images, args.width, args.height, random.Random(42))
+    size = sum(map(len, images)) / len(images) / 1024
+    print(f"{len(images)} JPEGs of {args.width}x{args.height}, {size:.0f} KB on average, sizes {thumbnails.THUMBNAIL_SIZES}")
+
+    elapsed = run_single(images)
+    print(f"  1 core   {len(images) / elapsed:>8.1f} images/s")
+
+    elapsed = asyncio.run(run_pool(images, args.workers))
+    rate = len(images) / elapsed
+    print(f"{args.workers:>3} workers {rate:>8.1f} images/s  ({rate / args.workers:.1f} per worker)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    run(parser.parse_args())
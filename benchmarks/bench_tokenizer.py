@@ -0,0 +1,52 @@
+# Throughput of the search tokenizers in words per second.
+#
+#   PYTHONPATH=. python benchmarks/bench_tokenizer.py --words 200000
+#
+# Listings are generated from dictionary words written without spaces, with
+# some unknown words and numbers mixed in, like real Thai item descriptions.
+import argparse
+import random
+import time
+
+from rubhew import tokenizers
+
+
+def listings(words, count, rng):
+    letters = "กขคงจฉชซดตถทนบปผพฟมยรลวสหอฮ"
+    texts, generated = [], 0
+    while generated < count:
+        parts = []
+        for _ in range(rng.randint(5, 30)):
+            roll = rng.random()
+            if roll < 0.85:
+                parts.append(rng.choice(words))
+            elif roll < 0.95:
+                parts.append("".join(rng.choice(letters) for _ in range(rng.randint(2, 5))))
+            else:
+                parts.append(f" {rng.randint(1, 9999)} ")
+        generated += len(parts)
+        texts.append("".join(parts))
+    return texts, generated
+
+
+def run(args):
+    rng = random.Random(42)
+    words = tokenizers.load_dictionary()
+    texts, count = listings(words, args.words, rng)
+
+    for name in ("simple", "thai"):
+        tokenizer = tokenizers.get_tokenizer(name)
+        for method in ("tokenize", "index_terms"):
+            started = time.perf_counter()
+            terms = sum(len(getattr(tokenizer, method)(text)) for text in texts)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{name:>6} {method:<11} {count / elapsed:>12,.0f} words/s"
+                f"  ({terms} terms from {count} words in {len(texts)} listings)"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, default=200_000)
+    run(parser.parse_args())
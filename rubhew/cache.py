@@ -0,0 +1,202 @@
+import asyncio
+import collections
+import json
+import logging
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # Optional: only needed for CACHE_URL=redis://...
+    redis = None
+
+
+logger = logging.getLogger(__name__)
+
+# Called with the invalidated keys of a namespace, in every worker process
+InvalidationListener = Callable[[List[str]], None]
+
+# By namespace; kept across init_cache() so modules can subscribe on import
+listeners: Dict[str, List[InvalidationListener]] = {}
+
+
+def subscribe(namespace: str, listener: InvalidationListener):
+    listeners.setdefault(namespace, []).append(listener)
+
+
+def notify(namespace: str, keys: List[str]):
+    for listener in listeners.get(namespace, ()):
+        try:
+            listener(keys)
+        except Exception:
+            logger.exception("Cache invalidation listener of %s failed", namespace)
+
+
+class CacheBackend:
+    # Bytes values under namespaced keys with optional TTLs (seconds), and an
+    # invalidation channel: invalidate() deletes keys and tells the listeners
+    # of the namespace (see subscribe()), in this process and, for shared
+    # backends, all the others. In-process caches (item cards, the catalog
+    # snapshot) subscribe to keep in line with writes made by other workers.
+
+    shared = False  # Whether other worker processes see the same values
+
+    def __init__(self, prefix: str = "rubhew"):
+        self.prefix = prefix
+
+    def key(self, namespace: str, key) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    async def get(self, namespace: str, key) -> Optional[bytes]:
+        return (await self.get_many(namespace, [key])).get(str(key))
+
+    async def set(self, namespace: str, key, value: bytes, ttl: Optional[float] = None):
+        await self.set_many(namespace, {key: value}, ttl)
+
+    async def get_many(self, namespace: str, keys: Iterable) -> Dict[str, bytes]:
+        # Found values by str(key)
+        raise NotImplementedError
+
+    async def set_many(self, namespace: str, values: Dict, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    async def delete_many(self, namespace: str, keys: Iterable):
+        raise NotImplementedError
+
+    async def invalidate(self, namespace: str, keys: Iterable):
+        keys = [str(key) for key in keys]
+        await self.delete_many(namespace, keys)
+        notify(namespace, keys)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    # Single process: least recently used entries are dropped past max_entries
+
+    def __init__(self, prefix: str = "rubhew", max_entries: int = 100_000):
+        super().__init__(prefix)
+        self.max_entries = max_entries
+        self.entries: collections.OrderedDict[str, Tuple[bytes, Optional[float]]] = collections.OrderedDict()
+
+    async def get_many(self, namespace, keys):
+        found, now = {}, time.monotonic()
+        for key in keys:
+            full_key = self.key(namespace, key)
+            entry = self.entries.get(full_key)
+            if entry is None:
+                continue
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del self.entries[full_key]
+                continue
+            self.entries.move_to_end(full_key)
+            found[str(key)] = value
+        return found
+
+    async def set_many(self, namespace, values, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        for key, value in values.items():
+            full_key = self.key(namespace, key)
+            self.entries[full_key] = (value, expires_at)
+            self.entries.move_to_end(full_key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def delete_many(self, namespace, keys):
+        for key in keys:
+            self.entries.pop(self.key(namespace, key), None)
+
+
+class RedisCacheBackend(CacheBackend):
+    # Shared by every worker through a Redis (protocol) server; invalidations
+    # are published on one channel, which start() listens to
+
+    shared = True
+
+    def __init__(self, client, prefix: str = "rubhew"):
+        super().__init__(prefix)
+        self.client = client
+        self.channel = f"{prefix}:invalidate"
+        self.origin = uuid.uuid4().hex  # Our own messages are already handled
+        self.listener: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "rubhew"):
+        if redis is None:
+            raise Exception("CACHE_URL needs the redis package (the \"cache\" extra)")
+        return cls(redis.from_url(url), prefix)
+
+    async def get_many(self, namespace, keys):
+        keys = [str(key) for key in keys]
+        if not keys:
+            return {}
+        values = await self.client.mget([self.key(namespace, key) for key in keys])
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    async def set_many(self, namespace, values, ttl=None):
+        if not values:
+            return
+        async with self.client.pipeline(transaction=False) as pipeline:
+            for key, value in values.items():
+                pipeline.set(self.key(namespace, key), value, px=int(ttl * 1000) if ttl else None)
+            await pipeline.execute()
+
+    async def delete_many(self, namespace, keys):
+        keys = [self.key(namespace, key) for key in keys]
+        if keys:
+            await self.client.delete(*keys)
+
+    async def invalidate(self, namespace, keys):
+        keys = [str(key) for key in keys]
+        await super().invalidate(namespace, keys)
+        message = dict(origin=self.origin, namespace=namespace, keys=keys)
+        await self.client.publish(self.channel, json.dumps(message))
+
+    async def start(self):
+        if self.listener is None:
+            pubsub = self.client.pubsub()
+            await pubsub.subscribe(self.channel)
+            self.listener = asyncio.create_task(self.listen(pubsub))
+
+    async def listen(self, pubsub):
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                payload = json.loads(message["data"])
+                if payload["origin"] != self.origin:
+                    notify(payload["namespace"], payload["keys"])
+        finally:
+            await pubsub.aclose()
+
+    async def close(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+            self.listener = None
+        await self.client.aclose()
+
+
+backend: CacheBackend = MemoryCacheBackend()
+
+
+def init_cache(settings):
+    # "memory://" (default) or "redis://host:6379/0"
+    global backend
+    if settings.CACHE_URL.startswith(("redis://", "rediss://", "unix://")):
+        backend = RedisCacheBackend.from_url(settings.CACHE_URL, settings.CACHE_PREFIX)
+    else:
+        backend = MemoryCacheBackend(settings.CACHE_PREFIX)
+
+
+def get_cache() -> CacheBackend:
+    return backend
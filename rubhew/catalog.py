@@ -0,0 +1,107 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import cache, coalesce, models
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    # Every category and tag as read models, plus the encoded bodies of
+    # GET /categories/ and GET /tags/. Replaced as a whole, never modified.
+    categories: Dict[int, models.CategoryRead] = field(default_factory=dict)
+    tags: Dict[int, models.TagsRead] = field(default_factory=dict)
+    categories_json: bytes = b"[]"
+    tags_json: bytes = b"[]"
+    # Collection versions the rows were read at
+    versions: Dict[str, int] = field(default_factory=dict)
+
+
+COLLECTIONS = ("categories", "tags")
+
+# Namespace of the invalidations sent when categories or tags change
+NAMESPACE = "catalog"
+
+snapshot: Optional[CatalogSnapshot] = None  # None until first loaded
+stale = True
+# A cold or invalidated worker reloads once, however many requests need it
+loads = coalesce.SingleFlight()
+
+
+def encode_list(rows: List[models.SQLModel]) -> bytes:
+    return b"[" + b",".join(row.__pydantic_serializer__.to_json(row) for row in rows) + b"]"
+
+
+async def load_snapshot(session: AsyncSession) -> CatalogSnapshot:
+    # Versions are read first: rows at least as new as them only cost a
+    # needless refresh later, never a missed one
+    versions = await models.get_versions(session, COLLECTIONS)
+    categories = [
+        models.CategoryRead.model_validate(category)
+        for category in (await session.exec(select(models.Category).order_by(models.Category.id_category))).all()
+    ]
+    tags = [
+        models.TagsRead.model_validate(tag)
+        for tag in (await session.exec(select(models.Tags).order_by(models.Tags.id_tags))).all()
+    ]
+    return CatalogSnapshot(
+        categories={category.id_category: category for category in categories},
+        tags={tag.id_tags: tag for tag in tags},
+        categories_json=encode_list(categories),
+        tags_json=encode_list(tags),
+        versions=versions,
+    )
+
+
+async def refresh() -> CatalogSnapshot:
+    # Called at startup, and when stale or lacking an id
+    return await loads.get("snapshot", load)
+
+
+async def load() -> CatalogSnapshot:
+    global snapshot, stale
+    stale = False
+    async with models.new_session() as session:
+        snapshot = await load_snapshot(session)
+    return snapshot
+
+
+async def changed():
+    # After the commit of every category or tag write: the other workers
+    # reload on their next use, this one right away
+    await cache.get_cache().invalidate(NAMESPACE, ["snapshot"])
+    await refresh()
+
+
+def mark_stale(keys=()):
+    global stale
+    stale = True
+
+
+cache.subscribe(NAMESPACE, mark_stale)
+
+
+def observe(versions: Dict[str, int]):
+    # Versions read for a request (see conditional.collection_etag); catches
+    # writes made without the invalidation, e.g. by scripts
+    if snapshot is None or any(
+        name in versions and versions[name] != snapshot.versions.get(name) for name in COLLECTIONS
+    ):
+        mark_stale()
+
+
+async def current() -> CatalogSnapshot:
+    if stale or snapshot is None:
+        return await refresh()
+    return snapshot
+
+
+async def covering(category_ids: Iterable[int] = (), tag_ids: Iterable[int] = ()) -> CatalogSnapshot:
+    # The snapshot, refreshed once if it lacks any of the ids, e.g. a tag
+    # created by another process since it was loaded
+    catalog = await current()
+    if not set(category_ids) <= catalog.categories.keys() or not set(tag_ids) <= catalog.tags.keys():
+        catalog = await refresh()
+    return catalog
@@ -0,0 +1,86 @@
+import asyncio
+import collections
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from fastapi import Request
+
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one computation. Its result is
+    # then reused for ttl seconds, and for grace seconds more it is still
+    # returned at once while one background task computes a fresh one, so an
+    # expiring hot key never sends every waiting request to the database.
+    #
+    # Computations may outlive the request that started them and must not
+    # use its session; they open their own (models.new_session()).
+
+    def __init__(self, ttl: float = 0.0, grace: float = 0.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.grace = grace
+        self.max_entries = max_entries
+        self.results: collections.OrderedDict[Hashable, Tuple[Any, float]] = collections.OrderedDict()
+        self.flights: Dict[Hashable, asyncio.Future] = {}
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self.results.get(key)
+        if entry is not None:
+            value, computed_at = entry
+            age = time.monotonic() - computed_at
+            if age < self.ttl:
+                return value
+            if age < self.ttl + self.grace:
+                if key not in self.flights:
+                    self.start(key, compute)
+                return value
+
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.start(key, compute)
+        # A cancelled waiter must not cancel the computation others wait on
+        return await asyncio.shield(flight)
+
+    def start(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        flight = asyncio.ensure_future(self.run(key, compute))
+        self.flights[key] = flight
+        flight.add_done_callback(self.log_failure)
+        return flight
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await compute()
+            if self.ttl or self.grace:
+                self.results[key] = (value, time.monotonic())
+                self.results.move_to_end(key)
+                while len(self.results) > self.max_entries:
+                    self.results.popitem(last=False)
+            return value
+        finally:
+            self.flights.pop(key, None)
+
+    @staticmethod
+    def log_failure(flight: asyncio.Future):
+        # Background refreshes have nobody awaiting them
+        if not flight.cancelled() and flight.exception() is not None:
+            logger.warning("Coalesced computation failed", exc_info=flight.exception())
+
+    def clear(self):
+        self.results.clear()
+
+
+# Pages of hot listings (GET /items/); configured by init_coalescing()
+listings = SingleFlight()
+
+
+def init_coalescing(settings):
+    global listings
+    listings = SingleFlight(settings.COALESCE_TTL, settings.COALESCE_GRACE)
+
+
+def request_key(request: Request, *parts: Hashable) -> Tuple:
+    # Route plus normalized query: "?b=2&a=1" and "?a=1&b=2" are one key
+    return (request.url.path, tuple(sorted(request.query_params.multi_items())), *parts)
@@ -0,0 +1,71 @@
+import asyncio
+import datetime
+import random
+from typing import Awaitable, Callable, TypeVar
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import update
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import models
+
+
+T = TypeVar("T")
+
+# Tries of one write against concurrent ones before answering 409
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 0.005  # Seconds, doubled (with jitter) on every retry
+
+
+CONFLICT_DETAIL = "Changed by another request, please try again"
+
+
+async def conflict_handler(request: Request, exc: StaleDataError) -> JSONResponse:
+    # Writes outside retry_on_conflict (e.g. PUT /items/{id}) that lost to a
+    # concurrent one; the client re-reads and tries again
+    return JSONResponse({"detail": CONFLICT_DETAIL}, status_code=status.HTTP_409_CONFLICT)
+
+
+async def retry_on_conflict(session: AsyncSession, attempt: Callable[[], Awaitable[T]]) -> T:
+    # Run a read-check-write-commit function until no concurrent write came
+    # between its read and its write (StaleDataError). Rows are re-read by
+    # every attempt, so its checks always see the latest committed values.
+    for attempt_number in range(MAX_ATTEMPTS):
+        try:
+            return await attempt()
+        except StaleDataError:
+            await session.rollback()  # Also expires the rows read
+            await asyncio.sleep(random.uniform(0, RETRY_DELAY * 2 ** attempt_number))
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=CONFLICT_DETAIL)
+
+
+async def transition_item_status(session: AsyncSession, item: models.Item, new_status: str) -> bool:
+    # Move an item to new_status with one conditional UPDATE: it only applies
+    # if the row still has the version and status read into `item`, and the
+    # state machine allows the change. A lost race raises StaleDataError (see
+    # retry_on_conflict); a disallowed change is a 409. Returns whether the
+    # status changed.
+    if item.status == new_status:
+        return False
+    if item.status in models.ITEM_STATUS_TRANSITIONS and new_status not in models.ITEM_STATUS_TRANSITIONS[item.status]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Item status cannot change from {item.status} to {new_status}",
+        )
+
+    result = await session.execute(
+        update(models.Item)
+        .where(
+            models.Item.id_item == item.id_item,
+            models.Item.version == item.version,
+            models.Item.status == item.status,
+        )
+        .values(status=new_status, version=item.version + 1, updated_at=datetime.datetime.utcnow())
+    )
+    if result.rowcount != 1:
+        raise StaleDataError(f"Item {item.id_item} changed since it was read")
+    # Statement writes bypass the unit of work the version counters watch
+    models.mark_changed(session, ["items"])
+    return True
@@ -0,0 +1,38 @@
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import catalog, models
+
+
+# Clients may keep a copy but must revalidate it on every use
+CACHE_CONTROL = "public, no-cache"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison, as If-None-Match requires
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+
+def collection_etag(*collections: str):
+    # Dependency for GET routes over rarely changing collections: the ETag is
+    # built from their version counters, so an unchanged collection is
+    # answered with 304 before any of its rows are read or serialized
+    async def check_etag(
+        request: Request,
+        response: Response,
+        session: Annotated[AsyncSession, Depends(models.get_session)],
+    ):
+        versions = await models.get_versions(session, collections)
+        catalog.observe(versions)
+        etag = 'W/"{}"'.format("-".join(f"{name}.{versions.get(name, 0)}" for name in collections))
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+    return Depends(check_etag)
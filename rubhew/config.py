@@ -8,6 +8,35 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 5 * 60  # 5 minutes
     REFRESH_TOKEN_EXPIRE_MINUTES: int = 7 * 24 * 60  # 7 days
 
+    SEARCH_TOKENIZER: str = "thai"  # "thai" or "simple", see rubhew/tokenizers.py
+
+    MEDIA_ROOT: str = "./media"  # Local directory of the content-addressed media store
+    MEDIA_URL: str = "/media"  # URL prefix images are served from
+    MEDIA_MAX_BYTES: int = 10 * 1024 * 1024  # 10 MB
+    THUMBNAIL_WORKERS: int = 2  # Processes rendering thumbnails, 0 to disable them
+    ITEM_CARD_CACHE_ENTRIES: int = 10_000  # Encoded items kept per process, 0 to disable
+    ITEM_CARD_CACHE_BYTES: int = 64 * 1024 * 1024  # 64 MB
+
+    # Shared by the worker processes: "memory://" (one process) or
+    # "redis://host:6379/0" (needs the redis package, the "cache" extra)
+    CACHE_URL: str = "memory://"
+    CACHE_PREFIX: str = "rubhew"
+    ITEM_CARD_TTL: int = 5 * 60  # Seconds an item card is kept in a shared cache
+    USER_CACHE_TTL: int = 60  # Seconds a user looked up by get_current_user is kept
+
+    # Identical concurrent GET /items/ share one computation, whose result is
+    # reused for COALESCE_TTL seconds, then served stale for COALESCE_GRACE
+    # more while one request refreshes it. Keyed on the collection versions,
+    # so writes are always seen.
+    COALESCE_TTL: float = 1.0
+    COALESCE_GRACE: float = 5.0
+
+    # Change notifications pushed over GET /events: "memory://" (one process)
+    # or "redis://host:6379/0" for several workers (the "cache" extra)
+    EVENTS_URL: str = "memory://"
+    EVENT_QUEUE_SIZE: int = 100  # Undelivered events per connection before a resync
+    EVENT_KEEPALIVE: float = 15.0  # Seconds between keepalive comments on idle connections
+
     model_config = SettingsConfigDict(
         env_file=".env", validate_assignment=True, extra="allow"
     )
@@ -1,11 +1,16 @@
 from fastapi import Depends, HTTPException, logger, status
 from fastapi.security import OAuth2PasswordBearer
 
+import datetime
+import json
 import typing
 import jwt
 
 from pydantic import ValidationError
+from sqlalchemy import DateTime
+from sqlalchemy.orm import make_transient_to_detached
 
+from . import cache
 from . import models
 from . import security
 from . import config
@@ -15,6 +20,50 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
 settings = config.get_settings()
 
+# Namespace of cached users, keyed by id
+USERS_NAMESPACE = "users"
+# Every column but the password hash, which must not leave the database (the
+# cache may be a shared Redis); routes that need it refresh it from the row
+USER_COLUMNS = {
+    column.key: column for column in models.DBUser.__table__.columns if column.key != "password"
+}
+
+
+def encode_user(user: models.DBUser) -> bytes:
+    return json.dumps(
+        {key: getattr(user, key) for key in USER_COLUMNS},
+        default=datetime.datetime.isoformat,
+    ).encode()
+
+
+def decode_user(data: bytes) -> models.DBUser:
+    values = json.loads(data)
+    for key, column in USER_COLUMNS.items():
+        if isinstance(column.type, DateTime) and values.get(key) is not None:
+            values[key] = datetime.datetime.fromisoformat(values[key])
+    return models.DBUser(**values)
+
+
+async def get_user(session: models.AsyncSession, user_id: int) -> typing.Optional[models.DBUser]:
+    # The user row from the shared cache when there, attached to the session
+    # without a query so routes can still modify and commit it
+    backend = cache.get_cache()
+    data = await backend.get(USERS_NAMESPACE, user_id)
+    if data is not None:
+        user = decode_user(data)
+        make_transient_to_detached(user)
+        return await session.merge(user, load=False)
+
+    user = await session.get(models.DBUser, user_id)
+    if user is not None:
+        await backend.set(USERS_NAMESPACE, user_id, encode_user(user), settings.USER_CACHE_TTL)
+    return user
+
+
+async def forget_user(user_id: int):
+    # Call after the commit of every write to a user row
+    await cache.get_cache().invalidate(USERS_NAMESPACE, [user_id])
+
 
 async def get_current_user(
     token: typing.Annotated[str, Depends(oauth2_scheme)],
@@ -38,7 +87,7 @@ async def get_current_user(
         print(e)
         raise credentials_exception
 
-    user = await session.get(models.DBUser, user_id)
+    user = await get_user(session, user_id)
     if user is None:
         raise credentials_exception
 
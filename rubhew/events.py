@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # Optional: only needed for EVENTS_URL=redis://...
+    redis = None
+
+
+logger = logging.getLogger(__name__)
+
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+
+# Sent instead of the dropped events when a subscriber's queue overflows;
+# the client then refetches everything (e.g. GET /sync) instead of a delta
+RESYNC = {"type": "resync", "data": {}}
+
+
+class EventBroker:
+    # Per-user notifications of changes, e.g. {"type": "request.responded",
+    # "data": {"id": 3, ...}}, delivered to the connections (queues) of each
+    # user open in this process, and for shared brokers in all the others.
+    # Events only tell clients what to refetch; they are not a durable log.
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.subscribers: Dict[int, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def deliver(self, user_ids: Iterable[int], event: dict):
+        # A slow client never blocks the publisher nor grows without bound
+        for user_id in user_ids:
+            for queue in self.subscribers.get(user_id, ()):
+                if queue.full():
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(RESYNC)
+                else:
+                    queue.put_nowait(event)
+
+    async def publish(self, user_ids: Iterable[int], event: dict):
+        self.deliver(set(user_ids), event)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class RedisEventBroker(EventBroker):
+    # Events are published on one channel of a Redis (protocol) server, which
+    # every worker listens to (start()) and delivers to its own connections
+
+    def __init__(self, client, prefix: str = "rubhew", queue_size: int = 100):
+        super().__init__(queue_size)
+        self.client = client
+        self.channel = f"{prefix}:events"
+        self.origin = uuid.uuid4().hex  # Our own messages are delivered at once
+        self.listener: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "rubhew", queue_size: int = 100):
+        if redis is None:
+            raise Exception("EVENTS_URL needs the redis package (the \"cache\" extra)")
+        return cls(redis.from_url(url), prefix, queue_size)
+
+    async def publish(self, user_ids, event):
+        user_ids = sorted(set(user_ids))
+        self.deliver(user_ids, event)
+        message = dict(origin=self.origin, user_ids=user_ids, event=event)
+        await self.client.publish(self.channel, json.dumps(message))
+
+    async def start(self):
+        if self.listener is None:
+            pubsub = self.client.pubsub()
+            await pubsub.subscribe(self.channel)
+            self.listener = asyncio.create_task(self.listen(pubsub))
+
+    async def listen(self, pubsub):
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                payload = json.loads(message["data"])
+                if payload["origin"] != self.origin:
+                    self.deliver(payload["user_ids"], payload["event"])
+        finally:
+            await pubsub.aclose()
+
+    async def close(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+            self.listener = None
+        await self.client.aclose()
+
+
+broker: EventBroker = EventBroker()
+keepalive = 15.0
+
+
+def init_events(settings):
+    # "memory://" (default, one process) or "redis://host:6379/0"
+    global broker, keepalive
+    if settings.EVENTS_URL.startswith(("redis://", "rediss://", "unix://")):
+        broker = RedisEventBroker.from_url(settings.EVENTS_URL, settings.CACHE_PREFIX, settings.EVENT_QUEUE_SIZE)
+    else:
+        broker = EventBroker(settings.EVENT_QUEUE_SIZE)
+    keepalive = settings.EVENT_KEEPALIVE
+
+
+def get_broker() -> EventBroker:
+    return broker
+
+
+async def publish(user_ids: Iterable[int], event_type: str, **data):
+    # Call after the commit of the write. A broker failure is logged, not
+    # raised: the write succeeded and clients still catch up on their next sync.
+    try:
+        await broker.publish(user_ids, {"type": event_type, "data": data})
+    except Exception:
+        logger.exception("Publishing %s failed", event_type)
+
+
+def encode_event(event: dict) -> bytes:
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n".encode()
+
+
+async def iter_events(user_id: int) -> AsyncIterator[bytes]:
+    # Server-Sent Events of one user until the client disconnects. An idle
+    # connection costs one queue and one comment line every keepalive seconds,
+    # which stops proxies from closing it.
+    subscribed_to = broker
+    queue = subscribed_to.subscribe(user_id)
+    try:
+        yield b"retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield encode_event(event)
+    finally:
+        subscribed_to.unsubscribe(user_id, queue)
@@ -0,0 +1,32 @@
+from typing import Iterable, List, Optional, Set, Type
+
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlmodel import SQLModel
+
+
+def parse_fields(
+    fields: Optional[str],
+    read_model: Type[SQLModel],
+    always: Iterable[str] = (),
+) -> Optional[Set[str]]:
+    # "?fields=id_item,name_item,price" -> the requested subset of the read
+    # model's fields plus the ones always returned; None when not given
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - read_model.model_fields.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
+    return requested | set(always)
+
+
+def sparse_response(rows: List[dict], response: Optional[Response] = None) -> JSONResponse:
+    # Partial rows would fail validation against the endpoint's response_model,
+    # so they are serialized directly, keeping headers set on the injected response
+    headers = dict(response.headers) if response is not None else None
+    return JSONResponse(jsonable_encoder(rows), headers=headers)
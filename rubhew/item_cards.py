@@ -0,0 +1,160 @@
+import collections
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import cache as shared_cache, loaders, models, thumbnails
+
+
+@dataclass
+class ItemCard:
+    # Pre-encoded JSON of one item as returned by GET /items/ (ItemRead with
+    # list-size images) and by GET /items/{id} (ItemRead_Only)
+    id_user: int
+    list_json: bytes
+    detail_json: bytes
+
+    @property
+    def size(self) -> int:
+        return len(self.list_json) + len(self.detail_json)
+
+
+class ItemCardCache:
+    # Least recently used cards first; bounded both in entries and in bytes
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cards: collections.OrderedDict[int, ItemCard] = collections.OrderedDict()
+        self.size = 0
+        # Bumped by every invalidation; cards built from rows read before it
+        # are not stored, so a slow reader cannot put back a stale card
+        self.generation = 0
+
+    def get_many(self, item_ids: Iterable[int]) -> Dict[int, ItemCard]:
+        found = {}
+        for item_id in item_ids:
+            card = self.cards.get(item_id)
+            if card is not None:
+                self.cards.move_to_end(item_id)
+                found[item_id] = card
+        return found
+
+    def put_many(self, cards: Dict[int, ItemCard], generation: int):
+        if generation != self.generation or self.max_entries < 1:
+            return
+        for item_id, card in cards.items():
+            self._discard(item_id)
+            if card.size > self.max_bytes:
+                continue
+            self.cards[item_id] = card
+            self.size += card.size
+        while self.cards and (len(self.cards) > self.max_entries or self.size > self.max_bytes):
+            self._discard(next(iter(self.cards)))
+
+    def invalidate(self, item_ids: Iterable[int]):
+        self.generation += 1
+        for item_id in item_ids:
+            self._discard(item_id)
+
+    def clear(self):
+        self.generation += 1
+        self.cards.clear()
+        self.size = 0
+
+    def _discard(self, item_id: int):
+        card = self.cards.pop(item_id, None)
+        if card is not None:
+            self.size -= card.size
+
+
+# Namespace of the cards in the shared cache and of their invalidations
+NAMESPACE = "item_cards"
+
+cache = ItemCardCache(max_entries=0, max_bytes=0)
+ttl = 0
+
+
+def init_item_cards(settings):
+    global cache, ttl
+    cache = ItemCardCache(settings.ITEM_CARD_CACHE_ENTRIES, settings.ITEM_CARD_CACHE_BYTES)
+    ttl = settings.ITEM_CARD_TTL
+
+
+# Invalidations reach the in-process cards of every worker
+shared_cache.subscribe(NAMESPACE, lambda keys: cache.invalidate(int(key) for key in keys))
+
+
+async def invalidate(item_ids: Iterable[int]):
+    # Call after the commit of every write that changes how an item reads
+    await shared_cache.get_cache().invalidate(NAMESPACE, item_ids)
+
+
+async def owned_item_ids(session: AsyncSession, user_id: int) -> List[int]:
+    # Items whose cards show the name of a user
+    item_ids = await session.exec(select(models.Item.id_item).where(models.Item.id_user == user_id))
+    return list(item_ids.all())
+
+
+def encode_card(card: ItemCard) -> bytes:
+    return b"%d %d\n" % (card.id_user, len(card.list_json)) + card.list_json + card.detail_json
+
+
+def decode_card(data: bytes) -> ItemCard:
+    header, _, body = data.partition(b"\n")
+    id_user, list_size = map(int, header.split())
+    return ItemCard(id_user=id_user, list_json=body[:list_size], detail_json=body[list_size:])
+
+
+def build_card(item: models.Item) -> ItemCard:
+    list_read = loaders.build_item_read(item, models.ItemRead, thumbnails.LIST_IMAGE_SIZE)
+    detail_read = loaders.build_item_read(item, models.ItemRead_Only)
+    return ItemCard(
+        id_user=item.id_user,
+        list_json=list_read.__pydantic_serializer__.to_json(list_read),
+        detail_json=detail_read.__pydantic_serializer__.to_json(detail_read),
+    )
+
+
+async def get_cards(session: AsyncSession, item_ids: List[int]) -> Dict[int, ItemCard]:
+    # Cards of the given items from this process, then from the shared cache,
+    # loading (and caching) only the ones missing from both; ids of items
+    # that do not exist are left out
+    cards = cache.get_many(item_ids)
+    missing = [item_id for item_id in item_ids if item_id not in cards]
+    if not missing:
+        return cards
+    generation = cache.generation
+    backend = shared_cache.get_cache()
+
+    found = {}
+    if backend.shared:
+        found = {
+            int(key): decode_card(data)
+            for key, data in (await backend.get_many(NAMESPACE, missing)).items()
+        }
+        missing = [item_id for item_id in missing if item_id not in found]
+    loaded = {}
+    if missing:
+        items = await loaders.load_items(
+            session, select(models.Item).where(models.Item.id_item.in_(missing))
+        )
+        loaded = {item.id_item: build_card(item) for item in items}
+        # Skipped when an invalidation arrived meanwhile; one published just
+        # after this write is bounded by the TTL
+        if backend.shared and loaded and generation == cache.generation:
+            await backend.set_many(
+                NAMESPACE, {item_id: encode_card(card) for item_id, card in loaded.items()}, ttl
+            )
+
+    cache.put_many({**found, **loaded}, generation)
+    cards.update(found)
+    cards.update(loaded)
+    return cards
+
+
+def join_cards(fragments: Iterable[bytes]) -> bytes:
+    # A JSON array assembled from encoded cards without decoding them
+    return b"[" + b",".join(fragments) + b"]"
@@ -0,0 +1,181 @@
+from typing import AbstractSet, Iterable, List, Optional, Type, Union
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased, load_only, selectinload
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import catalog, models, thumbnails
+
+
+# Item columns read by each field of ItemRead / ItemRead_Only
+ITEM_READ_COLUMNS = {
+    "id_user": (models.Item.id_user,),
+    "id_item": (models.Item.id_item,),
+    "name_item": (models.Item.name_item,),
+    "description": (models.Item.description,),
+    "price": (models.Item.price,),
+    "images": (models.Item.images,),
+    "status": (models.Item.status,),
+    "detail": (models.Item.detail,),
+    "category_id": (models.Item.category_id,),
+    "tags": (),
+    "user_profile": (models.Item.id_user,),
+}
+
+
+def item_read_options(
+    with_owner: bool = True,
+    fields: Optional[AbstractSet[str]] = None,
+    extra_columns: tuple = (),
+) -> list:
+    # Tag links and the owner are each fetched with one "WHERE ... IN (...)"
+    # query for the whole page instead of one per item; tag names come from
+    # the catalog snapshot. With a sparse fieldset only the columns and
+    # relations it needs are read.
+    options = []
+    if fields is not None:
+        columns = {column for name in fields for column in ITEM_READ_COLUMNS[name]}
+        options.append(load_only(*columns, *extra_columns))
+    if fields is None or "tags" in fields:
+        options.append(selectinload(models.Item.tags_link))
+    if with_owner and (fields is None or "user_profile" in fields):
+        options.append(
+            selectinload(models.Item.user).load_only(
+                models.DBUser.username,
+                models.DBUser.first_name,
+                models.DBUser.last_name,
+            )
+        )
+    return options
+
+
+def build_item_read(
+    item: models.Item,
+    read_model: Type[models.SQLModel] = models.ItemRead,
+    image_size: Optional[int] = None,
+    fields: Optional[AbstractSet[str]] = None,
+) -> Union[models.SQLModel, dict]:
+    # Build ItemRead / ItemRead_Only from an item loaded with item_read_options()
+    # and covered by cover_catalog(); image_size swaps the images for
+    # thumbnails of that size. With a sparse fieldset only those fields are
+    # read and a plain dict is returned.
+    names = read_model.model_fields.keys() if fields is None else fields
+    values = {}
+    for name in names:
+        if name == "tags":
+            tags = catalog.snapshot.tags if catalog.snapshot is not None else {}
+            values[name] = [
+                tags[link.tag_id] for link in item.tags_link if link.tag_id in tags
+            ]
+        elif name == "user_profile":
+            values[name] = None
+            if item.user is not None:
+                values[name] = models.UserProfile(
+                    username=item.user.username,
+                    first_name=item.user.first_name,
+                    last_name=item.user.last_name,
+                )
+        elif name == "images" and image_size:
+            values[name] = thumbnails.thumbnail_urls(item.images, image_size)
+        else:
+            values[name] = getattr(item, name)
+    return values if fields is not None else read_model(**values)
+
+
+async def load_items(
+    session: AsyncSession,
+    statement,
+    with_owner: bool = True,
+    fields: Optional[AbstractSet[str]] = None,
+    extra_columns: tuple = (),
+) -> List[models.Item]:
+    # Run a select(models.Item) statement with its tags (and owner) eager-loaded;
+    # extra_columns are loaded besides a sparse fieldset, e.g. a sort key
+    options = item_read_options(with_owner, fields, extra_columns)
+    results = await session.exec(statement.options(*options))
+    items = results.all()
+    await cover_catalog(items, fields)
+    return items
+
+
+async def cover_catalog(items: Iterable[models.Item], fields: Optional[AbstractSet[str]] = None):
+    # Make sure the catalog snapshot knows the tags of the loaded items
+    if fields is None or "tags" in fields:
+        await catalog.covering(tag_ids={link.tag_id for item in items for link in item.tags_link})
+
+
+async def load_item_reads(
+    session: AsyncSession,
+    statement,
+    read_model: Type[models.SQLModel] = models.ItemRead,
+    image_size: Optional[int] = None,
+    fields: Optional[AbstractSet[str]] = None,
+) -> List:
+    # Run a select(models.Item) statement and assemble the read models using a
+    # fixed number of queries, whatever the number of rows
+    items = await load_items(
+        session, statement, with_owner=read_model is models.ItemRead, fields=fields
+    )
+    return [build_item_read(item, read_model, image_size, fields) for item in items]
+
+
+# Related rows of the nested fields of RequestDetailRead: the joined entity,
+# the join condition and the detail model whose columns are read from it
+Sender = aliased(models.DBUser, name="sender")
+Receiver = aliased(models.DBUser, name="receiver")
+REQUEST_DETAIL_JOINS = {
+    "sender": (Sender, Sender.id == models.Request.id_sent, models.UserDetail),
+    "receiver": (Receiver, Receiver.id == models.Request.id_receive, models.UserDetail),
+    "item": (models.Item, models.Item.id_item == models.Request.id_item, models.ItemDetail),
+}
+
+
+def request_detail_statement(fields: Optional[AbstractSet[str]] = None, extra_fields: Iterable[str] = ()):
+    # requests joined to sender, receiver and item in one query, reading only
+    # the columns of the (selected) fields, labelled "<field>" or
+    # "<field>__<subfield>"; extra_fields are request columns read for the
+    # caller, e.g. a cursor. Filters and ordering are added by the caller.
+    # Inner joins: requests whose related rows are gone are skipped.
+    names = models.RequestDetailRead.model_fields.keys() if fields is None else fields
+    columns, joins = {}, []
+    for name in (*names, *extra_fields):
+        join = REQUEST_DETAIL_JOINS.get(name)
+        if join is None:
+            columns[name] = getattr(models.Request, name)
+            continue
+        entity, onclause, detail_model = join
+        joins.append((entity, onclause))
+        for subfield in detail_model.model_fields:
+            columns[f"{name}__{subfield}"] = getattr(entity, subfield)
+
+    statement = select(*(column.label(label) for label, column in columns.items())).select_from(models.Request)
+    for entity, onclause in joins:
+        statement = statement.join(entity, onclause)
+    return statement
+
+
+def build_request_detail(row, fields: Optional[AbstractSet[str]] = None) -> Union[models.RequestDetailRead, dict]:
+    # One row of request_detail_statement(); a plain dict with a sparse fieldset
+    names = models.RequestDetailRead.model_fields.keys() if fields is None else fields
+    row = row._mapping
+    values = {}
+    for name in names:
+        join = REQUEST_DETAIL_JOINS.get(name)
+        if join is None:
+            values[name] = row[name]
+        else:
+            detail_model = join[2]
+            values[name] = detail_model(**{
+                subfield: row[f"{name}__{subfield}"] for subfield in detail_model.model_fields
+            })
+    return values if fields is not None else models.RequestDetailRead(**values)
+
+
+async def load_request_details(
+    session: AsyncSession,
+    statement,
+    fields: Optional[AbstractSet[str]] = None,
+) -> List[Union[models.RequestDetailRead, dict]]:
+    # Run a request_detail_statement() built with the same fields
+    results = await session.execute(statement)
+    return [build_request_detail(row, fields) for row in results]
@@ -6,12 +6,19 @@ monkey.patch_all()
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.orm.exc import StaleDataError
 
-from . import config, models, routers
+from . import cache, catalog, coalesce, concurrency, config, events, item_cards, media, models, pagination, routers, thumbnails
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await cache.get_cache().start()  # Invalidations from the other workers
+    await events.get_broker().start()  # Events published by the other workers
+    await catalog.refresh()  # Categories and tags are served from memory
     yield
+    await events.get_broker().close()
+    await cache.get_cache().close()
+    thumbnails.shutdown_thumbnails()
     if models.engine is not None:
         await models.close_session()
 
@@ -27,7 +34,15 @@ def create_app(settings=None):
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[pagination.NEXT_CURSOR_HEADER],
     )
     models.init_db(settings)
+    media.init_media(settings)
+    thumbnails.init_thumbnails(settings)
+    cache.init_cache(settings)
+    item_cards.init_item_cards(settings)
+    coalesce.init_coalescing(settings)
+    events.init_events(settings)
     routers.init_router(app)
+    app.add_exception_handler(StaleDataError, concurrency.conflict_handler)
     return app
@@ -0,0 +1,160 @@
+import base64
+import binascii
+import hashlib
+import os
+import pathlib
+import re
+import tempfile
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+
+
+MEDIA_KEY = re.compile(r"^[0-9a-f]{64}$")
+
+# Leading bytes of the image formats accepted by the store
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def sniff_image_type(data: bytes) -> Optional[str]:
+    for signature, content_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class MediaStore:
+    # Content-addressed blob store: a blob is written once under the SHA-256
+    # of its bytes, so identical uploads share storage and URLs never change
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def thumbnail_url(self, key: str, size: int) -> str:
+        return f"{self.base_url}/{key}/{size}"
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        prefix = self.base_url + "/"
+        if url.startswith(prefix) and MEDIA_KEY.match(url[len(prefix):]):
+            return url[len(prefix):]
+        return None
+
+    async def put(self, data: bytes) -> str:
+        raise NotImplementedError
+
+    async def get_path(self, key: str) -> Optional[pathlib.Path]:
+        raise NotImplementedError
+
+    # Thumbnails are derived from a blob, so they are stored next to it under
+    # the same key rather than under the hash of their own bytes
+    async def put_thumbnail(self, key: str, size: int, data: bytes):
+        raise NotImplementedError
+
+    async def get_thumbnail_path(self, key: str, size: int) -> Optional[pathlib.Path]:
+        raise NotImplementedError
+
+
+class LocalMediaStore(MediaStore):
+    # Blobs live under root/<first two hex digits>/<sha256>, their
+    # thumbnails next to them as <sha256>_<size>
+
+    def __init__(self, root: str, base_url: str):
+        super().__init__(base_url)
+        self.root = pathlib.Path(root)
+
+    def path(self, key: str, size: Optional[int] = None) -> pathlib.Path:
+        name = key if size is None else f"{key}_{size}"
+        return self.root / key[:2] / name
+
+    async def put(self, data: bytes) -> str:
+        # Written inline, see thumbnails.py on worker threads under gevent
+        key = hashlib.sha256(data).hexdigest()
+        self._write(self.path(key), data)
+        return key
+
+    def _write(self, path: pathlib.Path, data: bytes):
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial blob
+        fd, temp_path = tempfile.mkstemp(dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    async def get_path(self, key):
+        path = self.path(key)
+        return path if MEDIA_KEY.match(key) and path.exists() else None
+
+    async def put_thumbnail(self, key, size, data):
+        self._write(self.path(key, size), data)
+
+    async def get_thumbnail_path(self, key, size):
+        path = self.path(key, size)
+        return path if MEDIA_KEY.match(key) and path.exists() else None
+
+
+store: Optional[MediaStore] = None
+max_bytes = 10 * 1024 * 1024  # settings.MEDIA_MAX_BYTES
+
+
+def init_media(settings):
+    global store, max_bytes
+    store = LocalMediaStore(settings.MEDIA_ROOT, settings.MEDIA_URL)
+    max_bytes = settings.MEDIA_MAX_BYTES
+
+
+def get_media_store() -> MediaStore:
+    if store is None:
+        raise Exception("Media store is not initialized")
+    return store
+
+
+def decode_image(value: str) -> Optional[bytes]:
+    # Base64 image (optionally a data: URL) -> bytes; None for anything else,
+    # such as URLs or strings that merely happen to be valid base64
+    # Images larger than MEDIA_MAX_BYTES are a 413, as for POST /media/
+    if value.startswith("data:"):
+        _, _, value = value.partition(",")
+    # Every 4 base64 characters hold 3 bytes: longer text is oversize before
+    # it is decoded into memory
+    if len(value) > 4 * -(-max_bytes // 3):
+        raise image_too_large()
+    try:
+        data = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    if len(data) > max_bytes:
+        raise image_too_large()
+    return data if sniff_image_type(data) else None
+
+
+def image_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Images are limited to {max_bytes} bytes",
+    )
+
+
+async def store_images(images: List[str]) -> List[str]:
+    # Replace inline base64 images with media URLs; other entries are kept
+    media_store = get_media_store()
+    stored = []
+    for image in images:
+        data = decode_image(image)
+        stored.append(media_store.url(await media_store.put(data)) if data else image)
+    return stored
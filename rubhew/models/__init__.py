@@ -12,6 +12,11 @@ from . import items
 from . import transactions
 
 from . import requests
+from . import search
+from . import fuzzy
+from . import media
+from . import sync
+from . import versions
 
 from .users import *
 from .profiles import *
@@ -19,6 +24,11 @@ from .items import *
 from .transactions import *
 
 from .requests import *
+from .search import *
+from .fuzzy import *
+from .media import *
+from .sync import *
+from .versions import *
 
 connect_args = {}
 
@@ -35,20 +45,26 @@ def init_db(settings):
         connect_args=connect_args,
     )
     print(f"Database engine initialized with URL: {settings.SQLDB_URL}")
+    set_search_tokenizer(settings.SEARCH_TOKENIZER)
 
 async def recreate_table():
     try:
         async with engine.begin() as conn:
             await conn.run_sync(SQLModel.metadata.drop_all)
             await conn.run_sync(SQLModel.metadata.create_all)
+        reset_fuzzy_indexes()
     except Exception as e:
         print(f"Error creating tables: {e}")
 
 async def get_session() -> AsyncIterator[AsyncSession]:
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    async with async_session() as session:
+    async with new_session() as session:
         yield session
 
+def new_session() -> AsyncSession:
+    # Session that is not tied to a request, e.g. for a streamed response body
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    return async_session()
+
 async def close_session():
     global engine
     if engine is None:
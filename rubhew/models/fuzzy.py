@@ -0,0 +1,256 @@
+import asyncio
+import heapq
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import DDL, event, text
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .. import tokenizers
+from .items import Item, Tags
+from .search import ItemSearchIndex
+
+
+class FuzzyItemMatch(SQLModel):
+    id_item: int
+    name_item: str
+    similarity: float
+
+class FuzzyTagMatch(SQLModel):
+    id_tags: int
+    name_tags: str
+    similarity: float
+
+class FuzzySearchRead(SQLModel):
+    items: List[FuzzyItemMatch] = []
+    tags: List[FuzzyTagMatch] = []
+
+
+# Postgres: pg_trgm GIN indexes serve the "%" similarity operator
+event.listen(
+    SQLModel.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_items_name_item_trgm "
+        "ON items USING GIN (name_item gin_trgm_ops)"
+    ).execute_if(dialect="postgresql"),
+)
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_tags_name_tags_trgm "
+        "ON tags USING GIN (name_tags gin_trgm_ops)"
+    ).execute_if(dialect="postgresql"),
+)
+
+
+# Same default as pg_trgm.similarity_threshold
+SIMILARITY_THRESHOLD = 0.3
+
+
+def trigrams(word: str) -> Set[str]:
+    # pg_trgm style: the word padded with two spaces in front and one behind
+    padded = "  " + word + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def segmented(run: str) -> Tuple[List[str], bool]:
+    # Words of one TOKEN_RUN as split by the search tokenizer (Thai is written
+    # without spaces), and whether all of them are known words
+    tokenizer = ItemSearchIndex.tokenizer
+    words = tokenizer.tokenize(run)
+    is_word = getattr(tokenizer, "is_word", None)
+    return words, len(words) < 2 or is_word is None or all(is_word(word) for word in words)
+
+
+def name_words(name: str) -> List[str]:
+    # Words a name is matched by: its segmented words, compounds also by their
+    # parts, and runs the dictionary does not cover (brands, typos) also whole
+    words = []
+    for match in tokenizers.TOKEN_RUN.finditer(tokenizers.normalize(name or "")):
+        _, known = segmented(match.group(0))
+        words.extend(ItemSearchIndex.tokenizer.index_terms(match.group(0)))
+        if not known:
+            words.append(match.group(0))
+    return list(dict.fromkeys(words))
+
+
+def query_words(query: str) -> List[str]:
+    # A run that does not split into known words is most likely a misspelling
+    # ("โทรศัพ"); kept whole its trigrams still overlap the intended word,
+    # where split into "โทร" + "ศัพ" neither piece would
+    words = []
+    for match in tokenizers.TOKEN_RUN.finditer(tokenizers.normalize(query or "")):
+        run_words, known = segmented(match.group(0))
+        words.extend(run_words if known else [match.group(0)])
+    return list(dict.fromkeys(words))
+
+
+def similarity(left: Set[str], right: Set[str]) -> float:
+    common = len(left & right)
+    return common / (len(left) + len(right) - common)
+
+
+class TrigramIndex:
+    # In-process posting lists: trigram -> ids of the names containing it.
+    # A name scores the mean, over the query's words, of each one's best
+    # similarity to one of the name's words, so a misspelt word is found
+    # inside a longer name too.
+
+    def __init__(self):
+        self.postings: Dict[str, Set[int]] = {}
+        self.names: Dict[int, str] = {}
+        self.words: Dict[int, List[Set[str]]] = {}
+
+    def add(self, id_: int, name: str):
+        self.remove(id_)
+        words = [trigrams(word) for word in name_words(name)]
+        self.names[id_] = name
+        self.words[id_] = words
+        for gram in set().union(*words):
+            self.postings.setdefault(gram, set()).add(id_)
+
+    def remove(self, id_: int):
+        for gram in set().union(*self.words.pop(id_, ())):
+            posting = self.postings[gram]
+            posting.discard(id_)
+            if not posting:
+                del self.postings[gram]
+        self.names.pop(id_, None)
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, str, float]]:
+        query_grams = [trigrams(word) for word in query_words(query)]
+        if not query_grams:
+            return []
+
+        # Only names sharing at least one trigram are scored
+        candidates: Set[int] = set()
+        for grams in query_grams:
+            for gram in grams:
+                candidates.update(self.postings.get(gram, ()))
+
+        scored = []
+        for id_ in candidates:
+            score = sum(
+                max(similarity(grams, word) for word in self.words[id_]) for grams in query_grams
+            ) / len(query_grams)
+            if score >= SIMILARITY_THRESHOLD:
+                scored.append((score, -id_))
+        return [
+            (-negative_id, self.names[-negative_id], score)
+            for score, negative_id in heapq.nlargest(limit, scored)
+        ]
+
+
+class FuzzyIndex:
+    # Typo-tolerant lookup of item and tag names, best matches first
+
+    async def search_items(
+        self, session: AsyncSession, query: str, limit: int
+    ) -> List[Tuple[int, str, float]]:
+        raise NotImplementedError
+
+    async def search_tags(
+        self, session: AsyncSession, query: str, limit: int
+    ) -> List[Tuple[int, str, float]]:
+        raise NotImplementedError
+
+    # Called after a commit that changed a name; None means deleted
+    def item_changed(self, id_item: int, name_item: Optional[str]):
+        pass
+
+    def tag_changed(self, id_tags: int, name_tags: Optional[str]):
+        pass
+
+
+class SQLiteFuzzyIndex(FuzzyIndex):
+    # Loaded from the database on first use, then kept up to date by the routers
+
+    def __init__(self):
+        self.items: Optional[TrigramIndex] = None
+        self.tags: Optional[TrigramIndex] = None
+        self.lock = asyncio.Lock()
+        self.changed_while_loading = False
+
+    async def load(self, session: AsyncSession):
+        async with self.lock:
+            while self.items is None:
+                # Reload if a write committed while the names were being read
+                self.changed_while_loading = False
+                items, tags = TrigramIndex(), TrigramIndex()
+                for id_item, name_item in (await session.exec(select(Item.id_item, Item.name_item))).all():
+                    items.add(id_item, name_item)
+                for id_tags, name_tags in (await session.exec(select(Tags.id_tags, Tags.name_tags))).all():
+                    tags.add(id_tags, name_tags)
+                if not self.changed_while_loading:
+                    self.items, self.tags = items, tags
+
+    def reset(self):
+        self.items = self.tags = None
+
+    async def search_items(self, session, query, limit):
+        await self.load(session)
+        return self.items.search(query, limit)
+
+    async def search_tags(self, session, query, limit):
+        await self.load(session)
+        return self.tags.search(query, limit)
+
+    def item_changed(self, id_item, name_item):
+        self._changed(self.items, id_item, name_item)
+
+    def tag_changed(self, id_tags, name_tags):
+        self._changed(self.tags, id_tags, name_tags)
+
+    def _changed(self, index: Optional[TrigramIndex], id_: int, name: Optional[str]):
+        if index is None:
+            self.changed_while_loading = True
+            return
+        if name is None:
+            index.remove(id_)
+        else:
+            index.add(id_, name)
+
+
+class PostgresFuzzyIndex(FuzzyIndex):
+
+    async def search_items(self, session, query, limit):
+        return await self._search(session, "items", "id_item", "name_item", query, limit)
+
+    async def search_tags(self, session, query, limit):
+        return await self._search(session, "tags", "id_tags", "name_tags", query, limit)
+
+    async def _search(self, session, table, id_column, name_column, query, limit):
+        results = await session.execute(
+            text(
+                f"SELECT {id_column}, {name_column}, similarity({name_column}, :query) AS score "
+                f"FROM {table} WHERE {name_column} % :query "
+                f"ORDER BY score DESC, {id_column} LIMIT :limit"
+            ),
+            dict(query=query, limit=limit),
+        )
+        return [(row[0], row[1], float(row[2])) for row in results]
+
+
+_fuzzy_indexes = {
+    "sqlite": SQLiteFuzzyIndex(),
+    "postgresql": PostgresFuzzyIndex(),
+}
+
+
+def reset_fuzzy_indexes():
+    # Drop in-process state, e.g. after the tables were recreated
+    _fuzzy_indexes["sqlite"].reset()
+
+
+def get_fuzzy_index(session: AsyncSession) -> FuzzyIndex:
+    dialect = session.bind.dialect.name
+    if dialect not in _fuzzy_indexes:
+        raise NotImplementedError(f"Fuzzy search is not supported on {dialect}")
+    return _fuzzy_indexes[dialect]
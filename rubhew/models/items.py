@@ -1,6 +1,7 @@
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, JSON  # Explicitly import Column and JSON from SQLAlchemy
-from typing import Optional, List
+from sqlalchemy import Column, JSON, Index  # Explicitly import Column and JSON from SQLAlchemy
+from sqlalchemy.orm import declared_attr
+from typing import Literal, Optional, List
 import datetime
 
 # Define CategoryBase for shared fields
@@ -13,6 +14,12 @@ class Category(CategoryBase, table=True):
     __tablename__ = "categories"  # Table name in the database
 
     id_category: Optional[int] = Field(default=None, primary_key=True)
+    # Set on every UPDATE; read by /sync
+    updated_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.utcnow,
+        index=True,
+        sa_column_kwargs={"onupdate": datetime.datetime.utcnow},
+    )
 
     # Relationship to items
     items: List["Item"] = Relationship(back_populates="category")  # type: ignore
@@ -33,6 +40,12 @@ class Tags(TagsBase, table=True):
     __tablename__ = "tags"  # Fixed table name for tags
 
     id_tags: Optional[int] = Field(default=None, primary_key=True)
+    # Set on every UPDATE; read by /sync
+    updated_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.utcnow,
+        index=True,
+        sa_column_kwargs={"onupdate": datetime.datetime.utcnow},
+    )
 
     # Relationship to items
     items: List["ItemTagsLink"] = Relationship(back_populates="tag")  # type: ignore
@@ -43,12 +56,27 @@ class TagsCreate(TagsBase):
 class TagsRead(TagsBase):
     id_tags: int
 
+# Item statuses and the changes allowed from each (see transition_item_status).
+# Rows holding a status from before these were enforced may change to any.
+ItemStatus = Literal["Available", "Progress", "Sold"]
+ITEM_STATUS_TRANSITIONS = {
+    "Available": ("Progress", "Sold"),
+    "Progress": ("Available", "Sold"),
+    "Sold": ("Available",),  # Relisted
+}
+
+
+def item_status_sources(new_status: str) -> List[str]:
+    # Statuses an item may move to new_status from
+    return [status for status, targets in ITEM_STATUS_TRANSITIONS.items() if new_status in targets]
+
+
 # Now we modify the ItemBase and Item to include a relationship with Category and Tags
 class ItemBase(SQLModel):
     name_item: str = Field(index=True)
     description: str
     price: float
-    images: List[str] = Field(sa_column=Column(JSON), default=[])  # Store multiple base64 images as a list of strings
+    images: List[str] = Field(sa_column=Column(JSON), default=[])  # Image URLs from the media store; base64 images are converted on write
     status: str = Field(default="Available")  # Boolean field to represent item status (active/inactive)
     category_id: Optional[int] = Field(default=None, foreign_key="categories.id_category")
 
@@ -61,6 +89,26 @@ class ItemBase(SQLModel):
 # models.py
 class Item(ItemBase, table=True):
     __tablename__ = "items"  # Table name in the database
+    # Composite indexes backing the keyset pagination of GET /items/: an
+    # equality filter (category, status, owner, category + status) leads,
+    # followed by the sort key and id_item, so every sort is read in index
+    # order. Other filters are checked on the rows of the walked index.
+    __table_args__ = (
+        Index("ix_items_created_at_id", "created_at", "id_item"),
+        Index("ix_items_category_created_at_id", "category_id", "created_at", "id_item"),
+        Index("ix_items_status_created_at_id", "status", "created_at", "id_item"),
+        Index("ix_items_user_created_at_id", "id_user", "created_at", "id_item"),
+        Index("ix_items_category_status_created_at_id", "category_id", "status", "created_at", "id_item"),
+        Index("ix_items_price_id", "price", "id_item"),
+        Index("ix_items_category_price_id", "category_id", "price", "id_item"),
+        Index("ix_items_status_price_id", "status", "price", "id_item"),
+        Index("ix_items_user_price_id", "id_user", "price", "id_item"),
+        Index("ix_items_category_status_price_id", "category_id", "status", "price", "id_item"),
+        # Changes since a /sync token
+        Index("ix_items_updated_at_id", "updated_at", "id_item"),
+        # Newest items per category for /feed, which orders by id_item
+        Index("ix_items_category_id", "category_id", "id_item"),
+    )
 
     id_item: Optional[int] = Field(default=None, primary_key=True)
     id_user: Optional[int] = Field(foreign_key="users.id", nullable=False)
@@ -80,11 +128,23 @@ class Item(ItemBase, table=True):
     requests: List["Request"] = Relationship(back_populates="item")  # This creates a back-reference to requests
 
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
-    updated_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+    # Set on every UPDATE of the row; changes to the tags alone must set it explicitly
+    updated_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.utcnow,
+        sa_column_kwargs={"onupdate": datetime.datetime.utcnow},
+    )
+    # Bumped by every UPDATE; ORM flushes only write the version they read
+    # (StaleDataError otherwise), status changes use transition_item_status
+    version: int = Field(default=1)
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
 
 
 # ItemCreate no longer needs `id_user` in the request body
 class ItemCreate(ItemBase):
+    status: ItemStatus = "Available"  # Only known statuses; later changes follow ITEM_STATUS_TRANSITIONS
     tags: List[int] = []  # Add this line
 
 class UserProfile(SQLModel):
@@ -98,7 +158,7 @@ class ItemRead(SQLModel):
     name_item: str
     description: str
     price: float
-    images: List[str]  # Include the list of Base64-encoded images
+    images: List[str]  # Include the list of image URLs
     status: str      # Include the item's status
     detail: Optional[dict] = None
     category_id: int  # Only show category_id, not the full category
@@ -112,7 +172,7 @@ class ItemRead_Only(SQLModel):
     name_item: str
     description: str
     price: float
-    images: List[str]  # Include the list of Base64-encoded images
+    images: List[str]  # Include the list of image URLs
     status: str      # Include the item's status
     detail: Optional[dict] = None
     category_id: int  # Only show category_id, not the full category
@@ -123,7 +183,7 @@ class ItemUpdate(SQLModel):
     description: Optional[str] = None
     price: Optional[float] = None
     images: Optional[List[str]] = None  # Allow updating the list of images
-    status: Optional[str] = None       # Allow updating the status field
+    status: Optional[ItemStatus] = None  # Allow updating the status field
     detail: Optional[dict] = None       # Allow updating the detail field
     category_id: Optional[int] = None   # Allow updating category
     tags: Optional[List[int]] = None     # Allow updating tags
@@ -131,6 +191,8 @@ class ItemUpdate(SQLModel):
 # Association table for the many-to-many relationship between Item and Tags
 class ItemTagsLink(SQLModel, table=True):
     __tablename__ = "item_tags_link"  # Association table name
+    # The primary key covers item -> tags; this one covers tag -> items
+    __table_args__ = (Index("ix_item_tags_link_tag_item", "tag_id", "item_id"),)
 
     item_id: Optional[int] = Field(foreign_key="items.id_item", primary_key=True)
     tag_id: Optional[int] = Field(foreign_key="tags.id_tags", primary_key=True)
@@ -144,12 +206,25 @@ class ItemPost(SQLModel):
     name_item: str
     description: str
     price: float
-    images: List[str]  # Include the list of Base64-encoded images
+    images: List[str]  # Include the list of image URLs
     status: str      # Include the item's status
     detail: Optional[dict] = None
     category_id: int  # Only show category_id, not the full category
 
 class ItemStatusUpdate(SQLModel):
-    status: str  # You can replace this with an Enum if you have predefined statuses
+    status: ItemStatus
+
+# Largest number of items accepted by one bulk create, status change or delete
+MAX_BULK_ITEMS = 500
+
+class ItemBulkStatusUpdate(ItemStatusUpdate):
+    ids: List[int] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+class ItemBulkResult(SQLModel):
+    id_item: int
+    # "not_found" also covers items of other users; "conflict": the item's
+    # status cannot change to the requested one, or the item to be deleted
+    # still has requests or transactions
+    outcome: Literal["updated", "deleted", "not_found", "conflict"]
 
 
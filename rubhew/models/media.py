@@ -0,0 +1,6 @@
+from sqlmodel import SQLModel
+
+
+class MediaRead(SQLModel):
+    hash: str  # SHA-256 of the stored bytes
+    url: str
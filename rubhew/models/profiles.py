@@ -4,7 +4,8 @@ from typing import List, Literal, Optional
 
 from pydantic import BaseModel , ConfigDict
 from sqlmodel import Field , SQLModel , create_engine , Session , select , Relationship
-from sqlalchemy import Column, JSON
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import Column, JSON, Index
 
 from . import users
 
@@ -58,12 +59,41 @@ class DBProfile(ProfileModel , SQLModel , table = True) :
     user_id: int = Field(default=None, foreign_key="users.id")
     user: users.DBUser | None = Relationship()
     
-     # Field for storing followed tags as a list of integers
+    # Legacy JSON lists, only read by scripts/migrate_following.py; follows
+    # live in profile_tag_follow / profile_category_follow
     tag_following: List[int] = Field(sa_column=Column(JSON), default_factory=list)
-
-    # Field for storing followed categories as a list of integers
     category_following: List[int] = Field(sa_column=Column(JSON), default_factory=list)
 
+
+# Follow link tables: the primary key covers user -> followed rows, the
+# second index followed row -> users (fan-out)
+class ProfileTagFollow(SQLModel, table=True):
+    __tablename__ = "profile_tag_follow"
+    __table_args__ = (Index("ix_profile_tag_follow_tag_user", "tag_id", "user_id"),)
+
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    tag_id: int = Field(foreign_key="tags.id_tags", primary_key=True)
+
+class ProfileCategoryFollow(SQLModel, table=True):
+    __tablename__ = "profile_category_follow"
+    __table_args__ = (Index("ix_profile_category_follow_category_user", "category_id", "user_id"),)
+
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    category_id: int = Field(foreign_key="categories.id_category", primary_key=True)
+
+
+async def get_following(session: AsyncSession, user_id: int) -> tuple[List[int], List[int]]:
+    # (followed tag ids, followed category ids), both straight from the primary keys
+    tag_ids = await session.exec(
+        select(ProfileTagFollow.tag_id).where(ProfileTagFollow.user_id == user_id).order_by(ProfileTagFollow.tag_id)
+    )
+    category_ids = await session.exec(
+        select(ProfileCategoryFollow.category_id)
+        .where(ProfileCategoryFollow.user_id == user_id)
+        .order_by(ProfileCategoryFollow.category_id)
+    )
+    return list(tag_ids.all()), list(category_ids.all())
+
 class ProfileList(ProfileModel) :
     model_config = ConfigDict(from_attributes=True)
     profiles : List[Profile]
@@ -1,7 +1,14 @@
-from sqlmodel import SQLModel, Field, Relationship
-from typing import Optional, List
+import collections
+from sqlalchemy import Index, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import declared_attr
+from sqlmodel import SQLModel, Field, Relationship, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Dict, Optional, List, Tuple
 import datetime
 
+from .items import ItemStatus
+
 class RequestBase(SQLModel):
     id_sent: int = Field(foreign_key="users.id")  # Foreign key to the user who sent the request
     id_receive: int = Field(foreign_key="users.id")  # Foreign key to the user who owns the item
@@ -10,12 +17,29 @@ class RequestBase(SQLModel):
     res_message: Optional[str] = Field(default=None)  # Response message from the owner
 
     create_time: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)  # Request creation time
-    update_time: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)  # Request update time
+    update_time: datetime.datetime = Field(  # Request update time, also set on every UPDATE
+        default_factory=datetime.datetime.utcnow,
+        index=True,
+        sa_column_kwargs={"onupdate": datetime.datetime.utcnow},
+    )
+    responded_at: Optional[datetime.datetime] = Field(default=None)  # First response of the owner; pending until then
+    response_read: bool = Field(default=True)  # False from a response until the sender marks it read
 
 class Request(RequestBase, table=True):
     __tablename__ = "requests"
+    # Inbox pages (sent or received, newest update first) walk these in order
+    __table_args__ = (
+        Index("ix_requests_sent_update_time_id", "id_sent", "update_time", "id"),
+        Index("ix_requests_receive_update_time_id", "id_receive", "update_time", "id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Bumped by every UPDATE; a flush over a concurrent write raises StaleDataError
+    version: int = Field(default=1)
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
 
     # Establish the relationship to the Item model
     item: "Item" = Relationship(back_populates="requests")  # This creates a relationship to the Item
@@ -34,6 +58,8 @@ class RequestRead(SQLModel):
     res_message: Optional[str]
     create_time: datetime.datetime
     update_time: datetime.datetime
+    responded_at: Optional[datetime.datetime]
+    response_read: bool
 
 # New schema to handle updates
 class RequestUpdate(SQLModel):
@@ -50,7 +76,7 @@ class UserDetail(SQLModel):
 class ItemDetail(SQLModel):
     id_item: int
     name_item: str
-    images: List[str]  # Assuming images is a list of strings (base64 or URLs)
+    images: List[str]  # Image URLs from the media store
     status: str
 
 class RequestDetailRead(SQLModel):
@@ -62,12 +88,121 @@ class RequestDetailRead(SQLModel):
     res_message: Optional[str]
     create_time: datetime.datetime
     update_time: datetime.datetime
+    responded_at: Optional[datetime.datetime]
+    response_read: bool
     sender: UserDetail
     receiver: UserDetail
     item: ItemDetail
 
 class RequestUpdate(SQLModel):
     res_message: Optional[str] = None
-    item_status: Optional[str] = None  # This will hold the new status for the item
+    item_status: Optional[ItemStatus] = None  # This will hold the new status for the item
+
+
+class RequestMessage(SQLModel, table=True):
+    # Append-only conversation of a request between its sender and receiver
+    __tablename__ = "request_messages"
+    # A thread's messages in id order, from any id on (long polls, pages)
+    __table_args__ = (Index("ix_request_messages_request_id", "id_request", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    id_request: int = Field(foreign_key="requests.id")
+    id_user: int = Field(foreign_key="users.id")  # Author: the sender or the receiver
+    body: str
+    create_time: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+
+class RequestMessageCreate(SQLModel):
+    body: str = Field(min_length=1, max_length=4000)
+
+
+class RequestMessageRead(SQLModel):
+    id: int
+    id_request: int
+    id_user: int
+    body: str
+    create_time: datetime.datetime
+
+
+class RequestCounter(SQLModel, table=True):
+    # Inbox badge counts of one user, kept up to date in the transaction of
+    # every request write (see count_request_change); rebuilt from the
+    # requests by rebuild_request_counters
+    __tablename__ = "request_counters"
+
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    incoming_pending: int = 0  # Received requests not responded to yet
+    outgoing_pending: int = 0  # Sent requests not responded to yet
+    unread_responses: int = 0  # Responses to sent requests not marked read
+
+
+class RequestCountsRead(SQLModel):
+    incoming_pending: int = 0
+    outgoing_pending: int = 0
+    unread_responses: int = 0
+
+
+REQUEST_COUNTERS = tuple(RequestCountsRead.model_fields)
+
+_upsert_inserts = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def request_counts(request: Optional[Request]) -> Dict[Tuple[int, str], int]:
+    # What one request adds to the counters, by (user id, counter)
+    if request is None:
+        return {}
+    if request.responded_at is None:
+        return {(request.id_receive, "incoming_pending"): 1, (request.id_sent, "outgoing_pending"): 1}
+    if not request.response_read:
+        return {(request.id_sent, "unread_responses"): 1}
+    return {}
+
+
+async def count_request_change(
+    session: AsyncSession,
+    before: Dict[Tuple[int, str], int],
+    after: Dict[Tuple[int, str], int],
+):
+    # Apply the difference of request_counts() taken before and after a write
+    # (empty for a created or deleted request), in the write's transaction.
+    # Rows are upserted in user id order, so concurrent writes cannot deadlock.
+    deltas = collections.defaultdict(dict)
+    for user_id, counter in before.keys() | after.keys():
+        delta = after.get((user_id, counter), 0) - before.get((user_id, counter), 0)
+        if delta:
+            deltas[user_id][counter] = delta
+
+    insert = _upsert_inserts[session.bind.dialect.name]
+    for user_id in sorted(deltas):
+        changes = deltas[user_id]
+        statement = insert(RequestCounter).values(
+            user_id=user_id, **{counter: max(delta, 0) for counter, delta in changes.items()}
+        )
+        await session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[RequestCounter.user_id],
+                set_={counter: getattr(RequestCounter, counter) + delta for counter, delta in changes.items()},
+            )
+        )
+
 
+async def rebuild_request_counters(session: AsyncSession) -> int:
+    # Recount every user's counters from the requests, e.g. after a bug or a
+    # manual data fix; returns the number of users with a counter row
+    pending = Request.responded_at.is_(None)
+    counts = collections.defaultdict(dict)
+    for counter, user_column, condition in (
+        ("incoming_pending", Request.id_receive, pending),
+        ("outgoing_pending", Request.id_sent, pending),
+        ("unread_responses", Request.id_sent, ~pending & ~Request.response_read),
+    ):
+        rows = await session.execute(
+            select(user_column, func.count()).where(condition).group_by(user_column)
+        )
+        for user_id, count in rows:
+            counts[user_id][counter] = count
 
+    await session.execute(delete(RequestCounter))
+    session.add_all(RequestCounter(user_id=user_id, **values) for user_id, values in counts.items())
+    await session.commit()
+    return len(counts)
@@ -0,0 +1,267 @@
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import DDL, event, text
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .. import tokenizers
+from .items import Item, ItemTagsLink, Tags
+
+
+# SQLite: FTS5 virtual table keyed by rowid = items.id_item. Documents are
+# stored as space-separated terms from the tokenizer stage, so FTS5 only has
+# to split on spaces ("ascii" keeps every non-ASCII character in the token).
+SQLITE_FTS_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts "
+    "USING fts5(name_item, description, tags, tokenize = 'ascii')"
+)
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(SQLITE_FTS_TABLE).execute_if(dialect="sqlite"),
+)
+event.listen(
+    SQLModel.metadata,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS items_fts").execute_if(dialect="sqlite"),
+)
+
+# Postgres: weighted tsvector per item behind a GIN index
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(
+        "CREATE TABLE IF NOT EXISTS item_search ("
+        "id_item INTEGER PRIMARY KEY REFERENCES items (id_item) ON DELETE CASCADE, "
+        "document TSVECTOR NOT NULL)"
+    ).execute_if(dialect="postgresql"),
+)
+event.listen(
+    SQLModel.metadata,
+    "after_create",
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_item_search_document "
+        "ON item_search USING GIN (document)"
+    ).execute_if(dialect="postgresql"),
+)
+event.listen(
+    SQLModel.metadata,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS item_search").execute_if(dialect="postgresql"),
+)
+
+
+class ItemSearchIndex:
+    # Inverted index over name_item, description and tag names. Ranks are
+    # "lower is better" on every backend so that results can be paginated
+    # with the same (rank, id_item) keyset.
+
+    tokenizer: tokenizers.Tokenizer = tokenizers.get_tokenizer()
+
+    def document_terms(self, document: dict) -> dict:
+        return dict(
+            document,
+            name_item=self.tokenizer.index_terms(document["name_item"]),
+            description=self.tokenizer.index_terms(document["description"]),
+            tags=self.tokenizer.index_terms(document["tags"]),
+        )
+
+    async def index(self, session: AsyncSession, documents: Sequence[dict]):
+        # documents: dicts with id_item, name_item, description and tags
+        raise NotImplementedError
+
+    async def remove(self, session: AsyncSession, id_item: int):
+        raise NotImplementedError
+
+    async def search(
+        self,
+        session: AsyncSession,
+        query: str,
+        limit: int,
+        after: Optional[Tuple[float, int]] = None,
+    ) -> List[Tuple[int, float]]:
+        raise NotImplementedError
+
+    async def clear(self, session: AsyncSession):
+        raise NotImplementedError
+
+
+class SQLiteItemSearchIndex(ItemSearchIndex):
+    # bm25() column weights: name_item, description, tags
+    weights = (10.0, 1.0, 5.0)
+
+    async def index(self, session, documents):
+        if not documents:
+            return
+        await session.execute(
+            text("DELETE FROM items_fts WHERE rowid = :id_item"),
+            [dict(id_item=document["id_item"]) for document in documents],
+        )
+        rows = []
+        for document in documents:
+            terms = self.document_terms(document)
+            rows.append(dict(
+                id_item=document["id_item"],
+                name_item=" ".join(terms["name_item"]),
+                description=" ".join(terms["description"]),
+                tags=" ".join(terms["tags"]),
+            ))
+        await session.execute(
+            text(
+                "INSERT INTO items_fts (rowid, name_item, description, tags) "
+                "VALUES (:id_item, :name_item, :description, :tags)"
+            ),
+            rows,
+        )
+
+    async def remove(self, session, id_item):
+        await session.execute(
+            text("DELETE FROM items_fts WHERE rowid = :id_item"), dict(id_item=id_item)
+        )
+
+    async def search(self, session, query, limit, after=None):
+        terms = self.tokenizer.query_terms(query)
+        if not terms:
+            return []
+        # Quote every term so user input is never parsed as FTS5 syntax
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+        keyset = "WHERE (rank, id_item) > (:rank, :id_item)" if after else ""
+        statement = text(
+            "SELECT id_item, rank FROM ("
+            "SELECT rowid AS id_item, bm25(items_fts, {}, {}, {}) AS rank "
+            "FROM items_fts WHERE items_fts MATCH :match"
+            ") {} ORDER BY rank, id_item LIMIT :limit".format(*self.weights, keyset)
+        )
+        params = dict(match=match, limit=limit)
+        if after:
+            params.update(rank=after[0], id_item=after[1])
+        results = await session.execute(statement, params)
+        return [(row.id_item, row.rank) for row in results]
+
+    async def clear(self, session):
+        # Recreated rather than emptied so a tokenizer change takes effect
+        await session.execute(text("DROP TABLE IF EXISTS items_fts"))
+        await session.execute(text(SQLITE_FTS_TABLE))
+
+
+class PostgresItemSearchIndex(ItemSearchIndex):
+    # Terms from the tokenizer stage become lexemes as-is (array_to_tsvector),
+    # bypassing the text search parser, which splits Thai words on vowel marks
+
+    async def index(self, session, documents):
+        if not documents:
+            return
+        await session.execute(
+            text(
+                "INSERT INTO item_search (id_item, document) VALUES (:id_item, "
+                "setweight(array_to_tsvector(CAST(:name_item AS TEXT[])), 'A') || "
+                "setweight(array_to_tsvector(CAST(:tags AS TEXT[])), 'B') || "
+                "setweight(array_to_tsvector(CAST(:description AS TEXT[])), 'C')) "
+                "ON CONFLICT (id_item) DO UPDATE SET document = EXCLUDED.document"
+            ),
+            [self.document_terms(document) for document in documents],
+        )
+
+    async def remove(self, session, id_item):
+        await session.execute(
+            text("DELETE FROM item_search WHERE id_item = :id_item"), dict(id_item=id_item)
+        )
+
+    async def search(self, session, query, limit, after=None):
+        terms = self.tokenizer.query_terms(query)
+        if not terms:
+            return []
+        tsquery = " & ".join(
+            "'" + term.replace("\\", "\\\\").replace("'", "''") + "'" for term in terms
+        )
+
+        keyset = "WHERE (rank, id_item) > (:rank, :id_item)" if after else ""
+        statement = text(
+            "SELECT id_item, rank FROM ("
+            "SELECT id_item, -ts_rank(document, q.query) AS rank "
+            "FROM item_search, (SELECT CAST(:query AS TSQUERY) AS query) AS q "
+            "WHERE document @@ q.query"
+            ") AS ranked {} ORDER BY rank, id_item LIMIT :limit".format(keyset)
+        )
+        params = dict(query=tsquery, limit=limit)
+        if after:
+            params.update(rank=after[0], id_item=after[1])
+        results = await session.execute(statement, params)
+        return [(row.id_item, float(row.rank)) for row in results]
+
+    async def clear(self, session):
+        await session.execute(text("DELETE FROM item_search"))
+
+
+_search_indexes = {
+    "sqlite": SQLiteItemSearchIndex(),
+    "postgresql": PostgresItemSearchIndex(),
+}
+
+
+def set_search_tokenizer(name: str):
+    ItemSearchIndex.tokenizer = tokenizers.get_tokenizer(name)
+
+
+def get_item_search_index(session: AsyncSession) -> ItemSearchIndex:
+    dialect = session.bind.dialect.name
+    if dialect not in _search_indexes:
+        raise NotImplementedError(f"Item search is not supported on {dialect}")
+    return _search_indexes[dialect]
+
+
+async def reindex_items(session: AsyncSession, item_ids: Sequence[int]):
+    # Bring the search index in line with the current item rows; ids that no
+    # longer exist are removed. Runs inside the caller's transaction.
+    if not item_ids:
+        return
+    search_index = get_item_search_index(session)
+
+    items = (
+        await session.exec(
+            select(Item.id_item, Item.name_item, Item.description).where(Item.id_item.in_(item_ids))
+        )
+    ).all()
+    tag_rows = await session.exec(
+        select(ItemTagsLink.item_id, Tags.name_tags)
+        .join(Tags, Tags.id_tags == ItemTagsLink.tag_id)
+        .where(ItemTagsLink.item_id.in_(item_ids))
+    )
+    tag_names = {}
+    for item_id, name_tags in tag_rows:
+        tag_names.setdefault(item_id, []).append(name_tags)
+
+    await search_index.index(session, [
+        dict(
+            id_item=id_item,
+            name_item=name_item,
+            description=description,
+            tags=" ".join(tag_names.get(id_item, [])),
+        )
+        for id_item, name_item, description in items
+    ])
+    for item_id in set(item_ids) - {id_item for id_item, _, _ in items}:
+        await search_index.remove(session, item_id)
+
+
+async def rebuild_item_search_index(session: AsyncSession, batch_size: int = 1000):
+    # Rebuild the whole index, e.g. after deploying search on an existing database
+    search_index = get_item_search_index(session)
+    await search_index.clear(session)
+
+    last_id = 0
+    while True:
+        item_ids = (
+            await session.exec(
+                select(Item.id_item)
+                .where(Item.id_item > last_id)
+                .order_by(Item.id_item)
+                .limit(batch_size)
+            )
+        ).all()
+        if not item_ids:
+            break
+        await reindex_items(session, item_ids)
+        last_id = item_ids[-1]
+    await session.commit()
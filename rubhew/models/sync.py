@@ -0,0 +1,84 @@
+import datetime
+from typing import List, Optional
+
+from sqlalchemy import Index, event, inspect
+from sqlalchemy.orm import Session
+from sqlmodel import Field, SQLModel, select
+
+from .items import Category, CategoryRead, Item, ItemRead, Tags, TagsRead
+from .requests import Request, RequestDetailRead
+from .transactions import Transaction, TransactionRead
+
+
+class Tombstone(SQLModel, table=True):
+    # One row per deleted item, request, transaction, tag or category, so that
+    # /sync can tell clients what to drop
+    __tablename__ = "tombstones"
+    __table_args__ = (Index("ix_tombstones_deleted_at_id", "deleted_at", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entity: str  # Table name of the deleted row
+    entity_id: int
+    # The parties of a deleted request or transaction, the only users it is
+    # sent to; None for catalogue rows, which are sent to everyone
+    id_user_a: Optional[int] = Field(default=None)
+    id_user_b: Optional[int] = Field(default=None)
+    deleted_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+
+# Tables whose deletes are recorded, by model
+SYNCED_MODELS = {
+    Item: Item.__tablename__,
+    Request: Request.__tablename__,
+    Transaction: Transaction.__tablename__,
+    Tags: Tags.__tablename__,
+    Category: Category.__tablename__,
+}
+
+
+# Users a deleted row is private to, by model
+TOMBSTONE_PARTIES = {
+    Request: lambda request: (request.id_sent, request.id_receive),
+    # The seller is read in the INSERT, the item need not be loaded
+    Transaction: lambda transaction: (
+        transaction.id_user_customer,
+        select(Item.id_user).where(Item.id_item == transaction.id_item).scalar_subquery(),
+    ),
+}
+
+PRIVATE_TOMBSTONE_ENTITIES = [SYNCED_MODELS[model] for model in TOMBSTONE_PARTIES]
+
+
+def record_tombstones(session, entity: str, entity_ids: List[int], parties=(None, None)):
+    # For deletes that bypass the ORM unit of work (delete() statements)
+    id_user_a, id_user_b = parties
+    for entity_id in entity_ids:
+        session.add(Tombstone(entity=entity, entity_id=entity_id, id_user_a=id_user_a, id_user_b=id_user_b))
+
+
+@event.listens_for(Session, "before_flush")
+def record_deleted_rows(session, flush_context, instances):
+    # session.delete() of a synced row leaves a tombstone in the same transaction
+    for instance in list(session.deleted):
+        entity = SYNCED_MODELS.get(type(instance))
+        if entity is not None:
+            parties = TOMBSTONE_PARTIES.get(type(instance), lambda instance: (None, None))(instance)
+            record_tombstones(session, entity, [inspect(instance).identity[0]], parties)
+
+
+class SyncDeleted(SQLModel):
+    items: List[int] = []
+    requests: List[int] = []
+    transactions: List[int] = []
+    tags: List[int] = []
+    categories: List[int] = []
+
+
+class SyncRead(SQLModel):
+    token: str  # Pass as ?since= on the next sync
+    items: List[ItemRead] = []
+    requests: List[RequestDetailRead] = []
+    transactions: List[TransactionRead] = []
+    tags: List[TagsRead] = []
+    categories: List[CategoryRead] = []
+    deleted: SyncDeleted = Field(default_factory=SyncDeleted)
@@ -9,7 +9,11 @@ class TransactionBase(SQLModel):
     address: str
     receipt: str  # Base64 encoded image
     create_time: datetime = Field(default_factory=datetime.utcnow)
-    update_time: datetime = Field(default_factory=datetime.utcnow)
+    update_time: datetime = Field(  # Also set on every UPDATE
+        default_factory=datetime.utcnow,
+        index=True,
+        sa_column_kwargs={"onupdate": datetime.utcnow},
+    )
     status: str = Field(default="Waiting")  # Default status
 
 
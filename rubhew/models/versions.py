@@ -0,0 +1,101 @@
+from typing import Dict, Iterable, Set
+
+from sqlalchemy import DDL, event, inspect, update
+from sqlalchemy.orm import Session
+from sqlmodel import Field, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .items import Category, Item, ItemTagsLink, Tags
+from .users import DBUser
+
+
+class CollectionVersion(SQLModel, table=True):
+    # Counter per cached collection, bumped in the transaction of every write
+    # to it; conditional GETs compare it instead of reading the rows
+    __tablename__ = "collection_versions"
+
+    name: str = Field(primary_key=True)
+    version: int = 0
+
+
+COLLECTIONS = ("items", "tags", "categories")
+
+event.listen(
+    CollectionVersion.__table__,
+    "after_create",
+    DDL(
+        "INSERT INTO collection_versions (name, version) VALUES "
+        + ", ".join(f"('{name}', 0)" for name in COLLECTIONS)
+    ),
+)
+
+# Collections whose representation depends on rows of each model. For
+# DBUser only the names shown in ItemRead.user_profile count; tag names in
+# item reads are covered by routes validating "items" and "tags" together.
+VERSIONED_MODELS = {
+    Item: ("items",),
+    ItemTagsLink: ("items",),
+    Tags: ("tags",),
+    Category: ("categories",),
+    DBUser: ("items",),
+}
+VERSIONED_FIELDS = {
+    DBUser: ("username", "first_name", "last_name"),
+}
+
+
+def mark_changed(session, names: Iterable[str]):
+    # For writes that bypass the ORM unit of work (update()/delete() statements);
+    # session: Session or AsyncSession
+    session.info.setdefault("changed_collections", set()).update(names)
+
+
+def changed_collections(session: Session) -> Set[str]:
+    names = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        collections = VERSIONED_MODELS.get(type(instance))
+        if not collections:
+            continue
+        if instance in session.dirty:
+            if not session.is_modified(instance):
+                continue
+            fields = VERSIONED_FIELDS.get(type(instance))
+            state = inspect(instance)
+            if fields is not None and not any(
+                state.attrs[field].history.has_changes() for field in fields
+            ):
+                continue
+        names.update(collections)
+    return names
+
+
+@event.listens_for(Session, "before_flush")
+def collect_changed_versions(session, flush_context, instances):
+    mark_changed(session, changed_collections(session))
+
+
+@event.listens_for(Session, "before_commit")
+def bump_changed_versions(session):
+    # before_commit runs ahead of the final flush; flush first so every change
+    # is seen. Bumped last, so the counter rows stay locked as briefly as possible.
+    session.flush()
+    for name in sorted(session.info.pop("changed_collections", ())):
+        session.execute(
+            update(CollectionVersion)
+            .where(CollectionVersion.name == name)
+            .values(version=CollectionVersion.version + 1)
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_changed_versions(session):
+    session.info.pop("changed_collections", None)
+
+
+async def get_versions(session: AsyncSession, names: Iterable[str]) -> Dict[str, int]:
+    results = await session.exec(
+        select(CollectionVersion.name, CollectionVersion.version).where(
+            CollectionVersion.name.in_(list(names))
+        )
+    )
+    return dict(results.all())
@@ -0,0 +1,61 @@
+import base64
+import datetime
+import json
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(*values: Any) -> str:
+    # Opaque, URL-safe token holding the sort key of the last row of a page
+    raw = json.dumps(values, default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        values = None
+
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+def parse_cursor_datetime(value: Any) -> datetime.datetime:
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def after_keyset(columns: Sequence, values: Sequence, descending: bool):
+    # Row-value comparison "(a, b) < (:a, :b)" walks the matching composite
+    # index from the previous page's last key, so every page costs the same
+    if descending:
+        return tuple_(*columns) < tuple_(*values)
+    return tuple_(*columns) > tuple_(*values)
+
+
+def order_by_keyset(columns: Sequence, descending: bool) -> list:
+    return [column.desc() if descending else column.asc() for column in columns]
+
+
+def next_cursor(rows: Sequence, limit: int, key) -> Optional[str]:
+    # Pages are fetched with limit + 1 rows; the extra row only signals that
+    # another page exists
+    if len(rows) <= limit:
+        return None
+    return encode_cursor(*key(rows[limit - 1]))
@@ -7,6 +7,11 @@ from . import transactions
 from . import categories
 from . import tags
 from . import requests
+from . import search
+from . import media
+from . import sync
+from . import feed
+from . import events
 def init_router(app):
     app.include_router(root.router)
     app.include_router(profiles.router)
@@ -17,6 +22,11 @@ def init_router(app):
     app.include_router(categories.router)
     app.include_router(tags.router)
     app.include_router(requests.router)
+    app.include_router(search.router)
+    app.include_router(media.router)
+    app.include_router(sync.router)
+    app.include_router(feed.router)
+    app.include_router(events.router)
 
 
 
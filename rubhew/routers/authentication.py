@@ -12,6 +12,7 @@ from typing import Annotated
 import datetime
 
 from .. import config
+from .. import deps
 from .. import models
 from .. import security
 
@@ -58,6 +59,7 @@ async def authentication(
 
     session.add(user)
     await session.commit()
+    await deps.forget_user(user.id)
     await session.refresh(user)
 
     access_token_expires = datetime.timedelta(
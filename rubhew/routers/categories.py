@@ -1,9 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Annotated
 
-from .. import models, deps
+from .. import catalog, conditional, models, deps
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
@@ -26,18 +26,24 @@ async def create_category(
     session.add(new_category)
     await session.commit()
     await session.refresh(new_category)
+    await catalog.changed()
 
     return new_category
 
 
 # Get a category by ID
-@router.get("/{category_id}", response_model=models.CategoryRead)
+@router.get(
+    "/{category_id}",
+    response_model=models.CategoryRead,
+    dependencies=[conditional.collection_etag("categories")],
+)
 async def get_category(
     category_id: int,
     session: Annotated[AsyncSession, Depends(models.get_session)],
     # current_user: models.DBUser = Depends(deps.get_current_user)
-) -> models.Category:
-    category = await session.get(models.Category, category_id)
+) -> models.CategoryRead:
+    # Served from the catalog snapshot
+    category = (await catalog.current()).categories.get(category_id)
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
 
@@ -45,14 +51,19 @@ async def get_category(
 
 
 # List all categories
-@router.get("/", response_model=List[models.CategoryRead])
+@router.get(
+    "/",
+    response_model=List[models.CategoryRead],
+    dependencies=[conditional.collection_etag("categories")],
+)
 async def list_categories(
+    response: Response,
     session: Annotated[AsyncSession, Depends(models.get_session)],
     # current_user: models.DBUser = Depends(deps.get_current_user)
-) -> List[models.Category]:
-    statement = select(models.Category)
-    results = await session.exec(statement)
-    return results.all()
+):
+    # Pre-encoded by the catalog snapshot
+    snapshot = await catalog.current()
+    return Response(snapshot.categories_json, media_type="application/json", headers=dict(response.headers))
 
 
 # Update a category by ID
@@ -73,6 +84,7 @@ async def update_category(
     session.add(category)
     await session.commit()
     await session.refresh(category)
+    await catalog.changed()
 
     return category
 
@@ -90,3 +102,4 @@ async def delete_category(
 
     await session.delete(category)
     await session.commit()
+    await catalog.changed()
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from .. import deps, events, models
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+@router.get("")
+async def stream_events(current_user: models.DBUser = Depends(deps.get_current_user)) -> StreamingResponse:
+    # Server-Sent Events telling the current user that one of their requests,
+    # transactions or requested items changed, so the client refetches only
+    # then (GET /sync) instead of polling. "resync" means events were dropped.
+    return StreamingResponse(
+        events.iter_events(current_user.id),
+        media_type=events.EVENT_STREAM_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
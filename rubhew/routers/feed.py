@@ -0,0 +1,85 @@
+from typing import Annotated, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import union_all
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .. import deps, loaders, models, pagination, thumbnails
+
+router = APIRouter(prefix="/feed", tags=["feed"])
+
+# Followed tags plus categories read per page
+MAX_FEED_SOURCES = 200
+
+
+def source_pages(tag_ids: List[int], category_ids: List[int], before: Optional[int], size: int):
+    # Newest item ids of every followed tag and category, each a short range
+    # scan of ix_item_tags_link_tag_item or ix_items_category_id; id_item
+    # grows with creation time, so it orders both by recency
+    pages = []
+    for tag_id in tag_ids:
+        statement = select(models.ItemTagsLink.item_id.label("id_item")).where(
+            models.ItemTagsLink.tag_id == tag_id
+        )
+        if before is not None:
+            statement = statement.where(models.ItemTagsLink.item_id < before)
+        pages.append(statement.order_by(models.ItemTagsLink.item_id.desc()).limit(size))
+    for category_id in category_ids:
+        statement = select(models.Item.id_item).where(models.Item.category_id == category_id)
+        if before is not None:
+            statement = statement.where(models.Item.id_item < before)
+        pages.append(statement.order_by(models.Item.id_item.desc()).limit(size))
+    return pages
+
+
+@router.get("", response_model=List[models.ItemRead])
+async def get_feed(
+    response: Response,
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    current_user: models.DBUser = Depends(deps.get_current_user),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    # Newest items in the tags and categories the user follows; the cursor of
+    # the next page is returned in the X-Next-Cursor header. Each source
+    # contributes at most one page, and the database merges them k-way, so a
+    # page costs the same however large the catalogue is.
+    tag_ids, category_ids = await models.get_following(session, current_user.id)
+    tag_ids = tag_ids[:MAX_FEED_SOURCES]
+    category_ids = category_ids[:MAX_FEED_SOURCES - len(tag_ids)]
+    if not tag_ids and not category_ids:
+        return []
+
+    before = None
+    if cursor:
+        [before] = pagination.decode_cursor(cursor, 1)
+        if not isinstance(before, int):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    pages = [
+        select(page.subquery().c.id_item)
+        for page in source_pages(tag_ids, category_ids, before, limit + 1)
+    ]
+    merged = union_all(*pages).subquery()
+    statement = (
+        select(merged.c.id_item).distinct().order_by(merged.c.id_item.desc()).limit(limit + 1)
+    )
+    item_ids = (await session.exec(statement)).all()
+
+    next_cursor = pagination.next_cursor(item_ids, limit, lambda id_item: (id_item,))
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+
+    item_ids = item_ids[:limit]
+    items = {
+        item.id_item: item
+        for item in await loaders.load_items(
+            session, select(models.Item).where(models.Item.id_item.in_(item_ids))
+        )
+    }
+    return [
+        loaders.build_item_read(items[id_item], models.ItemRead, thumbnails.LIST_IMAGE_SIZE)
+        for id_item in item_ids
+        if id_item in items
+    ]
@@ -1,16 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, Query, Request, Response, status
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from typing import List, Annotated
-from sqlalchemy import delete  # เพิ่มการนำเข้าคำสั่ง delete
+from typing import List, Annotated, Literal, Optional
+import datetime
+from sqlalchemy import delete, insert, update  # เพิ่มการนำเข้าคำสั่ง delete
 
-from .. import models, deps
+from .. import catalog, coalesce, concurrency, conditional, models, deps, fieldsets, item_cards, loaders, media, pagination, streaming, thumbnails
 
 router = APIRouter(prefix="/items", tags=["items"])
 
 @router.post("/", response_model=models.ItemPost, status_code=status.HTTP_201_CREATED)
 async def create_item(
     item: models.ItemCreate,
+    background_tasks: BackgroundTasks,
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.DBUser = Depends(deps.get_current_user)
 ) -> models.Item:
@@ -19,7 +21,7 @@ async def create_item(
         name_item=item.name_item,
         description=item.description,
         price=item.price,
-        images=item.images,
+        images=await media.store_images(item.images),  # Keep only URLs in the row
         status=item.status,
         detail=item.detail,
         category_id=item.category_id,
@@ -37,126 +39,369 @@ async def create_item(
             item_tag_link = models.ItemTagsLink(item_id=new_item.id_item, tag_id=tag_id)
             session.add(item_tag_link)
 
-        await session.commit()  # Commit after adding tags
+    # Index the item for /items/search in the same transaction as its tags
+    await models.reindex_items(session, [new_item.id_item])
+    await session.commit()  # Commit after adding tags
+    models.get_fuzzy_index(session).item_changed(new_item.id_item, new_item.name_item)
+    background_tasks.add_task(thumbnails.generate_thumbnails, thumbnails.stored_keys(new_item.images))
 
     return new_item
 
 
-@router.get("/my-items/", response_model=List[models.ItemRead_Only])
-async def get_user_items(
+MAX_BULK_ITEMS = models.MAX_BULK_ITEMS
+
+
+async def check_catalog_ids(category_ids=(), tag_ids=()):
+    # Checked against the catalog snapshot, which is only reloaded when it
+    # lacks one of the ids
+    snapshot = await catalog.covering(category_ids, tag_ids)
+    for name, ids, known in (
+        ("categories", set(category_ids), snapshot.categories),
+        ("tags", set(tag_ids), snapshot.tags),
+    ):
+        missing = ids - known.keys()
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown {name}: {', '.join(map(str, sorted(missing)))}",
+            )
+
+
+@router.post("/bulk", response_model=List[models.ItemPost], status_code=status.HTTP_201_CREATED)
+async def create_items(
+    items: Annotated[List[models.ItemCreate], Body(min_length=1, max_length=MAX_BULK_ITEMS)],
+    background_tasks: BackgroundTasks,
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.DBUser = Depends(deps.get_current_user)
-) -> List[models.ItemRead_Only]:
-    # Fetch items for the current user
-    statement = select(models.Item).where(models.Item.id_user == current_user.id)
-    results = await session.exec(statement)
-    items = results.all()
-
-    item_reads = []
-    for item in items:
-        # Fetch the category using the category_id from the item
-        category_details = None
-        if item.category_id:
-            category = await session.get(models.Category, item.category_id)
-            if category:
-                category_details = {
-                    "name_category": category.name_category,
-                    "category_image": category.category_image
-                }
-
-        # Fetch the tags linked to the item
-        tags = []
-        item_tags = await session.exec(
-            select(models.ItemTagsLink).where(models.ItemTagsLink.item_id == item.id_item)
-        )
-        for item_tag in item_tags:
-            tag = await session.get(models.Tags, item_tag.tag_id)
-            if tag:
-                tags.append(models.TagsRead(
-                    id_tags=tag.id_tags,
-                    name_tags=tag.name_tags
-                ))
-
-        # Add the item with category details and tags to the response
-        item_reads.append(models.ItemRead_Only(
-           
-            id_item=item.id_item,
+) -> List[models.Item]:
+    # Create many items in one transaction: the referenced ids are checked
+    # against the catalog snapshot, the items are inserted as one batch with
+    # RETURNING, then all their tag links as another. Either every item is
+    # created or none is.
+    await check_catalog_ids(
+        category_ids={item.category_id for item in items if item.category_id is not None},
+        tag_ids={tag_id for item in items for tag_id in item.tags},
+    )
+
+    now = datetime.datetime.utcnow()
+    rows = [
+        dict(
             name_item=item.name_item,
             description=item.description,
             price=item.price,
-            images=item.images,
+            images=await media.store_images(item.images),  # Keep only URLs in the rows
             status=item.status,
             detail=item.detail,
             category_id=item.category_id,
-            tags=tags,
-        ))
+            id_user=current_user.id,
+            created_at=now,
+            updated_at=now,
+        )
+        for item in items
+    ]
+    new_items = (
+        await session.scalars(
+            insert(models.Item).returning(models.Item, sort_by_parameter_order=True), rows
+        )
+    ).all()
+
+    links = [
+        dict(item_id=new_item.id_item, tag_id=tag_id)
+        for item, new_item in zip(items, new_items)
+        for tag_id in dict.fromkeys(item.tags)
+    ]
+    if links:
+        await session.execute(insert(models.ItemTagsLink), links)
+
+    # Statement inserts bypass the unit of work the version counters watch
+    models.mark_changed(session, ["items"])
+    await models.reindex_items(session, [new_item.id_item for new_item in new_items])
+    await session.commit()
+
+    fuzzy_index = models.get_fuzzy_index(session)
+    for new_item in new_items:
+        fuzzy_index.item_changed(new_item.id_item, new_item.name_item)
+    background_tasks.add_task(
+        thumbnails.generate_thumbnails,
+        [key for new_item in new_items for key in thumbnails.stored_keys(new_item.images)],
+    )
+    return new_items
+
+
+@router.get("/my-items/", response_model=List[models.ItemRead_Only])
+async def get_user_items(
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    current_user: models.DBUser = Depends(deps.get_current_user),
+    fields: Optional[str] = None,
+) -> List[models.ItemRead_Only]:
+    # Fetch items for the current user together with their tags;
+    # "?fields=a,b" returns (and reads) only those fields
+    selected = fieldsets.parse_fields(fields, models.ItemRead_Only, always=["id_item"])
+    statement = select(models.Item).where(models.Item.id_user == current_user.id)
+    item_reads = await loaders.load_item_reads(
+        session, statement, models.ItemRead_Only, thumbnails.LIST_IMAGE_SIZE, selected
+    )
+    return item_reads if selected is None else fieldsets.sparse_response(item_reads)
+
 
-    return item_reads
 
+# Sort orders of GET /items/: (sort column, descending); id_item breaks ties
+ITEM_SORTS = {
+    "newest": (models.Item.created_at, True),
+    "oldest": (models.Item.created_at, False),
+    "price_asc": (models.Item.price, False),
+    "price_desc": (models.Item.price, True),
+}
 
 
-@router.get("/", response_model=List[models.ItemRead])
+@router.get(
+    "/",
+    response_model=List[models.ItemRead],
+    dependencies=[conditional.collection_etag("items", "tags")],
+)
 async def list_items(
-    session: Annotated[AsyncSession, Depends(models.get_session)]
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    sort: Literal["newest", "oldest", "price_asc", "price_desc"] = "newest",
+    category_id: Optional[int] = None,
+    item_status: Optional[str] = Query(default=None, alias="status"),
+    tag: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    id_user: Optional[int] = None,
+    fields: Optional[str] = None,
 ):
-    # Fetch all items from the database
+    # Fetch one page of items with their tags and owner profile; the cursor
+    # of the next page is returned in the X-Next-Cursor header.
+    # "?fields=a,b" returns (and reads) only those fields.
+    # "Accept: application/x-ndjson" streams every matching item instead of
+    # one page (limit is ignored), one per line, starting after the cursor.
+    selected = fieldsets.parse_fields(fields, models.ItemRead, always=["id_item"])
+    sort_column, descending = ITEM_SORTS[sort]
+    keyset = (sort_column, models.Item.id_item)
+
     statement = select(models.Item)
-    results = await session.exec(statement)
-    items = results.all()
-
-    item_reads = []
-    for item in items:
-        # Fetch the category using the category_id from the item
-        category_details = None
-        if item.category_id:
-            category = await session.get(models.Category, item.category_id)
-            if category:
-                category_details = {
-                    "name_category": category.name_category,
-                    "category_image": category.category_image
-                }
-
-        # Fetch the tags linked to the item
-        tags = []
-        item_tags = await session.exec(
-            select(models.ItemTagsLink).where(models.ItemTagsLink.item_id == item.id_item)
+    if category_id is not None:
+        statement = statement.where(models.Item.category_id == category_id)
+    if item_status is not None:
+        statement = statement.where(models.Item.status == item_status)
+    if id_user is not None:
+        statement = statement.where(models.Item.id_user == id_user)
+    if min_price is not None:
+        statement = statement.where(models.Item.price >= min_price)
+    if max_price is not None:
+        statement = statement.where(models.Item.price <= max_price)
+    if tag is not None:
+        # A per-row probe of the (item_id, tag_id) key while the sort index is
+        # walked in order; "IN (tag's items)" would read and sort all of them.
+        # A page of a rare tag reads more items until it is full.
+        statement = statement.where(
+            select(models.ItemTagsLink.item_id)
+            .where(models.ItemTagsLink.item_id == models.Item.id_item, models.ItemTagsLink.tag_id == tag)
+            .exists()
         )
-        for item_tag in item_tags:
-            tag = await session.get(models.Tags, item_tag.tag_id)
-            if tag:
-                tags.append(models.TagsRead(
-                    id_tags=tag.id_tags,
-                    name_tags=tag.name_tags
-                ))
-        # Fetch user profile details using id_user from the item
-        user_profile = None
-        if item.id_user:
-            user = await session.get(models.DBUser, item.id_user) 
-            if user:
-                user_profile = {
-                    "username": user.username,  # Adjust according to your user model fields
-                    "first_name" : user.first_name,
-                    "last_name" : user.last_name
-
-                }
-        # Add the item with category details and tags to the response list
-        item_reads.append(models.ItemRead(
-            id_user=item.id_user,
-            id_item=item.id_item,
-            name_item=item.name_item,
-            description=item.description,
-            price=item.price,
-            images=item.images,
-            status=item.status,
-            detail=item.detail,
-            category_id=item.category_id,
-            tags=tags,  # Include tags in the response
-            user_profile=user_profile 
-        ))
 
-    return item_reads
+    if cursor:
+        last_sort_value, last_id = pagination.decode_cursor(cursor, 2)
+        if sort_column is models.Item.created_at:
+            last_sort_value = pagination.parse_cursor_datetime(last_sort_value)
+        statement = statement.where(
+            pagination.after_keyset(keyset, (last_sort_value, last_id), descending)
+        )
+
+    statement = statement.order_by(*pagination.order_by_keyset(keyset, descending))
+
+    if streaming.wants_ndjson(request):
+        async def build_rows(stream_session, items):
+            await loaders.cover_catalog(items, selected)
+            return [
+                loaders.build_item_read(item, models.ItemRead, thumbnails.LIST_IMAGE_SIZE, selected)
+                for item in items
+            ]
+
+        options = loaders.item_read_options(fields=selected, extra_columns=(sort_column,))
+        return streaming.ndjson_response(statement.options(*options), build_rows)
+
+    statement = statement.limit(limit + 1)
+
+    async def build_page():
+        # Body and next cursor of the page. Shared by concurrent identical
+        # requests, so it is read with a session of its own.
+        async with models.new_session() as page_session:
+            if selected is None:
+                # Full items are assembled from the encoded cards of the page's ids
+                keys = (
+                    await page_session.execute(statement.with_only_columns(models.Item.id_item, sort_column))
+                ).all()
+                item_ids = [id_item for id_item, _ in keys[:limit]]
+                cards = await item_cards.get_cards(page_session, item_ids)
+                body = item_cards.join_cards(
+                    cards[id_item].list_json for id_item in item_ids if id_item in cards
+                )
+                return body, pagination.next_cursor(keys, limit, lambda key: (key[1], key[0]))
+
+            items = await loaders.load_items(
+                page_session, statement, fields=selected, extra_columns=(sort_column,)
+            )
+            item_reads = [
+                loaders.build_item_read(item, models.ItemRead, thumbnails.LIST_IMAGE_SIZE, selected)
+                for item in items[:limit]
+            ]
+            next_cursor = pagination.next_cursor(
+                items, limit, lambda item: (getattr(item, sort_column.key), item.id_item)
+            )
+            return fieldsets.sparse_response(item_reads).body, next_cursor
+
+    # The ETag (collection versions) is part of the key: pages are shared
+    # between requests that saw the same writes, never across one
+    body, next_cursor = await coalesce.listings.get(
+        coalesce.request_key(request, response.headers.get("etag")), build_page
+    )
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return Response(body, media_type="application/json", headers=dict(response.headers))
+
 
 
+@router.get("/search", response_model=List[models.ItemRead])
+async def search_items(
+    response: Response,
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    q: str = Query(min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    fields: Optional[str] = None,
+):
+    # Full-text search over name, description and tags, best matches first;
+    # the cursor of the next page is returned in the X-Next-Cursor header
+    selected = fieldsets.parse_fields(fields, models.ItemRead, always=["id_item"])
+    after = None
+    if cursor:
+        last_rank, last_id = pagination.decode_cursor(cursor, 2)
+        after = (last_rank, last_id)
+
+    search_index = models.get_item_search_index(session)
+    hits = await search_index.search(session, q, limit + 1, after)
+
+    next_cursor = pagination.next_cursor(hits, limit, lambda hit: (hit[1], hit[0]))
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+
+    item_ids = [item_id for item_id, _ in hits[:limit]]
+    statement = select(models.Item).where(models.Item.id_item.in_(item_ids))
+    items = {
+        item.id_item: item
+        for item in await loaders.load_items(session, statement, fields=selected)
+    }
+
+    item_reads = [
+        loaders.build_item_read(items[item_id], models.ItemRead, thumbnails.LIST_IMAGE_SIZE, selected)
+        for item_id in item_ids
+        if item_id in items
+    ]
+    return item_reads if selected is None else fieldsets.sparse_response(item_reads, response)
+
+
+
+def bulk_results(
+    ids: List[int], changed: List[int], outcome: str, conflicts: List[int] = ()
+) -> List[models.ItemBulkResult]:
+    # One outcome per requested id, in request order
+    changed, conflicts = set(changed), set(conflicts)
+    return [
+        models.ItemBulkResult(
+            id_item=item_id,
+            outcome=outcome if item_id in changed else "conflict" if item_id in conflicts else "not_found",
+        )
+        for item_id in dict.fromkeys(ids)
+    ]
+
+
+def item_unreferenced() -> tuple:
+    # Conditions on items that no request or transaction refers to; only
+    # those can be deleted without breaking (and orphaning the counters of)
+    # the rows that do
+    return (
+        ~select(models.Request.id).where(models.Request.id_item == models.Item.id_item).exists(),
+        ~select(models.Transaction.id_transaction)
+        .where(models.Transaction.id_item == models.Item.id_item)
+        .exists(),
+    )
+
+
+# Registered ahead of /{item_id}, which would otherwise match "status"
+@router.put("/status", response_model=List[models.ItemBulkResult])
+async def change_items_status(
+    item_status_update: models.ItemBulkStatusUpdate,
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    current_user: models.DBUser = Depends(deps.get_current_user)
+) -> List[models.ItemBulkResult]:
+    # One conditional UPDATE for all the listed items of the current user
+    # whose status may change to the new one (see models.ITEM_STATUS_TRANSITIONS)
+    ids = item_status_update.ids
+    new_status = item_status_update.status
+    owned = (models.Item.id_item.in_(ids), models.Item.id_user == current_user.id)
+    updated = (
+        await session.scalars(
+            update(models.Item)
+            .where(
+                *owned,
+                models.Item.status.in_(models.item_status_sources(new_status))
+                | models.Item.status.not_in(list(models.ITEM_STATUS_TRANSITIONS)),
+            )
+            .values(status=new_status, version=models.Item.version + 1)
+            .returning(models.Item.id_item)
+        )
+    ).all()
+    # Items left out either already had the status or cannot move to it
+    left = (
+        await session.execute(
+            select(models.Item.id_item, models.Item.status).where(
+                *owned, models.Item.id_item.not_in(updated)
+            )
+        )
+    ).all()
+    unchanged = [item_id for item_id, item_status in left if item_status == new_status]
+    conflicts = [item_id for item_id, item_status in left if item_status != new_status]
+    # Statement writes bypass the unit of work the version counters watch
+    models.mark_changed(session, ["items"])
+    await session.commit()
+    await item_cards.invalidate(updated)
+    return bulk_results(ids, [*updated, *unchanged], "updated", conflicts)
+
+
+@router.delete("", response_model=List[models.ItemBulkResult])
+async def delete_items(
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    current_user: models.DBUser = Depends(deps.get_current_user),
+    ids: List[int] = Query(max_length=MAX_BULK_ITEMS),
+) -> List[models.ItemBulkResult]:
+    # "?ids=1&ids=2": delete the listed items of the current user and their
+    # tag links with one statement each. Items still referenced by requests or
+    # transactions are kept and reported as "conflict" (see item_unreferenced).
+    owned = (models.Item.id_item.in_(ids), models.Item.id_user == current_user.id)
+    unreferenced = item_unreferenced()
+    deletable = select(models.Item.id_item).where(*owned, *unreferenced)
+    await session.execute(delete(models.ItemTagsLink).where(models.ItemTagsLink.item_id.in_(deletable)))
+    deleted = (
+        await session.scalars(
+            delete(models.Item).where(*owned, *unreferenced).returning(models.Item.id_item)
+        )
+    ).all()
+    conflicts = (await session.scalars(select(models.Item.id_item).where(*owned))).all()
+
+    models.record_tombstones(session, models.Item.__tablename__, deleted)
+    models.mark_changed(session, ["items"])
+    await models.reindex_items(session, deleted)  # Drops the search entries of deleted ids
+    await session.commit()
+    await item_cards.invalidate(deleted)
+    fuzzy_index = models.get_fuzzy_index(session)
+    for item_id in deleted:
+        fuzzy_index.item_changed(item_id, None)
+    return bulk_results(ids, deleted, "deleted", conflicts)
+
 
 @router.get("/{item_id}", response_model=models.ItemRead_Only)
 async def get_item(
@@ -164,53 +409,20 @@ async def get_item(
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.DBUser = Depends(deps.get_current_user)
 ):
-    # Fetch the item first
-    item = await session.get(models.Item, item_id)
+    # Fetch the item with its tags, only if it belongs to the current user
+    card = (await item_cards.get_cards(session, [item_id])).get(item_id)
 
-    if not item or item.id_user != current_user.id:
+    if not card or card.id_user != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
 
-    # Fetch the category using the category_id from the item
-    category_details = None
-    if item.category_id:
-        category = await session.get(models.Category, item.category_id)
-        if category:
-            category_details = {
-                "name_category": category.name_category,
-                "category_image": category.category_image
-            }
-
-    # Fetch the tags linked to the item
-    tags = []
-    item_tags = await session.exec(
-        select(models.ItemTagsLink).where(models.ItemTagsLink.item_id == item.id_item)
-    )
-    for item_tag in item_tags:
-        tag = await session.get(models.Tags, item_tag.tag_id)
-        if tag:
-            tags.append(models.TagsRead(
-                id_tags=tag.id_tags,
-                name_tags=tag.name_tags  # Assuming your Tags model has a name_tags field
-            ))
-
-    # Return the item with category and tags
-    return models.ItemRead_Only(
-        id_item=item.id_item,
-        name_item=item.name_item,
-        description=item.description,
-        price=item.price,
-        images=item.images,
-        status=item.status,
-        detail=item.detail,
-        category_id=item.category_id,
-        tags=tags  # Include tags in the response
-    )
+    return Response(card.detail_json, media_type="application/json")
 
 
 @router.put("/{item_id}", response_model=models.ItemRead)
 async def update_item(
     item_id: int,
     item_update: models.ItemUpdate,
+    background_tasks: BackgroundTasks,
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.DBUser = Depends(deps.get_current_user)
 ) -> models.ItemRead:
@@ -223,31 +435,59 @@ async def update_item(
     
     # If category_id is provided, validate that it exists
     if item_update.category_id is not None:
-        category = await session.get(models.Category, item_update.category_id)
-        if not category:
+        snapshot = await catalog.covering(category_ids=[item_update.category_id])
+        if item_update.category_id not in snapshot.categories:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid category")
 
+    # A status change must be allowed from the current one
+    if item_update.status is not None:
+        await concurrency.transition_item_status(session, item, item_update.status)
+
     # Update the item with the provided fields, excluding unset fields
-    for key, value in item_update.dict(exclude_unset=True).items():
+    for key, value in item_update.dict(exclude_unset=True, exclude={"status"}).items():
+        if key == "images" and value is not None:
+            value = await media.store_images(value)  # Keep only URLs in the row
+            background_tasks.add_task(thumbnails.generate_thumbnails, thumbnails.stored_keys(value))
         if key != "tags":  # Skip 'tags' update here
             setattr(item, key, value)
 
-    # Update the tags if provided
+    # Update the tags if provided, writing only the links that differ
+    tags_changed = False
     if item_update.tags is not None:
-        # Clear existing tags
-        await session.execute(
-            delete(models.ItemTagsLink).where(models.ItemTagsLink.item_id == item_id)
+        tag_ids = set(item_update.tags)
+        await check_catalog_ids(tag_ids=tag_ids)
+        current = set(
+            (
+                await session.exec(
+                    select(models.ItemTagsLink.tag_id).where(models.ItemTagsLink.item_id == item_id)
+                )
+            ).all()
         )
-        # Add updated tags
-        for tag_id in item_update.tags:
-            new_link = models.ItemTagsLink(item_id=item_id, tag_id=tag_id)
-            session.add(new_link)
+        removed, added = current - tag_ids, tag_ids - current
+        if removed:
+            await session.execute(
+                delete(models.ItemTagsLink).where(
+                    models.ItemTagsLink.item_id == item_id, models.ItemTagsLink.tag_id.in_(removed)
+                )
+            )
+        for tag_id in added:
+            session.add(models.ItemTagsLink(item_id=item_id, tag_id=tag_id))
+        tags_changed = bool(removed or added)
+        if tags_changed:
+            item.updated_at = datetime.datetime.utcnow()  # The item row itself may be unchanged
 
     # Add the updated item to the session
     session.add(item)
+
+    # Keep the search index in sync when an indexed field changes
+    if tags_changed or item_update.model_fields_set & {"name_item", "description"}:
+        await models.reindex_items(session, [item_id])
     
     # Commit the transaction
     await session.commit()
+    await item_cards.invalidate([item_id])
+    if "name_item" in item_update.model_fields_set:
+        models.get_fuzzy_index(session).item_changed(item_id, item.name_item)
     
     # Refresh the item to get the updated data
     await session.refresh(item)
@@ -296,14 +536,27 @@ async def delete_item(
     if not item or item.id_user != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
 
+    # Items with requests or transactions are kept, as by DELETE /items
+    deletable = await session.exec(
+        select(models.Item.id_item).where(models.Item.id_item == item_id, *item_unreferenced())
+    )
+    if deletable.first() is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Item has requests or transactions and cannot be deleted",
+        )
+
     # Delete associated tags
     await session.execute(
         delete(models.ItemTagsLink).where(models.ItemTagsLink.item_id == item_id)
     )
 
-    # Delete the item itself
+    # Delete the item itself and its search index entry
     await session.delete(item)
+    await models.get_item_search_index(session).remove(session, item_id)
     await session.commit()
+    await item_cards.invalidate([item_id])
+    models.get_fuzzy_index(session).item_changed(item_id, None)
 
     return {"message": "Item and associated tags deleted successfully"}
 
@@ -315,21 +568,23 @@ async def change_item_status(
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.DBUser = Depends(deps.get_current_user)
 ) -> models.ItemRead:
-    # Fetch the item to be updated
-    item = await session.get(models.Item, item_id)
+    async def attempt():
+        # Fetch the item to be updated
+        item = await session.get(models.Item, item_id)
 
-    # Check if the item exists and belongs to the current user
-    if not item or item.id_user != current_user.id:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+        # Check if the item exists and belongs to the current user
+        if not item or item.id_user != current_user.id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
 
-    # Update the item's status
-    item.status = item_status_update.status  # Update the status
+        # Update the item's status, if the state machine allows it
+        await concurrency.transition_item_status(session, item, item_status_update.status)
 
-    # Add the updated item to the session
-    session.add(item)
+        # Commit the transaction
+        await session.commit()
+        return item
 
-    # Commit the transaction
-    await session.commit()
+    item = await concurrency.retry_on_conflict(session, attempt)
+    await item_cards.invalidate([item_id])
 
     # Refresh the item to get the updated data
     await session.refresh(item)
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, UploadFile, status
+from fastapi.responses import RedirectResponse
+
+from .. import config, deps, media, models, thumbnails
+
+router = APIRouter(prefix="/media", tags=["media"])
+
+settings = config.get_settings()
+
+# Blobs are addressed by their SHA-256, so a URL always serves the same bytes
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.post("/", response_model=models.MediaRead, status_code=status.HTTP_201_CREATED)
+async def upload_media(
+    file: UploadFile,
+    background_tasks: BackgroundTasks,
+    current_user: models.DBUser = Depends(deps.get_current_user)
+) -> models.MediaRead:
+    data = await file.read(settings.MEDIA_MAX_BYTES + 1)
+    if len(data) > settings.MEDIA_MAX_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+    if not media.sniff_image_type(data):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image type")
+
+    media_store = media.get_media_store()
+    key = await media_store.put(data)
+    background_tasks.add_task(thumbnails.generate_thumbnails, [key])
+    return models.MediaRead(hash=key, url=media_store.url(key))
+
+
+@router.get("/{key}")
+async def get_media(key: str):
+    path = await media.get_media_store().get_path(key)
+    if not path:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
+
+    # Read inline, not by FileResponse's worker threads (see thumbnails.py)
+    with open(path, "rb") as blob:
+        data = blob.read()
+    return Response(
+        content=data,
+        media_type=media.sniff_image_type(data),
+        headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{key}"'},
+    )
+
+
+@router.get("/{key}/{size}")
+async def get_thumbnail(key: str, size: int):
+    if size not in thumbnails.THUMBNAIL_SIZES:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
+
+    media_store = media.get_media_store()
+    path = await media_store.get_thumbnail_path(key, size)
+    if not path:
+        # Not rendered (yet): send the original without letting the redirect be cached
+        if not await media_store.get_path(key):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
+        return RedirectResponse(
+            media_store.url(key),
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+            headers={"Cache-Control": "no-store"},
+        )
+
+    with open(path, "rb") as blob:
+        data = blob.read()
+    return Response(
+        content=data,
+        media_type=media.sniff_image_type(data),
+        headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{key}_{size}"'},
+    )
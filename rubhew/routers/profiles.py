@@ -1,8 +1,9 @@
 from fastapi import APIRouter , HTTPException , Depends , status
 
-from typing import Optional , Annotated
+from typing import Literal, Optional , Annotated
 
 from sqlmodel import Field , SQLModel , Session , select , func
+from sqlalchemy import delete
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 import math 
@@ -23,7 +24,10 @@ async def get_user_profile(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-    return profile
+    tag_ids, category_ids = await models.get_following(session, current_user.id)
+    return models.Profile.model_validate(profile).model_copy(
+        update=dict(tag_following=tag_ids, category_following=category_ids)
+    )
 
 @router.put("/updateMyprofile", response_model=models.UpdateProfileModel)
 async def update_profile(
@@ -46,23 +50,84 @@ async def update_profile(
 
     return profile
 
+# (link model, followed id column, followed table, followed primary key) per kind
+FOLLOW_KINDS = {
+    "tags": (models.ProfileTagFollow, models.ProfileTagFollow.tag_id, models.Tags, models.Tags.id_tags),
+    "categories": (
+        models.ProfileCategoryFollow,
+        models.ProfileCategoryFollow.category_id,
+        models.Category,
+        models.Category.id_category,
+    ),
+}
+
+
+async def check_followable(session: AsyncSession, kind: str, ids: set):
+    _, _, target, target_id = FOLLOW_KINDS[kind]
+    if not ids:
+        return
+    found = await session.exec(select(target_id).where(target_id.in_(ids)))
+    missing = ids - set(found.all())
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown {kind}: {', '.join(map(str, sorted(missing)))}",
+        )
+
+
+async def set_following(session: AsyncSession, kind: str, user_id: int, ids: set):
+    # Only the difference with the stored follows is written
+    link, column, _, _ = FOLLOW_KINDS[kind]
+    current = set(
+        (await session.exec(select(column).where(link.user_id == user_id))).all()
+    )
+    removed = current - ids
+    if removed:
+        await session.execute(delete(link).where(link.user_id == user_id, column.in_(removed)))
+    for followed_id in ids - current:
+        session.add(link(user_id=user_id, **{column.key: followed_id}))
+
+
 @router.put("/updateMyFollowing", response_model=models.UpdateFollowingModel)
-async def update_profile(
+async def update_following(
     profile_update: models.UpdateFollowingModel,
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.DBUser = Depends(deps.get_current_user)
 ) -> models.UpdateFollowingModel:
-    # Fetch the user's profile using their ID
-    profile = await session.get(models.DBProfile, current_user.id)
+    # Replace the followed tags and/or categories with the given lists
+    for key, kind in (("tag_following", "tags"), ("category_following", "categories")):
+        if key in profile_update.model_fields_set:
+            ids = set(getattr(profile_update, key))
+            await check_followable(session, kind, ids)
+            await set_following(session, kind, current_user.id, ids)
+    await session.commit()
 
-    if not profile or profile.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User profile not found")
+    tag_ids, category_ids = await models.get_following(session, current_user.id)
+    return models.UpdateFollowingModel(tag_following=tag_ids, category_following=category_ids)
 
-    for key, value in profile_update.dict(exclude_unset=True).items():
-        setattr(profile, key, value)
 
-    session.add(profile)
+# Follow / unfollow one tag or category at a time
+@router.put("/me/following/{kind}/{followed_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def follow(
+    kind: Literal["tags", "categories"],
+    followed_id: int,
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    current_user: models.DBUser = Depends(deps.get_current_user)
+):
+    link, column, _, _ = FOLLOW_KINDS[kind]
+    await check_followable(session, kind, {followed_id})
+    if not await session.get(link, (current_user.id, followed_id)):
+        session.add(link(user_id=current_user.id, **{column.key: followed_id}))
+        await session.commit()
+
+
+@router.delete("/me/following/{kind}/{followed_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def unfollow(
+    kind: Literal["tags", "categories"],
+    followed_id: int,
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    current_user: models.DBUser = Depends(deps.get_current_user)
+):
+    link, column, _, _ = FOLLOW_KINDS[kind]
+    await session.execute(delete(link).where(link.user_id == current_user.id, column == followed_id))
     await session.commit()
-    await session.refresh(profile)
-
-    return profile
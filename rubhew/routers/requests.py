@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import select
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import delete, union_all
 from sqlmodel.ext.asyncio.session import AsyncSession
-from typing import List, Annotated
+from typing import List, Annotated, Optional
 from datetime import datetime
 
-from .. import models, deps  # Assuming models.py contains the Request model and deps has the get_current_user function
+from .. import models, concurrency, deps, events, fieldsets, item_cards, loaders, pagination, streaming  # Assuming models.py contains the Request model and deps has the get_current_user function
 
 router = APIRouter(prefix="/requests", tags=["requests"])
 
@@ -14,148 +15,168 @@ async def create_request(
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.DBUser = Depends(deps.get_current_user)
 ) -> models.Request:
-    # Check if the item exists
-    item = await session.get(models.Item, request_data.id_item)
-    if not item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
-    
-    # Ensure the requester is not the owner of the item
-    if item.id_user == current_user.id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You cannot request your own item")
-
-    # Create the request
-    new_request = models.Request(
-        id_sent=current_user.id,  # Automatically use the current user's ID
-        id_receive=item.id_user,   # Derive the receiver's ID from the item's owner
-        id_item=request_data.id_item,
-        message=request_data.message,
-        create_time=datetime.utcnow(),
-        update_time=datetime.utcnow()
-    )
-
-    # Add the new request to the session
-    session.add(new_request)
-
-    # Update the status of the item to "Progress"
-    item.status = "Progress"
-    session.add(item)  # Mark the item for commit
+    async def attempt():
+        # Check if the item exists
+        item = await session.get(models.Item, request_data.id_item)
+        if not item:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+
+        # Ensure the requester is not the owner of the item
+        if item.id_user == current_user.id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You cannot request your own item")
+
+        # Move the item to "Progress" unless it already is; a sold item cannot be requested
+        status_changed = await concurrency.transition_item_status(session, item, "Progress")
+
+        # Create the request
+        new_request = models.Request(
+            id_sent=current_user.id,  # Automatically use the current user's ID
+            id_receive=item.id_user,   # Derive the receiver's ID from the item's owner
+            id_item=request_data.id_item,
+            message=request_data.message,
+            create_time=datetime.utcnow(),
+            update_time=datetime.utcnow()
+        )
+
+        # Add the new request to the session, and to both parties' pending counts
+        session.add(new_request)
+        await models.count_request_change(session, {}, models.request_counts(new_request))
+
+        # Commit the session
+        await session.commit()
+        return new_request, status_changed
+
+    new_request, status_changed = await concurrency.retry_on_conflict(session, attempt)
+    await item_cards.invalidate([new_request.id_item])
 
-    # Commit the session
-    await session.commit()
-    
     # Refresh the new request to get the updated data
     await session.refresh(new_request)
 
+    # Tell both parties, so their clients refetch instead of polling
+    parties = (new_request.id_sent, new_request.id_receive)
+    await events.publish(parties, "request.created", id=new_request.id, id_item=new_request.id_item)
+    if status_changed:
+        await events.publish(parties, "item.status", id_item=new_request.id_item, status="Progress")
+
     return new_request
 
 
 
 
 
+# Inbox order: most recently updated first
+REQUEST_KEYSET = (models.Request.update_time, models.Request.id)
+
+
+def after_request_cursor(statement, cursor: Optional[str]):
+    # Requests after the cursor, in inbox order
+    if cursor:
+        last_update_time, last_id = pagination.decode_cursor(cursor, 2)
+        statement = statement.where(
+            pagination.after_keyset(
+                REQUEST_KEYSET, (pagination.parse_cursor_datetime(last_update_time), last_id), True
+            )
+        )
+    return statement.order_by(*pagination.order_by_keyset(REQUEST_KEYSET, True))
+
+
+def request_page_statement(selected, cursor: Optional[str]):
+    # Requests with sender, receiver and item in one joined query, in inbox
+    # order starting after the cursor
+    statement = loaders.request_detail_statement(selected, extra_fields=("id", "update_time"))
+    return after_request_cursor(statement, cursor)
+
+
+def inbox_page_statement(selected, user_id: int, cursor: Optional[str], size: int):
+    # The user's sent and received requests, in inbox order after the cursor.
+    # "id_sent = :me OR id_receive = :me" would sort the whole inbox on every
+    # page; instead each side reads at most one page in the order of its own
+    # index (ix_requests_sent_update_time_id, ix_requests_receive_update_time_id)
+    # and only those rows are merged, as in /feed.
+    sent = models.select(models.Request.id).where(models.Request.id_sent == user_id)
+    received = models.select(models.Request.id).where(
+        models.Request.id_receive == user_id,
+        models.Request.id_sent != user_id,  # Counted once, on the sent side
+    )
+    merged = union_all(*(
+        models.select(after_request_cursor(page, cursor).limit(size).subquery().c.id)
+        for page in (sent, received)
+    )).subquery()
+    statement = loaders.request_detail_statement(selected, extra_fields=("id", "update_time"))
+    return statement.join(merged, merged.c.id == models.Request.id).order_by(
+        *pagination.order_by_keyset(REQUEST_KEYSET, True)
+    )
+
+
+async def request_page(session: AsyncSession, statement, response: Response, selected, limit: int):
+    # One page of request details; the cursor of the next page is returned in
+    # the X-Next-Cursor header
+    rows = (await session.execute(statement.limit(limit + 1))).all()
+    next_cursor = pagination.next_cursor(rows, limit, lambda row: (row.update_time, row.id))
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    request_details = [loaders.build_request_detail(row, selected) for row in rows[:limit]]
+    return request_details if selected is None else fieldsets.sparse_response(request_details, response)
+
+
 @router.get("/my-requests", response_model=List[models.RequestDetailRead])
 async def get_my_requests(
+    response: Response,
     session: Annotated[AsyncSession, Depends(models.get_session)],
-    current_user: models.DBUser = Depends(deps.get_current_user)
+    current_user: models.DBUser = Depends(deps.get_current_user),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    fields: Optional[str] = None,
 ) -> List[models.RequestDetailRead]:
-    # Fetch requests where the current user is either the sender or receiver
-    statement = select(models.Request).where(
-        (models.Request.id_sent == current_user.id) | (models.Request.id_receive == current_user.id)
-    )
-    results = await session.exec(statement)
-    requests = results.all()
-
-    # Fetch user and item details
-    request_details = []
-    for request in requests:
-        sender = await session.get(models.DBUser, request.id_sent)
-        receiver = await session.get(models.DBUser, request.id_receive)
-        item = await session.get(models.Item, request.id_item)
-
-        if sender and receiver and item:
-            request_detail = models.RequestDetailRead(
-                id=request.id,
-                id_sent=request.id_sent,
-                id_receive=request.id_receive,
-                id_item=request.id_item,
-                message=request.message,
-                res_message=request.res_message,
-                create_time=request.create_time,
-                update_time=request.update_time,
-                sender=models.UserDetail(
-                    username=sender.username,
-                    email=sender.email,
-                    first_name=sender.first_name,
-                    last_name=sender.last_name
-                ),
-                receiver=models.UserDetail(
-                    username=receiver.username,
-                    email=receiver.email,
-                    first_name=receiver.first_name,
-                    last_name=receiver.last_name
-                ),
-                item=models.ItemDetail(
-                    id_item=item.id_item,
-                    name_item=item.name_item,
-                    images=item.images,
-                    status=item.status
-                )
-            )
-            request_details.append(request_detail)
-
-    return request_details
+    # Fetch one page of the requests where the current user is either the
+    # sender or receiver; "?fields=a,b" returns (and reads) only those fields
+    selected = fieldsets.parse_fields(fields, models.RequestDetailRead, always=["id"])
+    statement = inbox_page_statement(selected, current_user.id, cursor, limit + 1)
+    return await request_page(session, statement, response, selected, limit)
 
 
 @router.get("/", response_model=List[models.RequestDetailRead])
 async def get_all_requests(
+    request: Request,
+    response: Response,
     session: Annotated[AsyncSession, Depends(models.get_session)],
-    current_user: models.DBUser = Depends(deps.get_current_user)
+    current_user: models.DBUser = Depends(deps.get_current_user),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    fields: Optional[str] = None,
 ) -> List[models.RequestDetailRead]:
-    # Fetch all requests from the database (consider admin authorization here)
-    statement = select(models.Request)
-    results = await session.exec(statement)
-    requests = results.all()
-
-    # Fetch user and item details
-    request_details = []
-    for request in requests:
-        sender = await session.get(models.DBUser, request.id_sent)
-        receiver = await session.get(models.DBUser, request.id_receive)
-        item = await session.get(models.Item, request.id_item)
+    # Fetch one page of all requests (consider admin authorization here);
+    # "Accept: application/x-ndjson" streams every request after the cursor
+    # instead (limit is ignored), one per line
+    selected = fieldsets.parse_fields(fields, models.RequestDetailRead, always=["id"])
+    statement = request_page_statement(selected, cursor)
+    if streaming.wants_ndjson(request):
+        async def build_rows(stream_session, rows):
+            return [loaders.build_request_detail(row, selected) for row in rows]
+
+        return streaming.ndjson_response(statement, build_rows, scalars=False)
+    return await request_page(session, statement, response, selected, limit)
 
-        if sender and receiver and item:
-            request_detail = models.RequestDetailRead(
-                id=request.id,
-                id_sent=request.id_sent,
-                id_receive=request.id_receive,
-                id_item=request.id_item,
-                message=request.message,
-                res_message=request.res_message,
-                create_time=request.create_time,
-                update_time=request.update_time,
-                sender=models.UserDetail(
-                    username=sender.username,
-                    email=sender.email,
-                    first_name=sender.first_name,
-                    last_name=sender.last_name
-                ),
-                receiver=models.UserDetail(
-                    username=receiver.username,
-                    email=receiver.email,
-                    first_name=receiver.first_name,
-                    last_name=receiver.last_name
-                ),
-                item=models.ItemDetail(
-                    id_item=item.id_item,
-                    name_item=item.name_item,
-                    images=item.images,
-                    status=item.status
-                )
-            )
-            request_details.append(request_detail)
 
-    return request_details
+
+@router.get("/counts", response_model=models.RequestCountsRead)
+async def get_request_counts(
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    current_user: models.DBUser = Depends(deps.get_current_user),
+) -> models.RequestCountsRead:
+    # Inbox badge counts, read from the user's counter row
+    counter = await session.get(models.RequestCounter, current_user.id)
+    if counter is None:
+        return models.RequestCountsRead()
+    return models.RequestCountsRead.model_validate(counter)
 
 
+def record_response(request: models.Request):
+    # The owner answered: no longer pending, and unread until the sender marks it read
+    if request.responded_at is None:
+        request.responded_at = datetime.utcnow()
+    request.response_read = False
+
 
 # Update a request's message or response message
 @router.put("/{request_id}", response_model=models.RequestRead)
@@ -165,32 +186,42 @@ async def update_request_message(
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.DBUser = Depends(deps.get_current_user)
 ) -> models.Request:
-    # Fetch the request
-    request = await session.get(models.Request, request_id)
-    if not request:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
-    
-    # Ensure the current user is either the sender or receiver of the request
-    if request.id_sent != current_user.id and request.id_receive != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this request")
-
-    # Update the message or response message
-    if updated_data.message:
-        if request.id_sent == current_user.id:
-            request.message = updated_data.message  # Only the sender can update the message
-        else:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the sender can update the message")
-    
-    if updated_data.res_message:
-        if request.id_receive == current_user.id:
-            request.res_message = updated_data.res_message  # Only the receiver can update the response message
-        else:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the receiver can update the response message")
-
-    request.update_time = datetime.utcnow()  # Update the timestamp
-    session.add(request)
-    await session.commit()
+    async def attempt():
+        # Fetch the request
+        request = await session.get(models.Request, request_id)
+        if not request:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
+
+        # Ensure the current user is either the sender or receiver of the request
+        if request.id_sent != current_user.id and request.id_receive != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this request")
+
+        # Update the message or response message
+        if updated_data.message:
+            if request.id_sent == current_user.id:
+                request.message = updated_data.message  # Only the sender can update the message
+            else:
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the sender can update the message")
+
+        counts = models.request_counts(request)
+        if updated_data.res_message:
+            if request.id_receive == current_user.id:
+                request.res_message = updated_data.res_message  # Only the receiver can update the response message
+                record_response(request)
+            else:
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the receiver can update the response message")
+
+        request.update_time = datetime.utcnow()  # Update the timestamp
+        session.add(request)
+        await models.count_request_change(session, counts, models.request_counts(request))
+        await session.commit()
+        return request
+
+    request = await concurrency.retry_on_conflict(session, attempt)
     await session.refresh(request)
+    await events.publish(
+        (request.id_sent, request.id_receive), "request.updated", id=request.id, id_item=request.id_item
+    )
 
     return request
 
@@ -202,29 +233,43 @@ async def delete_request(
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.DBUser = Depends(deps.get_current_user)
 ):
-    # Fetch the request
-    request = await session.get(models.Request, request_id)
-    if not request:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
-
-    # Ensure the current user is either the sender or receiver of the request
-    if request.id_sent != current_user.id and request.id_receive != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this request")
-
-    # Fetch the associated item
-    item = await session.get(models.Item, request.id_item)
-    if not item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Associated item not found")
+    async def attempt():
+        # Fetch the request
+        request = await session.get(models.Request, request_id)
+        if not request:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
 
-    # Change item status back to "Available"
-    item.status = "Available"
-    session.add(item)  # Mark the updated item for commit
+        # Ensure the current user is either the sender or receiver of the request
+        if request.id_sent != current_user.id and request.id_receive != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this request")
 
-    # Delete the request
-    await session.delete(request)
-
-    # Commit the session
-    await session.commit()
+        # Fetch the associated item
+        item = await session.get(models.Item, request.id_item)
+        if not item:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Associated item not found")
+
+        # An item in progress becomes available again; a sold one stays sold
+        status_changed = False
+        if item.status == "Progress":
+            status_changed = await concurrency.transition_item_status(session, item, "Available")
+
+        # Delete the request, with its conversation
+        await session.execute(
+            delete(models.RequestMessage).where(models.RequestMessage.id_request == request.id)
+        )
+        await session.delete(request)
+        await models.count_request_change(session, models.request_counts(request), {})
+
+        # Commit the session
+        await session.commit()
+        return request, item, status_changed
+
+    request, item, status_changed = await concurrency.retry_on_conflict(session, attempt)
+    await item_cards.invalidate([item.id_item])
+    parties = (request.id_sent, request.id_receive)
+    await events.publish(parties, "request.deleted", id=request_id, id_item=item.id_item)
+    if status_changed:
+        await events.publish(parties, "item.status", id_item=item.id_item, status=item.status)
 
     return
 
@@ -235,29 +280,158 @@ async def respond_to_request(
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.DBUser = Depends(deps.get_current_user)
 ) -> models.Request:
-    # Fetch the request
+    async def attempt():
+        # Fetch the request
+        request = await session.get(models.Request, request_id)
+        if not request:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
+
+        # Ensure the current user is the receiver of the request
+        if request.id_receive != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to respond to this request")
+
+        # Update the status of the item if provided, as the state machine
+        # allows; items are written before requests, like every request route
+        status_changed = False
+        if response_data.item_status:
+            item = await session.get(models.Item, request.id_item)
+            if item:
+                status_changed = await concurrency.transition_item_status(session, item, response_data.item_status)
+
+        # Update the response message
+        counts = models.request_counts(request)
+        if response_data.res_message:
+            request.res_message = response_data.res_message  # Update the response message
+        record_response(request)
+
+        request.update_time = datetime.utcnow()  # Update the timestamp
+        session.add(request)  # Mark the request for commit
+        await models.count_request_change(session, counts, models.request_counts(request))
+        await session.commit()
+        return request, status_changed
+
+    request, status_changed = await concurrency.retry_on_conflict(session, attempt)
+    if status_changed:
+        await item_cards.invalidate([request.id_item])
+    await session.refresh(request)
+
+    parties = (request.id_sent, request.id_receive)
+    await events.publish(parties, "request.responded", id=request.id, id_item=request.id_item)
+    if status_changed:
+        await events.publish(parties, "item.status", id_item=request.id_item, status=response_data.item_status)
+
+    return request
+
+
+# Mark the response to a sent request as read
+@router.put("/{request_id}/read", status_code=status.HTTP_204_NO_CONTENT)
+async def mark_response_read(
+    request_id: int,
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    current_user: models.DBUser = Depends(deps.get_current_user)
+):
+    async def attempt():
+        request = await session.get(models.Request, request_id)
+        if not request:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
+
+        if request.id_sent != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the sender can mark the response read")
+
+        if not request.response_read:
+            counts = models.request_counts(request)
+            request.response_read = True
+            session.add(request)
+            await models.count_request_change(session, counts, models.request_counts(request))
+            await session.commit()
+
+    await concurrency.retry_on_conflict(session, attempt)
+
+
+async def get_request_for_party(session: AsyncSession, request_id: int, user: models.DBUser) -> models.Request:
+    # The request, if the user is its sender or receiver
     request = await session.get(models.Request, request_id)
     if not request:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Request not found")
+    if request.id_sent != user.id and request.id_receive != user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this request")
+    return request
 
-    # Ensure the current user is the receiver of the request
-    if request.id_receive != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to respond to this request")
-
-    # Update the response message
-    if response_data.res_message:
-        request.res_message = response_data.res_message  # Update the response message
-
-    # Update the status of the item if provided
-    if response_data.item_status:
-        item = await session.get(models.Item, request.id_item)
-        if item:
-            item.status = response_data.item_status  # Update item status
-            session.add(item)  # Mark the item for commit
 
-    request.update_time = datetime.utcnow()  # Update the timestamp
-    session.add(request)  # Mark the request for commit
+# Append a message to a request's conversation
+@router.post("/{request_id}/messages", response_model=models.RequestMessageRead, status_code=status.HTTP_201_CREATED)
+async def create_request_message(
+    request_id: int,
+    message_data: models.RequestMessageCreate,
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    current_user: models.DBUser = Depends(deps.get_current_user)
+) -> models.RequestMessage:
+    request = await get_request_for_party(session, request_id, current_user)
+    message = models.RequestMessage(id_request=request.id, id_user=current_user.id, body=message_data.body)
+    session.add(message)
     await session.commit()
-    await session.refresh(request)
+    await session.refresh(message)
 
-    return request
+    # Wakes the long polls (and event streams) of both parties
+    await events.publish(
+        (request.id_sent, request.id_receive), "request.message",
+        id_request=request.id, id=message.id, id_user=message.id_user,
+    )
+    return message
+
+
+async def message_page(session: AsyncSession, request_id: int, after: Optional[int], limit: int):
+    statement = models.select(models.RequestMessage).where(models.RequestMessage.id_request == request_id)
+    if after is not None:
+        statement = statement.where(models.RequestMessage.id > after)
+    statement = statement.order_by(models.RequestMessage.id).limit(limit)
+    return (await session.exec(statement)).all()
+
+
+async def wait_for_message(queue, request_id: int, timeout: float):
+    # Until a request.message event of this request (or a resync, after which
+    # anything may have been missed) arrives, or the timeout passes
+    deadline = asyncio.get_running_loop().time() + timeout
+    while (remaining := deadline - asyncio.get_running_loop().time()) > 0:
+        try:
+            event = await asyncio.wait_for(queue.get(), remaining)
+        except asyncio.TimeoutError:
+            return
+        if event == events.RESYNC or (
+            event["type"] == "request.message" and event["data"]["id_request"] == request_id
+        ):
+            return
+
+
+# A page of a request's conversation, oldest first
+@router.get("/{request_id}/messages", response_model=List[models.RequestMessageRead])
+async def get_request_messages(
+    request_id: int,
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    current_user: models.DBUser = Depends(deps.get_current_user),
+    after: Optional[int] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    wait: float = Query(default=0, ge=0, le=30),
+) -> List[models.RequestMessage]:
+    # "?after=<id>" returns only the messages after the last one a client has
+    # (pass the last id returned as the next `after`). With "?wait=<seconds>"
+    # an empty answer is held until a new message is posted or the wait ends,
+    # so clients poll for new messages instead of refetching the request.
+    await get_request_for_party(session, request_id, current_user)
+    messages = await message_page(session, request_id, after, limit)
+    if messages or not wait:
+        return messages
+
+    # Subscribe before reading again, so a message posted in between is not
+    # missed; and hand the connection back to the pool while waiting
+    await session.commit()
+    broker = events.get_broker()
+    queue = broker.subscribe(current_user.id)
+    try:
+        messages = await message_page(session, request_id, after, limit)
+        if messages:
+            return messages
+        await wait_for_message(queue, request_id, wait)
+    finally:
+        broker.unsubscribe(current_user.id, queue)
+    return await message_page(session, request_id, after, limit)
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Annotated
+
+from .. import models
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("/fuzzy", response_model=models.FuzzySearchRead)
+async def fuzzy_search(
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    q: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=10, ge=1, le=50),
+) -> models.FuzzySearchRead:
+    # Typo-tolerant lookup of item and tag names by trigram similarity
+    fuzzy_index = models.get_fuzzy_index(session)
+    items = await fuzzy_index.search_items(session, q, limit)
+    tags = await fuzzy_index.search_tags(session, q, limit)
+
+    return models.FuzzySearchRead(
+        items=[
+            models.FuzzyItemMatch(id_item=id_item, name_item=name_item, similarity=similarity)
+            for id_item, name_item, similarity in items
+        ],
+        tags=[
+            models.FuzzyTagMatch(id_tags=id_tags, name_tags=name_tags, similarity=similarity)
+            for id_tags, name_tags, similarity in tags
+        ],
+    )
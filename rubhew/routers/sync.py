@@ -0,0 +1,92 @@
+import datetime
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import true
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .. import deps, loaders, models, pagination
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+# A token points this far back before the time it was issued, so rows written
+# by transactions that were still open at that time are not missed. They are
+# sent again on the next sync; clients apply changes by id, so that is harmless.
+SYNC_OVERLAP = datetime.timedelta(seconds=5)
+
+
+@router.get("", response_model=models.SyncRead)
+async def sync(
+    session: Annotated[AsyncSession, Depends(models.get_session)],
+    current_user: models.DBUser = Depends(deps.get_current_user),
+    since: Optional[str] = None,
+) -> models.SyncRead:
+    # Items, tags and categories, plus the user's own requests and
+    # transactions (as customer or seller), created, changed or deleted
+    # since the token in "since"; everything (and no deletions) without one
+    issued_at = datetime.datetime.utcnow()
+    after = None
+    if since:
+        [value] = pagination.decode_cursor(since, 1)
+        after = pagination.parse_cursor_datetime(value)
+
+    def changed_since(column):
+        return column > after if after else true()
+
+    items = await loaders.load_item_reads(
+        session,
+        select(models.Item)
+        .where(changed_since(models.Item.updated_at))
+        .order_by(models.Item.updated_at, models.Item.id_item),
+    )
+    requests = await loaders.load_request_details(
+        session,
+        loaders.request_detail_statement()
+        .where((models.Request.id_sent == current_user.id) | (models.Request.id_receive == current_user.id))
+        .where(changed_since(models.Request.update_time))
+        .order_by(models.Request.update_time, models.Request.id),
+    )
+    transactions = await session.exec(
+        select(models.Transaction)
+        .join(models.Item, models.Item.id_item == models.Transaction.id_item)
+        .where(
+            (models.Transaction.id_user_customer == current_user.id)
+            | (models.Item.id_user == current_user.id)  # Sales of the user's items
+        )
+        .where(changed_since(models.Transaction.update_time))
+        .order_by(models.Transaction.update_time, models.Transaction.id_transaction)
+    )
+    tags = await session.exec(
+        select(models.Tags).where(changed_since(models.Tags.updated_at)).order_by(models.Tags.id_tags)
+    )
+    categories = await session.exec(
+        select(models.Category)
+        .where(changed_since(models.Category.updated_at))
+        .order_by(models.Category.id_category)
+    )
+
+    deleted = models.SyncDeleted()
+    if after:
+        tombstones = await session.exec(
+            select(models.Tombstone.entity, models.Tombstone.entity_id)
+            .where(models.Tombstone.deleted_at > after)
+            .where(
+                models.Tombstone.entity.not_in(models.PRIVATE_TOMBSTONE_ENTITIES)
+                | (models.Tombstone.id_user_a == current_user.id)
+                | (models.Tombstone.id_user_b == current_user.id)
+            )
+            .order_by(models.Tombstone.deleted_at, models.Tombstone.id)
+        )
+        for entity, entity_id in tombstones:
+            getattr(deleted, entity).append(entity_id)
+
+    return models.SyncRead(
+        token=pagination.encode_cursor(issued_at - SYNC_OVERLAP),
+        items=items,
+        requests=requests,
+        transactions=[models.TransactionRead.model_validate(row) for row in transactions],
+        tags=[models.TagsRead.model_validate(row) for row in tags],
+        categories=[models.CategoryRead.model_validate(row) for row in categories],
+        deleted=deleted,
+    )
@@ -1,10 +1,10 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Annotated
 
-from .. import models, deps
+from .. import catalog, conditional, item_cards, models, deps
 
 router = APIRouter(prefix="/tags", tags=["tags"])
 
@@ -13,6 +13,15 @@ async def active_super_user(current_user: models.DBUser = Depends(deps.get_curre
     if not current_user.is_active or not current_user.is_superuser:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
 
+# Items are indexed for search with their tag names
+async def reindex_tagged_items(session: AsyncSession, tag_id: int):
+    results = await session.exec(
+        select(models.ItemTagsLink.item_id).where(models.ItemTagsLink.tag_id == tag_id)
+    )
+    item_ids = results.all()
+    await models.reindex_items(session, item_ids)
+    return item_ids
+
 @router.post("/", response_model=models.TagsRead, status_code=status.HTTP_201_CREATED)
 async def create_tag(
     tag: models.TagsCreate,
@@ -23,21 +32,32 @@ async def create_tag(
     session.add(new_tag)
     await session.commit()
     await session.refresh(new_tag)
+    await catalog.changed()
+    models.get_fuzzy_index(session).tag_changed(new_tag.id_tags, new_tag.name_tags)
     return new_tag
 
-@router.get("/", response_model=List[models.TagsRead])
-async def list_tags(session: Annotated[AsyncSession, Depends(models.get_session)]):
-    statement = select(models.Tags)
-    results = await session.exec(statement)
-    return results.all()
+@router.get(
+    "/",
+    response_model=List[models.TagsRead],
+    dependencies=[conditional.collection_etag("tags")],
+)
+async def list_tags(response: Response, session: Annotated[AsyncSession, Depends(models.get_session)]):
+    # Pre-encoded by the catalog snapshot
+    snapshot = await catalog.current()
+    return Response(snapshot.tags_json, media_type="application/json", headers=dict(response.headers))
 
-@router.get("/{tag_id}", response_model=models.TagsRead)
+@router.get(
+    "/{tag_id}",
+    response_model=models.TagsRead,
+    # Permissions are checked before a 304 can be answered
+    dependencies=[Depends(active_super_user), conditional.collection_etag("tags")],
+)
 async def get_tag(
     tag_id: int,
     session: Annotated[AsyncSession, Depends(models.get_session)],
-    current_user: Annotated[models.DBUser, Depends(active_super_user)]
 ):
-    tag = await session.get(models.Tags, tag_id)
+    # Served from the catalog snapshot
+    tag = (await catalog.current()).tags.get(tag_id)
     if not tag:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tag not found")
     return tag
@@ -55,7 +75,11 @@ async def update_tag(
     
     tag.name_tags = tag_update.name_tags  # Update fields as necessary
     session.add(tag)
+    item_ids = await reindex_tagged_items(session, tag_id)
     await session.commit()
+    await catalog.changed()
+    await item_cards.invalidate(item_ids)
+    models.get_fuzzy_index(session).tag_changed(tag_id, tag.name_tags)
     await session.refresh(tag)
     return tag
 
@@ -70,4 +94,8 @@ async def delete_tag(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tag not found")
     
     await session.delete(tag)
+    item_ids = await reindex_tagged_items(session, tag_id)
     await session.commit()
+    await catalog.changed()
+    await item_cards.invalidate(item_ids)
+    models.get_fuzzy_index(session).tag_changed(tag_id, None)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlmodel import Session, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import Session as SQLAlchemySession
@@ -6,10 +6,26 @@ from typing import List, Annotated
 from datetime import datetime
 
 from .. import deps
+from .. import events
 from .. import models
+from .. import streaming
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
 
+
+async def publish_transaction_event(session: AsyncSession, transaction: models.Transaction, kind: str):
+    # Tell the customer and the seller (the item's owner), whichever of them
+    # made the change, so neither has to poll
+    owner_id = (
+        await session.exec(select(models.Item.id_user).where(models.Item.id_item == transaction.id_item))
+    ).first()
+    data = {"id_transaction": transaction.id_transaction}
+    if kind == "updated":
+        data["status"] = transaction.status
+    parties = {transaction.id_user_customer} | ({owner_id} if owner_id is not None else set())
+    await events.publish(parties, f"transaction.{kind}", **data)
+
+
 # Create a new transaction
 @router.post("/", response_model=models.TransactionRead)
 async def create_transaction(
@@ -27,16 +43,28 @@ async def create_transaction(
     session.add(transaction)
     await session.commit()
     await session.refresh(transaction)
+    await publish_transaction_event(session, transaction, "created")
     return transaction
 
 
+async def build_transaction_reads(
+    session: AsyncSession, transactions: List[models.Transaction]
+) -> List[models.TransactionRead]:
+    return [models.TransactionRead.model_validate(transaction) for transaction in transactions]
+
+
 # Get my transactions as a customer
 @router.get("/customer", response_model=List[models.TransactionRead])
 async def get_my_transactions_customer(
+    request: Request,
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.User = Depends(deps.get_current_active_superuser),
 ) -> List[models.TransactionRead]:
     statement = select(models.Transaction).where(models.Transaction.id_user_customer == current_user.id)
+    if streaming.wants_ndjson(request):  # One transaction per line, read as they are sent
+        return streaming.ndjson_response(
+            statement.order_by(models.Transaction.id_transaction), build_transaction_reads
+        )
     results = await session.execute(statement)
     return results.scalars().all()
 
@@ -58,6 +86,7 @@ async def update_transaction_status(
     session.add(transaction)
     await session.commit()
     await session.refresh(transaction)
+    await publish_transaction_event(session, transaction, "updated")
     return transaction
 
 
@@ -84,6 +113,7 @@ async def update_transaction_address(
     session.add(transaction)
     await session.commit()
     await session.refresh(transaction)
+    await publish_transaction_event(session, transaction, "updated")
     return transaction
 
 
@@ -107,6 +137,7 @@ async def update_transaction_receipt(
     session.add(transaction)
     await session.commit()
     await session.refresh(transaction)
+    await publish_transaction_event(session, transaction, "updated")
     return transaction
 
 
@@ -132,6 +163,7 @@ async def cancel_transaction(
     session.add(transaction)
     await session.commit()
     await session.refresh(transaction)
+    await publish_transaction_event(session, transaction, "updated")
     return transaction
 
 
@@ -148,4 +180,5 @@ async def delete_transaction(
 
     await session.delete(transaction)
     await session.commit()
+    await publish_transaction_event(session, transaction, "deleted")
     return {"message": "Transaction deleted successfully"}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import JSONResponse
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
@@ -7,12 +7,14 @@ from typing import Annotated, List
 
 from .. import deps
 from .. import models
+from .. import streaming
+from .. import item_cards
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.get("/me")
-def get_me(current_user: models.User = Depends(deps.get_current_user)) -> models.User:
+async def get_me(current_user: models.User = Depends(deps.get_current_user)) -> models.User:
     return current_user
 
 
@@ -31,11 +33,20 @@ async def get_user(
     return user
 
 
+async def build_user_reads(session: AsyncSession, users: List[models.DBUser]) -> List[models.User]:
+    return [models.User.model_validate(user) for user in users]
+
+
 @router.get("/", response_model=List[models.User])
 async def list_users(
+    request: Request,
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.User = Depends(deps.get_current_active_superuser),  # Only admin can list users
 ) -> List[models.User]:
+    if streaming.wants_ndjson(request):  # One user per line, read as they are sent
+        return streaming.ndjson_response(
+            select(models.DBUser).order_by(models.DBUser.id), build_user_reads
+        )
     users = await session.exec(select(models.DBUser))
     return users.all()
 
@@ -119,6 +130,10 @@ async def update_user(
 
     session.add(current_user)
     await session.commit()
+    await deps.forget_user(current_user.id)
+    # Item cards show the owner's names
+    if user_update.model_fields_set & {"username", "first_name", "last_name"}:
+        await item_cards.invalidate(await item_cards.owned_item_ids(session, current_user.id))
     await session.refresh(current_user)
 
     return {"message" : "Update is Successful"}
@@ -141,6 +156,7 @@ async def change_status(
     user.status = status
     session.add(user)
     await session.commit()
+    await deps.forget_user(user_id)
     await session.refresh(user)
 
     return user
@@ -154,6 +170,8 @@ async def change_password(
     session: Annotated[AsyncSession, Depends(models.get_session)],
     current_user: models.User = Depends(deps.get_current_user),
 ) -> dict:
+    # The hash is not in the cached user (deps.encode_user); read it from the row
+    await session.refresh(current_user, ["password"])
     if not await current_user.verify_password(password_update.current_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -163,6 +181,7 @@ async def change_password(
     await current_user.set_password(password_update.new_password)
     session.add(current_user)
     await session.commit()
+    await deps.forget_user(current_user.id)
 
     return {"message": "Password updated successfully"}
 
@@ -183,6 +202,7 @@ async def delete_user(
     await session.delete(user)
     await session.delete(profile)
     await session.commit()
+    await deps.forget_user(user_id)
 
     return {"message": "User deleted successfully"}
 
@@ -204,6 +224,7 @@ async def update_user_role(
     user.role = new_role
     session.add(user)
     await session.commit()
+    await deps.forget_user(user_id)
     await session.refresh(user)
 
     return {"message" : "Update Role is Successful"}
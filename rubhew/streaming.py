@@ -0,0 +1,50 @@
+import json
+from typing import AsyncIterator, Awaitable, Callable, List
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import models
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Rows fetched from the server-side cursor and encoded per step
+STREAM_BATCH_SIZE = 500
+
+# Turns one batch of ORM rows (or, for column statements, result rows) into
+# read models or (sparse fieldset) dicts
+BuildRows = Callable[[AsyncSession, list], Awaitable[List]]
+
+
+def wants_ndjson(request: Request) -> bool:
+    # Streaming is opt-in with "Accept: application/x-ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def encode_row(row) -> bytes:
+    if isinstance(row, BaseModel):
+        return row.__pydantic_serializer__.to_json(row) + b"\n"
+    return json.dumps(jsonable_encoder(row), separators=(",", ":")).encode() + b"\n"
+
+
+async def iter_ndjson(statement, build_rows: BuildRows, scalars: bool = True) -> AsyncIterator[bytes]:
+    # The request's session is closed before a streamed body is sent, so the
+    # rows are read with a session of their own. Only one batch of rows is
+    # held at a time, whatever the size of the result.
+    async with models.new_session() as session:
+        results = await session.stream(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        if scalars:
+            results = results.scalars()
+        async for rows in results.partitions():
+            yield b"".join(encode_row(row) for row in await build_rows(session, rows))
+
+
+def ndjson_response(statement, build_rows: BuildRows, headers=None, scalars: bool = True) -> StreamingResponse:
+    # One JSON document per line, sent as the rows are read
+    return StreamingResponse(
+        iter_ndjson(statement, build_rows, scalars), media_type=NDJSON_MEDIA_TYPE, headers=headers
+    )
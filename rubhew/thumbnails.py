@@ -0,0 +1,122 @@
+import asyncio
+import concurrent.futures
+import io
+import multiprocessing
+from typing import Dict, Iterable, List, Optional
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Optional: without Pillow, clients get the original images
+    Image = None
+
+from . import media
+
+
+# Longest side in pixels of the derivatives made for every stored image
+THUMBNAIL_SIZES = (128, 512)
+# Size returned by list endpoints; detail endpoints return the original
+LIST_IMAGE_SIZE = 512
+
+pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+slots: Optional[asyncio.Semaphore] = None
+
+
+def enabled() -> bool:
+    return Image is not None and pool is not None
+
+
+def render_thumbnails(data: bytes, sizes=THUMBNAIL_SIZES) -> Dict[int, bytes]:
+    # Runs in a worker process: decode once, apply the EXIF orientation and
+    # shrink to fit each size x size, largest first so every step starts from
+    # the previous, smaller image. Encoded as WebP, or JPEG if Pillow lacks it.
+    sizes = sorted(sizes, reverse=True)
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEGs can be decoded directly at 1/2, 1/4 or 1/8 scale
+        image.draft("RGB", (sizes[0], sizes[0]))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        rendered = {}
+        for size in sizes:
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            if features.check("webp"):
+                image.save(output, "WEBP", quality=80, method=4)
+            else:
+                image.convert("RGB").save(output, "JPEG", quality=85, optimize=True)
+            rendered[size] = output.getvalue()
+        return rendered
+
+
+def init_thumbnails(settings):
+    # A bounded pool of worker processes keeps decoding and resizing off the
+    # event loop. Not threads: main.py monkey patches with gevent, and
+    # worker threads do not mix with it, which is also why blob files are
+    # read and written inline (media.py, routers/media.py); that stays cheap
+    # as blobs are capped at MEDIA_MAX_BYTES. "spawn" workers start clean of
+    # the gevent-patched parent.
+    global pool, slots
+    shutdown_thumbnails()
+    if Image is None or settings.THUMBNAIL_WORKERS < 1:
+        return
+    pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=settings.THUMBNAIL_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    # Images waiting for a worker are held in memory, so cap them as well
+    slots = asyncio.Semaphore(settings.THUMBNAIL_WORKERS * 2)
+
+
+def shutdown_thumbnails():
+    global pool
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+        pool = None
+
+
+async def render(data: bytes, sizes=THUMBNAIL_SIZES) -> Dict[int, bytes]:
+    async with slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, render_thumbnails, data, sizes)
+
+
+async def generate_thumbnails(keys: Iterable[str]):
+    # Background task: make the missing derivatives of the given blobs.
+    # Blobs are content-addressed, so existing thumbnails are never stale.
+    if not enabled():
+        return
+    media_store = media.get_media_store()
+    for key in dict.fromkeys(keys):
+        sizes = [
+            size for size in THUMBNAIL_SIZES
+            if not await media_store.get_thumbnail_path(key, size)
+        ]
+        path = await media_store.get_path(key) if sizes else None
+        if not path:
+            continue
+        try:
+            rendered = await render(path.read_bytes(), sizes)
+        except Exception:
+            # Undecodable images keep being served in full size
+            continue
+        for size, thumbnail in rendered.items():
+            await media_store.put_thumbnail(key, size, thumbnail)
+
+
+def stored_keys(images: Iterable[str]) -> List[str]:
+    # Media store keys of the images that can have thumbnails
+    media_store = media.get_media_store()
+    return [key for key in map(media_store.key_from_url, images or []) if key]
+
+
+def thumbnail_urls(images: List[str], size: int = LIST_IMAGE_SIZE) -> List[str]:
+    # URLs for list endpoints; images outside the media store are kept as is
+    if not enabled() or not images:
+        return images
+    media_store = media.get_media_store()
+    urls = []
+    for image in images:
+        key = media_store.key_from_url(image)
+        urls.append(media_store.thumbnail_url(key, size) if key else image)
+    return urls
@@ -0,0 +1,190 @@
+import functools
+import pathlib
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+
+DICTIONARY_PATH = pathlib.Path(__file__).parent / "data" / "thai_words.txt"
+
+THAI_DIGITS = str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789")
+
+# Marks written above/below a consonant; a word never starts with one
+THAI_COMBINING = set("ัิีึืฺุู็่้๊๋์ํ๎")
+THAI_TONE_MARKS = set("่้๊๋")
+THAI_VOWEL_MARKS = set("ัิีึืุู")
+# Vowels written before the consonant they follow in speech; a word never ends with one
+THAI_LEADING_VOWELS = set("เแโใไ")
+
+# Runs of Thai letters and marks, or of any other letters/digits
+TOKEN_RUN = re.compile(r"([ก-ฮะ-ฺเ-ๅ็-๎]+)|([^\W_\u0e00-\u0e7f]+)")
+
+
+def normalize(text: str) -> str:
+    # Canonical form used for both indexing and querying:
+    # Thai digits -> ASCII, nikhahit + sara aa -> sara am, tone marks after
+    # vowel marks, repeated marks collapsed, Latin lowercased
+    text = unicodedata.normalize("NFC", text).translate(THAI_DIGITS).lower()
+    text = text.replace("ํา", "ำ")
+    for tone in THAI_TONE_MARKS:
+        text = text.replace("ํ" + tone + "า", tone + "ำ")
+
+    chars = list(text)
+    for i in range(len(chars) - 1):
+        if chars[i] in THAI_TONE_MARKS and chars[i + 1] in THAI_VOWEL_MARKS:
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+
+    normalized = []
+    for char in chars:
+        if normalized and char in THAI_COMBINING and normalized[-1] == char:
+            continue
+        normalized.append(char)
+    return "".join(normalized)
+
+
+class Tokenizer:
+    # Turns item text or a search query into index terms
+
+    def tokenize(self, text: str) -> List[str]:
+        raise NotImplementedError
+
+    def index_terms(self, text: str) -> List[str]:
+        # Terms stored for a document; may add variants a query could use
+        return self.tokenize(text)
+
+    def query_terms(self, text: str) -> List[str]:
+        return self.tokenize(text)
+
+
+class SimpleTokenizer(Tokenizer):
+    # Split on anything that is not a letter or digit; a Thai run stays one token
+
+    def tokenize(self, text):
+        return [match.group(0) for match in TOKEN_RUN.finditer(normalize(text or ""))]
+
+
+class ThaiTokenizer(SimpleTokenizer):
+    # Dictionary-based maximal matching: each Thai run is split into the
+    # fewest dictionary words, keeping as few characters as possible outside
+    # known words. Unknown stretches are kept whole rather than split per letter.
+
+    def __init__(self, words: Iterable[str]):
+        self.trie: Dict = {}
+        for word in words:
+            node = self.trie
+            for char in normalize(word):
+                node = node.setdefault(char, {})
+            node[""] = True
+
+    def tokenize(self, text):
+        tokens = []
+        for match in TOKEN_RUN.finditer(normalize(text or "")):
+            if match.group(1):
+                tokens.extend(self.segment(match.group(1)))
+            else:
+                tokens.append(match.group(2))
+        return tokens
+
+    def index_terms(self, text):
+        # Compound words are also indexed by their parts, so that a query for
+        # "มือถือ" finds an item described as "โทรศัพท์มือถือ"
+        terms = []
+        for token in self.tokenize(text):
+            terms.extend(self._with_parts(token))
+        return terms
+
+    def _with_parts(self, word: str) -> List[str]:
+        terms = [word]
+        for part in self.compound_parts(word):
+            terms.extend(self._with_parts(part))
+        return terms
+
+    def compound_parts(self, word: str) -> List[str]:
+        parts = self.segment(word, whole=False)
+        if len(parts) < 2 or any(not self.is_word(part) for part in parts):
+            return []
+        return parts
+
+    def is_word(self, word: str) -> bool:
+        node = self.trie
+        for char in word:
+            if char not in node:
+                return False
+            node = node[char]
+        return "" in node
+
+    def segment(self, run: str, whole: bool = True) -> List[str]:
+        # whole=False forbids matching the entire run as a single word
+        size = len(run)
+        boundaries = [
+            i == 0 or i == size or (run[i] not in THAI_COMBINING and run[i - 1] not in THAI_LEADING_VOWELS)
+            for i in range(size + 1)
+        ]
+
+        # best[i] = (unknown characters, words, previous boundary, known) for run[:i]
+        best: List[Optional[tuple]] = [None] * (size + 1)
+        best[0] = (0, 0, 0, True)
+        for start in range(size):
+            if best[start] is None:
+                continue
+            unknown, words = best[start][:2]
+
+            node = self.trie
+            end = start
+            while end < size and run[end] in node:
+                node = node[run[end]]
+                end += 1
+                if "" in node and boundaries[end] and (whole or end - start < size):
+                    self._relax(best, end, (unknown, words + 1, start, True))
+
+            # Fall back to skipping one character cluster as unknown text
+            end = start + 1
+            while not boundaries[end]:
+                end += 1
+            self._relax(best, end, (unknown + end - start, words + 1, start, False))
+
+        segments = []
+        end = size
+        while end > 0:
+            _, _, start, known = best[end]
+            segments.append((start, end, known))
+            end = start
+        segments.reverse()
+
+        tokens = []
+        previous_known = True
+        for start, end, known in segments:
+            if not known and not previous_known:
+                tokens[-1] += run[start:end]
+            else:
+                tokens.append(run[start:end])
+            previous_known = known
+        return tokens
+
+    @staticmethod
+    def _relax(best, end, candidate):
+        if best[end] is None or candidate[:2] < best[end][:2]:
+            best[end] = candidate
+
+
+@functools.lru_cache(maxsize=None)
+def load_dictionary(path: pathlib.Path = DICTIONARY_PATH) -> List[str]:
+    with open(path, encoding="utf-8") as dictionary:
+        return [
+            line.strip()
+            for line in dictionary
+            if line.strip() and not line.startswith("#")
+        ]
+
+
+_tokenizers = {
+    "simple": lambda: SimpleTokenizer(),
+    "thai": lambda: ThaiTokenizer(load_dictionary()),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_tokenizer(name: str = "thai") -> Tokenizer:
+    if name not in _tokenizers:
+        raise ValueError(f"Unknown tokenizer: {name}")
+    return _tokenizers[name]()
@@ -0,0 +1,43 @@
+# Copy the JSON tag_following / category_following lists of profiles into the
+# profile_tag_follow / profile_category_follow tables. Ids of deleted tags or
+# categories are dropped. Safe to run more than once.
+import asyncio
+from sqlmodel import select
+from rubhew import config, models
+
+
+async def migrate(batch_size=500):
+    async for session in models.get_session():
+        tag_ids = set((await session.exec(select(models.Tags.id_tags))).all())
+        category_ids = set((await session.exec(select(models.Category.id_category))).all())
+        last_id, migrated = 0, 0
+        while True:
+            profiles = (
+                await session.exec(
+                    select(models.DBProfile)
+                    .where(models.DBProfile.user_id > last_id)
+                    .order_by(models.DBProfile.user_id)
+                    .limit(batch_size)
+                )
+            ).all()
+            if not profiles:
+                break
+
+            for profile in profiles:
+                followed_tags, followed_categories = await models.get_following(session, profile.user_id)
+                for tag_id in set(profile.tag_following or []) & tag_ids - set(followed_tags):
+                    session.add(models.ProfileTagFollow(user_id=profile.user_id, tag_id=tag_id))
+                    migrated += 1
+                for category_id in set(profile.category_following or []) & category_ids - set(followed_categories):
+                    session.add(models.ProfileCategoryFollow(user_id=profile.user_id, category_id=category_id))
+                    migrated += 1
+            await session.commit()
+            last_id = profiles[-1].user_id
+
+        print(f"Migrated {migrated} follows")
+
+
+if __name__ == "__main__":
+    settings = config.get_settings()
+    models.init_db(settings)
+    asyncio.run(migrate())
@@ -0,0 +1,42 @@
+# Move base64 images stored inline in items.images into the media store,
+# leaving only their URLs in the rows, and render the missing thumbnails.
+# Safe to run more than once.
+import asyncio
+from sqlmodel import select
+from rubhew import config, media, models, thumbnails
+
+
+async def migrate(batch_size=100):
+    async for session in models.get_session():
+        last_id, converted = 0, 0
+        while True:
+            items = (
+                await session.exec(
+                    select(models.Item)
+                    .where(models.Item.id_item > last_id)
+                    .order_by(models.Item.id_item)
+                    .limit(batch_size)
+                )
+            ).all()
+            if not items:
+                break
+
+            for item in items:
+                images = await media.store_images(item.images or [])
+                if images != item.images:
+                    item.images = images
+                    session.add(item)
+                    converted += 1
+                await thumbnails.generate_thumbnails(thumbnails.stored_keys(images))
+            await session.commit()
+            last_id = items[-1].id_item
+
+        print(f"Converted images of {converted} items")
+
+
+if __name__ == "__main__":
+    settings = config.get_settings()
+    models.init_db(settings)
+    media.init_media(settings)
+    thumbnails.init_thumbnails(settings)
+    asyncio.run(migrate())
@@ -0,0 +1,24 @@
+# Rebuild the request_counters table (inbox badge counts) from the requests.
+# Requests answered before responded_at existed are marked responded (at their
+# update time) first. Safe to run more than once; run it when no requests are
+# being written, as writes made meanwhile may be counted twice or missed.
+import asyncio
+from sqlalchemy import update
+from rubhew import config, models
+
+
+async def rebuild():
+    async for session in models.get_session():
+        await session.execute(
+            update(models.Request)
+            .where(models.Request.responded_at.is_(None), models.Request.res_message.is_not(None))
+            .values(responded_at=models.Request.update_time, update_time=models.Request.update_time)
+        )
+        users = await models.rebuild_request_counters(session)
+        print(f"Rebuilt request counters of {users} users")
+
+
+if __name__ == "__main__":
+    settings = config.get_settings()
+    models.init_db(settings)
+    asyncio.run(rebuild())
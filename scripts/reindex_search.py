@@ -0,0 +1,13 @@
+import asyncio
+from rubhew import config, models
+
+
+async def reindex():
+    async for session in models.get_session():
+        await models.rebuild_item_search_index(session)
+
+
+if __name__ == "__main__":
+    settings = config.get_settings()
+    models.init_db(settings)
+    asyncio.run(reindex())
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+from rubhew import cache, deps, models, security
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_ttl_and_namespaces(monkeypatch):
+    backend = cache.MemoryCacheBackend()
+    await backend.set("one", 1, b"a")
+    await backend.set("two", 1, b"b", ttl=60)
+    assert await backend.get_many("one", [1, 2]) == {"1": b"a"}
+    assert await backend.get("two", 1) == b"b"
+
+    now = cache.time.monotonic()
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now + 61)
+    assert await backend.get("two", 1) is None
+    assert await backend.get("one", 1) == b"a"
+
+    invalidated = []
+    cache.subscribe("memory_test", invalidated.append)
+    await backend.set("memory_test", 7, b"c")
+    await backend.invalidate("memory_test", [7])
+    assert invalidated == [["7"]]
+    assert await backend.get("memory_test", 7) is None
+
+
+@pytest.mark.asyncio
+async def test_redis_cache_shared_between_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    first, second = [
+        cache.RedisCacheBackend(fakeredis.aioredis.FakeRedis(server=server)) for _ in range(2)
+    ]
+    invalidated = []
+    received = asyncio.Event()
+
+    def listener(keys):
+        invalidated.append(keys)
+        if len(invalidated) == 2:
+            received.set()
+
+    cache.subscribe("redis_test", listener)
+    await second.start()
+    try:
+        await first.set_many("redis_test", {1: b"a", 2: b"b"}, ttl=60)
+        assert await second.get_many("redis_test", [1, 2, 3]) == {"1": b"a", "2": b"b"}
+
+        # Heard by this process right away and by the other one over pub/sub
+        await first.invalidate("redis_test", [1])
+        await asyncio.wait_for(received.wait(), 5)
+        assert invalidated == [["1"], ["1"]]
+        assert await second.get("redis_test", 1) is None
+    finally:
+        await second.close()
+        await first.close()
+
+
+@pytest.mark.asyncio
+async def test_current_user_is_cached_until_changed(client: AsyncClient, session: models.AsyncSession):
+    user = models.DBUser(
+        username="cached_user",
+        password="x",
+        email="cached_user@test.com",
+        first_name="Firstname",
+        last_name="Lastname",
+    )
+    await user.set_password("secret")
+    session.add(user)
+    await session.commit()
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': user.id})}"}
+    statements = []
+
+    def record_statement(*args, **kwargs):
+        statements.append(args[2])
+
+    await client.get("/users/me", headers=headers)
+    event.listen(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        response = await client.get("/users/me", headers=headers)
+    finally:
+        event.remove(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    assert response.status_code == 200
+    assert not [statement for statement in statements if "FROM users" in statement]
+    # The password hash is never cached, and is read from the row when needed
+    cached = await cache.get_cache().get(deps.USERS_NAMESPACE, user.id)
+    assert user.password.encode() not in cached and b"password" not in cached
+    response = await client.put("/users/change_password", headers=headers, json={
+        "current_password": "secret", "new_password": "changed",
+    })
+    assert response.status_code == 200
+    response = await client.put("/users/change_password", headers=headers, json={
+        "current_password": "secret", "new_password": "again",
+    })
+    assert response.status_code == 401
+
+    # Writes through the API drop the cached row
+    response = await client.put("/users/update", headers=headers, json={
+        "email": "cached_user@test.com", "first_name": "Renamed", "last_name": "Lastname",
+    })
+    assert response.status_code == 200
+    assert (await client.get("/users/me", headers=headers)).json()["first_name"] == "Renamed"
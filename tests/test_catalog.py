@@ -0,0 +1,88 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+from rubhew import models, security
+from rubhew.routers import tags as tags_router
+
+
+@pytest.mark.asyncio
+async def test_catalog_served_from_memory(client: AsyncClient, session: models.AsyncSession):
+    await client.get("/tags/")
+    statements = []
+
+    def record_statement(*args, **kwargs):
+        statements.append(args[2])
+
+    event.listen(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        tags = await client.get("/tags/")
+        categories = await client.get("/categories/")
+    finally:
+        event.remove(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    assert tags.status_code == 200 and categories.status_code == 200
+    assert tags.headers["etag"] and categories.headers["etag"]
+    # Only the version counters behind the ETags are read
+    assert all("collection_versions" in statement for statement in statements)
+
+    # A write from elsewhere (another process) bumps the version and is picked up
+    session.add(models.Tags(name_tags="Catalog Tag"))
+    await session.commit()
+    response = await client.get("/tags/")
+    assert "Catalog Tag" in [tag["name_tags"] for tag in response.json()]
+
+    # Single tags come from the same snapshot
+    tag_id = next(tag["id_tags"] for tag in response.json() if tag["name_tags"] == "Catalog Tag")
+    statements.clear()
+    event.listen(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        tag = await tags_router.get_tag(tag_id, session)
+    finally:
+        event.remove(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    assert tag.name_tags == "Catalog Tag"
+    assert statements == []
+
+
+@pytest.mark.asyncio
+async def test_item_tags_and_validation_use_catalog(client: AsyncClient, session: models.AsyncSession):
+    seller = models.DBUser(
+        username="catalog_seller",
+        password="x",
+        email="catalog_seller@test.com",
+        first_name="Seller",
+        last_name="Lastname",
+    )
+    category = models.Category(name_category="Catalog Category", category_image="img")
+    session.add_all([seller, category])
+    await session.commit()
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': seller.id})}"}
+    superuser = models.DBUser(
+        username="catalog_admin",
+        password="x",
+        email="catalog_admin@test.com",
+        first_name="Admin",
+        last_name="Lastname",
+        role="admin",
+    )
+    session.add(superuser)
+    await session.commit()
+    admin_headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': superuser.id})}"}
+
+    response = await client.post("/tags/", headers=admin_headers, json={"name_tags": "Fresh Tag"})
+    assert response.status_code == 201
+    tag_id = response.json()["id_tags"]
+
+    # The tag created through the API is known without reloading anything
+    response = await client.post("/items/", headers=headers, json={
+        "name_item": "Catalog item", "description": "desc", "price": 1,
+        "category_id": category.id_category, "tags": [tag_id],
+    })
+    id_item = response.json()["id_item"]
+    response = await client.put(
+        f"/items/{id_item}", headers=headers, json={"category_id": category.id_category, "tags": [tag_id]}
+    )
+    assert response.status_code == 200
+    response = await client.get(f"/items/{id_item}", headers=headers)
+    assert response.json()["tags"] == [{"id_tags": tag_id, "name_tags": "Fresh Tag"}]
+
+    response = await client.put(f"/items/{id_item}", headers=headers, json={"category_id": 999999})
+    assert response.status_code == 400
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+from rubhew import coalesce, models, security
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_and_serves_stale(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(coalesce.time, "monotonic", lambda: now[0])
+    flight = coalesce.SingleFlight(ttl=1, grace=5)
+    calls = []
+    release = asyncio.Event()
+
+    async def compute():
+        calls.append(len(calls))
+        await release.wait()
+        return len(calls)
+
+    waiters = [asyncio.ensure_future(flight.get("key", compute)) for _ in range(10)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*waiters) == [1] * 10
+    assert len(calls) == 1
+
+    # Past the TTL but within the grace period: the stale value is returned
+    # at once and a single refresh runs in the background
+    now[0] += 2
+    release.clear()
+    assert [await flight.get("key", compute) for _ in range(3)] == [1, 1, 1]
+    await asyncio.sleep(0)
+    assert len(calls) == 2
+    release.set()
+    await asyncio.sleep(0)
+    assert await flight.get("key", compute) == 2
+
+    # Past the grace period callers wait for a fresh value
+    now[0] += 10
+    assert await flight.get("key", compute) == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_item_listings_coalesce(client: AsyncClient, session: models.AsyncSession):
+    seller = models.DBUser(
+        username="coalesced_seller",
+        password="x",
+        email="coalesced_seller@test.com",
+        first_name="Seller",
+        last_name="Lastname",
+    )
+    category = models.Category(name_category="Coalesced Category", category_image="img")
+    session.add_all([seller, category])
+    await session.commit()
+    session.add(models.Item(
+        name_item="Coalesced", description="desc", price=1, category_id=category.id_category, id_user=seller.id
+    ))
+    await session.commit()
+
+    statements = []
+
+    def record_statement(*args, **kwargs):
+        statements.append(args[2])
+
+    event.listen(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        responses = await asyncio.gather(*[
+            client.get("/items/", params={"id_user": seller.id, "limit": limit})
+            for limit in ("5", "5", "5", "5", "05")
+        ])
+    finally:
+        event.remove(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    assert {response.json()[0]["name_item"] for response in responses} == {"Coalesced"}
+    page_queries = [s for s in statements if s.startswith("SELECT items.id_item, items.created_at")]
+    assert len(page_queries) == 2  # "limit=05" is a different query string
+
+    # A write changes the key, so it is seen right away
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': seller.id})}"}
+    id_item = responses[0].json()[0]["id_item"]
+    response = await client.put(f"/items/{id_item}", headers=headers, json={"name_item": "Renamed"})
+    assert response.status_code == 200
+    response = await client.get("/items/", params={"id_user": seller.id, "limit": 5})
+    assert response.json()[0]["name_item"] == "Renamed"
@@ -0,0 +1,116 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.orm.exc import StaleDataError
+from rubhew import concurrency, models, security
+
+
+async def create_item(session: models.AsyncSession, prefix: str, requesters: int = 1):
+    users = [
+        models.DBUser(
+            username=f"{prefix}_{n}", password="x", email=f"{prefix}_{n}@test.com",
+            first_name="Firstname", last_name="Lastname",
+        )
+        for n in range(requesters + 1)
+    ]
+    category = models.Category(name_category=f"{prefix} Category", category_image="img")
+    session.add_all([*users, category])
+    await session.commit()
+    item = models.Item(
+        name_item=f"{prefix} item", description="desc", price=1,
+        category_id=category.id_category, id_user=users[0].id,
+    )
+    session.add(item)
+    await session.commit()
+    headers = [
+        {"Authorization": f"Bearer {security.create_access_token(data={'sub': user.id})}"}
+        for user in users
+    ]
+    return item, headers
+
+
+@pytest.mark.asyncio
+async def test_item_status_state_machine(client: AsyncClient, session: models.AsyncSession):
+    item, (owner_headers, buyer_headers) = await create_item(session, "machine")
+
+    response = await client.put(
+        f"/items/change_status/{item.id_item}", headers=owner_headers, json={"status": "Sold"}
+    )
+    assert response.status_code == 200
+    assert response.json()["status"] == "Sold"
+    response = await client.put(
+        f"/items/change_status/{item.id_item}", headers=owner_headers, json={"status": "Progress"}
+    )
+    assert response.status_code == 409
+    response = await client.put(
+        f"/items/change_status/{item.id_item}", headers=owner_headers, json={"status": "Lost"}
+    )
+    assert response.status_code == 422
+
+    # A sold item cannot be requested
+    response = await client.post("/requests/", headers=buyer_headers, json={"id_item": item.id_item})
+    assert response.status_code == 409
+
+    response = await client.put(
+        "/items/status", headers=owner_headers, json={"ids": [item.id_item, 0], "status": "Progress"}
+    )
+    assert response.json() == [
+        {"id_item": item.id_item, "outcome": "conflict"},
+        {"id_item": 0, "outcome": "not_found"},
+    ]
+    response = await client.put(f"/items/{item.id_item}", headers=owner_headers, json={"status": "Available"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "Available"
+
+
+@pytest.mark.asyncio
+async def test_stale_transition_is_retried(session: models.AsyncSession):
+    item, _ = await create_item(session, "stale")
+
+    async with models.new_session() as other_session:
+        other_item = await other_session.get(models.Item, item.id_item)
+        assert await concurrency.transition_item_status(session, item, "Sold")
+        await session.commit()
+
+        # Read before the commit above: the conditional UPDATE matches no row
+        with pytest.raises(StaleDataError):
+            await concurrency.transition_item_status(other_session, other_item, "Progress")
+        await other_session.rollback()
+
+        async def attempt():
+            current = await other_session.get(models.Item, item.id_item)
+            return await concurrency.transition_item_status(other_session, current, "Available")
+
+        # Re-read on retry: the change now starts from "Sold"
+        assert await concurrency.retry_on_conflict(other_session, attempt)
+        await other_session.commit()
+
+    await session.refresh(item)
+    assert (item.status, item.version) == ("Available", 3)
+
+
+@pytest.mark.asyncio
+async def test_requesters_share_one_transition(client: AsyncClient, session: models.AsyncSession):
+    item, (owner_headers, *buyers) = await create_item(session, "crowd", requesters=3)
+
+    for headers in buyers:
+        response = await client.post("/requests/", headers=headers, json={"id_item": item.id_item})
+        assert response.status_code == 201
+
+    await session.refresh(item)
+    # One transition to "Progress", not one write per requester
+    assert (item.status, item.version) == ("Progress", 2)
+    response = await client.get("/requests/counts", headers=owner_headers)
+    assert response.json()["incoming_pending"] == len(buyers)
+
+
+@pytest.mark.asyncio
+async def test_items_are_created_in_a_known_status(client: AsyncClient, session: models.AsyncSession):
+    item, (owner_headers, _) = await create_item(session, "created")
+    payload = {"name_item": "New item", "description": "desc", "price": 1, "category_id": item.category_id}
+
+    response = await client.post("/items/", headers=owner_headers, json={**payload, "status": "Lost"})
+    assert response.status_code == 422
+    response = await client.post("/items/bulk", headers=owner_headers, json=[{**payload, "status": "Lost"}])
+    assert response.status_code == 422
+    response = await client.post("/items/", headers=owner_headers, json=payload)
+    assert response.json()["status"] == "Available"
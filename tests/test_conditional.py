@@ -0,0 +1,57 @@
+import pytest
+from httpx import AsyncClient
+from rubhew import models
+
+
+@pytest.mark.asyncio
+async def test_categories_conditional_get(client: AsyncClient, session: models.AsyncSession):
+    response = await client.get("/categories/")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "public, no-cache"
+
+    response = await client.get("/categories/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    session.add(models.Category(name_category="Conditional Category", category_image="img"))
+    await session.commit()
+
+    response = await client.get("/categories/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert "Conditional Category" in [row["name_category"] for row in response.json()]
+
+
+@pytest.mark.asyncio
+async def test_items_etag_follows_items_and_tags(client: AsyncClient, session: models.AsyncSession):
+    etag = (await client.get("/items/")).headers["etag"]
+    assert (await client.get("/items/", headers={"If-None-Match": etag})).status_code == 304
+
+    tag = models.Tags(name_tags="Conditional Tag")
+    session.add(tag)
+    await session.commit()
+    tags_etag = (await client.get("/items/")).headers["etag"]
+    assert tags_etag != etag
+
+    # Writes that change nothing the items show keep the ETag
+    user = models.DBUser(
+        username="conditional_user",
+        password="x",
+        email="conditional_user@test.com",
+        first_name="Firstname",
+        last_name="Lastname",
+    )
+    session.add(user)
+    await session.commit()
+    etag = (await client.get("/items/")).headers["etag"]
+    user.password = "y"
+    session.add(user)
+    await session.commit()
+    assert (await client.get("/items/", headers={"If-None-Match": etag})).status_code == 304
+
+    user.first_name = "Renamed"
+    session.add(user)
+    await session.commit()
+    assert (await client.get("/items/", headers={"If-None-Match": etag})).status_code == 200
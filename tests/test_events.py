@@ -0,0 +1,145 @@
+import asyncio
+import json
+import pytest
+from httpx import AsyncClient
+from rubhew import events, models, security
+
+
+@pytest.mark.asyncio
+async def test_broker_delivers_per_user_and_resyncs_on_overflow():
+    broker = events.EventBroker(queue_size=2)
+    first, other = broker.subscribe(1), broker.subscribe(2)
+    await broker.publish([1], {"type": "request.updated", "data": {"id": 1}})
+    assert first.get_nowait()["data"] == {"id": 1}
+    assert other.empty()
+
+    for n in range(3):
+        await broker.publish([1], {"type": "request.updated", "data": {"id": n}})
+    # The backlog of a slow client is replaced by a single resync
+    assert first.get_nowait() == events.RESYNC
+    assert first.empty()
+
+    broker.unsubscribe(1, first)
+    broker.unsubscribe(2, other)
+    assert broker.subscribers == {}
+
+
+@pytest.mark.asyncio
+async def test_event_stream_encoding(monkeypatch):
+    monkeypatch.setattr(events, "broker", events.EventBroker())
+    monkeypatch.setattr(events, "keepalive", 0.01)
+    stream = events.iter_events(7)
+    assert await stream.__anext__() == b"retry: 5000\n\n"
+    assert await stream.__anext__() == b": keepalive\n\n"
+
+    await events.publish([7], "item.status", id_item=3, status="Progress")
+    message = await stream.__anext__()
+    assert message.startswith(b"event: item.status\ndata: ")
+    assert json.loads(message.split(b"data: ")[1]) == {"id_item": 3, "status": "Progress"}
+    await stream.aclose()
+    assert events.broker.subscribers == {}
+
+
+@pytest.mark.asyncio
+async def test_request_routes_publish_events(client: AsyncClient, session: models.AsyncSession):
+    owner = models.DBUser(
+        username="events_owner", password="x", email="events_owner@test.com",
+        first_name="Firstname", last_name="Lastname",
+    )
+    buyer = models.DBUser(
+        username="events_buyer", password="x", email="events_buyer@test.com",
+        first_name="Firstname", last_name="Lastname",
+    )
+    category = models.Category(name_category="Events Category", category_image="img")
+    session.add_all([owner, buyer, category])
+    await session.commit()
+    item = models.Item(
+        name_item="Evented item", description="desc", price=1,
+        category_id=category.id_category, id_user=owner.id,
+    )
+    session.add(item)
+    await session.commit()
+    owner_headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': owner.id})}"}
+    buyer_headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': buyer.id})}"}
+
+    broker = events.get_broker()
+    owner_events, buyer_events = broker.subscribe(owner.id), broker.subscribe(buyer.id)
+    try:
+        response = await client.post("/requests/", headers=buyer_headers, json={"id_item": item.id_item})
+        assert response.status_code == 201
+        id_request = response.json()["id"]
+        response = await client.put(
+            f"/requests/{id_request}/respond", headers=owner_headers, json={"res_message": "Yes"}
+        )
+        assert response.status_code == 200
+
+        for queue in (owner_events, buyer_events):
+            received = [queue.get_nowait() for _ in range(queue.qsize())]
+            assert received == [
+                {"type": "request.created", "data": {"id": id_request, "id_item": item.id_item}},
+                {"type": "item.status", "data": {"id_item": item.id_item, "status": "Progress"}},
+                {"type": "request.responded", "data": {"id": id_request, "id_item": item.id_item}},
+            ]
+    finally:
+        broker.unsubscribe(owner.id, owner_events)
+        broker.unsubscribe(buyer.id, buyer_events)
+
+
+@pytest.mark.asyncio
+async def test_redis_broker_reaches_other_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    first, second = [
+        events.RedisEventBroker(fakeredis.aioredis.FakeRedis(server=server)) for _ in range(2)
+    ]
+    local, remote = first.subscribe(5), second.subscribe(5)
+    await second.start()
+    try:
+        await first.publish([5], {"type": "request.deleted", "data": {"id": 9}})
+        assert local.get_nowait()["data"] == {"id": 9}
+        event = await asyncio.wait_for(remote.get(), 5)
+        assert event == {"type": "request.deleted", "data": {"id": 9}}
+    finally:
+        await second.close()
+        await first.close()
+
+
+@pytest.mark.asyncio
+async def test_transaction_events_reach_the_seller(client: AsyncClient, session: models.AsyncSession):
+    seller = models.DBUser(
+        username="events_seller", password="x", email="events_seller@test.com",
+        first_name="Firstname", last_name="Lastname",
+    )
+    customer = models.DBUser(
+        username="events_customer", password="x", email="events_customer@test.com",
+        first_name="Firstname", last_name="Lastname",
+    )
+    category = models.Category(name_category="Transaction Events Category", category_image="img")
+    session.add_all([seller, customer, category])
+    await session.commit()
+    item = models.Item(
+        name_item="Sold item", description="desc", price=1,
+        category_id=category.id_category, id_user=seller.id,
+    )
+    session.add(item)
+    await session.commit()
+    customer_headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': customer.id})}"}
+
+    broker = events.get_broker()
+    seller_events = broker.subscribe(seller.id)
+    try:
+        response = await client.post("/transactions/", headers=customer_headers, json={
+            "price": 1, "address": "addr", "receipt": "", "id_item": item.id_item, "id_user_customer": customer.id,
+        })
+        assert response.status_code == 200
+        id_transaction = response.json()["id_transaction"]
+        response = await client.put(f"/transactions/{id_transaction}/cancel", headers=customer_headers)
+        assert response.status_code == 200
+
+        received = [seller_events.get_nowait() for _ in range(seller_events.qsize())]
+        assert received == [
+            {"type": "transaction.created", "data": {"id_transaction": id_transaction}},
+            {"type": "transaction.updated", "data": {"id_transaction": id_transaction, "status": "Cancel"}},
+        ]
+    finally:
+        broker.unsubscribe(seller.id, seller_events)
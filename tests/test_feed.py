@@ -0,0 +1,98 @@
+import pytest
+from httpx import AsyncClient
+from rubhew import models, security
+
+
+@pytest.mark.asyncio
+async def test_feed_merges_followed_tags_and_categories(client: AsyncClient, session: models.AsyncSession):
+    user = models.DBUser(
+        username="feed_reader",
+        password="x",
+        email="feed_reader@test.com",
+        first_name="Firstname",
+        last_name="Lastname",
+    )
+    followed_category = models.Category(name_category="Followed Category", category_image="img")
+    other_category = models.Category(name_category="Other Category", category_image="img")
+    followed_tag = models.Tags(name_tags="Followed Tag")
+    session.add_all([user, followed_category, other_category, followed_tag])
+    await session.commit()
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': user.id})}"}
+
+    response = await client.get("/feed", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == []
+
+    for path in (f"tags/{followed_tag.id_tags}", f"categories/{followed_category.id_category}"):
+        response = await client.put(f"/profiles/me/following/{path}", headers=headers)
+        assert response.status_code == 204
+    expected = []
+    for i in range(7):
+        # Alternate between the followed category, the followed tag, both, and neither
+        in_category, tagged = i % 3 != 1, i % 3 != 0
+        item = models.Item(
+            name_item=f"Feed {i}",
+            description="desc",
+            price=1,
+            category_id=(followed_category if in_category else other_category).id_category,
+            id_user=user.id,
+        )
+        session.add(item)
+        await session.commit()
+        if tagged:
+            session.add(models.ItemTagsLink(item_id=item.id_item, tag_id=followed_tag.id_tags))
+        if in_category or tagged:
+            expected.insert(0, item.id_item)
+        session.add(models.Item(
+            name_item=f"Unfollowed {i}",
+            description="desc",
+            price=1,
+            category_id=other_category.id_category,
+            id_user=user.id,
+        ))
+    await session.commit()
+
+    item_ids, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/feed", headers=headers, params=params)
+        assert response.status_code == 200
+        item_ids += [item["id_item"] for item in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert item_ids == expected
+
+
+@pytest.mark.asyncio
+async def test_follow_and_unfollow(client: AsyncClient, session: models.AsyncSession):
+    user = models.DBUser(
+        username="follower",
+        password="x",
+        email="follower@test.com",
+        first_name="Firstname",
+        last_name="Lastname",
+    )
+    tags = [models.Tags(name_tags=f"Follow Tag {i}") for i in range(3)]
+    session.add_all([user, *tags])
+    await session.commit()
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': user.id})}"}
+    tag_ids = [tag.id_tags for tag in tags]
+
+    response = await client.put(f"/profiles/me/following/tags/{tag_ids[0]}", headers=headers)
+    assert response.status_code == 204
+    # Following twice is a no-op
+    response = await client.put(f"/profiles/me/following/tags/{tag_ids[0]}", headers=headers)
+    assert response.status_code == 204
+    response = await client.put("/profiles/me/following/tags/999999", headers=headers)
+    assert response.status_code == 404
+
+    response = await client.put(
+        "/profiles/updateMyFollowing", headers=headers, json={"tag_following": tag_ids[1:]}
+    )
+    assert response.status_code == 200
+    assert response.json()["tag_following"] == tag_ids[1:]
+
+    response = await client.delete(f"/profiles/me/following/tags/{tag_ids[1]}", headers=headers)
+    assert response.status_code == 204
+    assert await models.get_following(session, user.id) == (tag_ids[2:], [])
@@ -0,0 +1,69 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+from rubhew import item_cards, models, security
+
+
+def test_item_card_cache_bounds():
+    cache = item_cards.ItemCardCache(max_entries=3, max_bytes=100)
+    card = lambda size: item_cards.ItemCard(id_user=1, list_json=b"x" * size, detail_json=b"")
+
+    cache.put_many({1: card(10), 2: card(10), 3: card(10)}, cache.generation)
+    cache.get_many([1])  # 2 is now the least recently used
+    cache.put_many({4: card(10)}, cache.generation)
+    assert sorted(cache.cards) == [1, 3, 4]
+
+    cache.put_many({5: card(91)}, cache.generation)
+    assert sorted(cache.cards) == [5] and cache.size == 91
+
+    # Cards read before an invalidation are not stored
+    generation = cache.generation
+    cache.invalidate([5])
+    cache.put_many({5: card(10)}, generation)
+    assert cache.cards == {} and cache.size == 0
+
+
+@pytest.mark.asyncio
+async def test_item_cards_are_reused_and_invalidated(client: AsyncClient, session: models.AsyncSession):
+    seller = models.DBUser(
+        username="card_seller",
+        password="x",
+        email="card_seller@test.com",
+        first_name="Seller",
+        last_name="Lastname",
+    )
+    category = models.Category(name_category="Card Category", category_image="img")
+    session.add_all([seller, category])
+    await session.commit()
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': seller.id})}"}
+    response = await client.post("/items/", headers=headers, json={
+        "name_item": "Card", "description": "desc", "price": 1, "category_id": category.id_category,
+    })
+    id_item = response.json()["id_item"]
+    params = {"id_user": seller.id}
+
+    statements = []
+
+    def record_statement(*args, **kwargs):
+        statements.append(args[2])
+
+    event.listen(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        first = await client.get("/items/", params=params)
+        loads = len(statements)
+        statements.clear()
+        second = await client.get("/items/", params=params)
+    finally:
+        event.remove(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    assert first.json() == second.json()
+    assert second.json()[0]["user_profile"]["username"] == "card_seller"
+    # Only the page's keys (and the ETag's versions) are read once cards are cached
+    assert len(statements) < loads
+
+    response = await client.put(f"/items/{id_item}", headers=headers, json={"name_item": "Renamed card"})
+    assert response.status_code == 200
+    assert (await client.get("/items/", params=params)).json()[0]["name_item"] == "Renamed card"
+    assert (await client.get(f"/items/{id_item}", headers=headers)).json()["name_item"] == "Renamed card"
+
+    response = await client.put(f"/items/change_status/{id_item}", headers=headers, json={"status": "Sold"})
+    assert (await client.get("/items/", params=params)).json()[0]["status"] == "Sold"
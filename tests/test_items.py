@@ -27,4 +27,493 @@ async def test_list_items(client, user_token):
     response = await client.get("/items/", headers={"Authorization": f"Bearer {user_token}"})
     
     assert response.status_code == 200
-    assert isinstance(response.json(), list)  # Check that the response is a list
\ No newline at end of file
+    assert isinstance(response.json(), list)  # Check that the response is a list
+
+@pytest.mark.asyncio
+async def test_list_items_query_count_is_constant(client, session):
+    from sqlalchemy import event
+    from rubhew import models
+
+    owner = models.DBUser(
+        username="item_owner",
+        password="x",
+        email="item_owner@test.com",
+        first_name="Owner",
+        last_name="Lastname",
+    )
+    tag = models.Tags(name_tags="Assembler Tag")
+    category = models.Category(name_category="Assembler Category", category_image="img")
+    session.add(owner)
+    session.add(tag)
+    session.add(category)
+    await session.commit()
+    # Reload the catalog snapshot, made stale by the new tag and category,
+    # before counting
+    await client.get("/items/")
+
+    async def add_items(count):
+        for i in range(count):
+            item = models.Item(
+                name_item=f"Assembled {i}",
+                description="desc",
+                price=1.0,
+                category_id=category.id_category,
+                id_user=owner.id,
+            )
+            session.add(item)
+            await session.commit()
+            session.add(models.ItemTagsLink(item_id=item.id_item, tag_id=tag.id_tags))
+        await session.commit()
+
+    statements = []
+
+    def count_statement(*args, **kwargs):
+        statements.append(args[2])
+
+    async def count_queries():
+        statements.clear()
+        event.listen(models.engine.sync_engine, "before_cursor_execute", count_statement)
+        try:
+            response = await client.get("/items/")
+        finally:
+            event.remove(models.engine.sync_engine, "before_cursor_execute", count_statement)
+        assert response.status_code == 200
+        return len(statements), response.json()
+
+    await add_items(2)
+    few_queries, _ = await count_queries()
+    await add_items(10)
+    many_queries, items = await count_queries()
+
+    assert few_queries == many_queries
+    assembled = [item for item in items if item["name_item"].startswith("Assembled")]
+    assert len(assembled) == 12
+    assert assembled[0]["tags"] == [{"id_tags": tag.id_tags, "name_tags": "Assembler Tag"}]
+    assert assembled[0]["user_profile"]["username"] == "item_owner"
+
+
+@pytest.mark.asyncio
+async def test_list_items_keyset_pagination(client, session):
+    from rubhew import models
+
+    owner = models.DBUser(
+        username="page_owner",
+        password="x",
+        email="page_owner@test.com",
+        first_name="Owner",
+        last_name="Lastname",
+    )
+    category = models.Category(name_category="Paged Category", category_image="img")
+    session.add(owner)
+    session.add(category)
+    await session.commit()
+
+    for i in range(5):
+        session.add(models.Item(
+            name_item=f"Paged {i}",
+            description="desc",
+            price=float(i),
+            category_id=category.id_category,
+            id_user=owner.id,
+        ))
+    await session.commit()
+
+    async def walk(**params):
+        names, cursor = [], None
+        while True:
+            query = dict(params, category_id=category.id_category, limit=2)
+            if cursor:
+                query["cursor"] = cursor
+            response = await client.get("/items/", params=query)
+            assert response.status_code == 200
+            assert len(response.json()) <= 2
+            names += [item["name_item"] for item in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return names
+
+    assert await walk(sort="price_desc") == [f"Paged {i}" for i in reversed(range(5))]
+    assert await walk(sort="price_asc", min_price=1, max_price=3) == ["Paged 1", "Paged 2", "Paged 3"]
+    assert sorted(await walk(sort="newest")) == [f"Paged {i}" for i in range(5)]
+
+    tag = models.Tags(name_tags="Paged Tag")
+    session.add(tag)
+    await session.commit()
+    items = (await session.exec(
+        models.select(models.Item).where(models.Item.category_id == category.id_category)
+    )).all()
+    session.add_all([
+        models.ItemTagsLink(item_id=item.id_item, tag_id=tag.id_tags)
+        for item in items if item.name_item in ("Paged 0", "Paged 2", "Paged 4")
+    ])
+    await session.commit()
+    assert await walk(sort="price_desc", tag=tag.id_tags) == ["Paged 4", "Paged 2", "Paged 0"]
+
+    response = await client.get("/items/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_items_stays_in_sync(client, session):
+    from rubhew import models, security
+
+    seller = models.DBUser(
+        username="search_seller",
+        password="x",
+        email="search_seller@test.com",
+        first_name="Seller",
+        last_name="Lastname",
+    )
+    category = models.Category(name_category="Search Category", category_image="img")
+    session.add(seller)
+    session.add(category)
+    await session.commit()
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': seller.id})}"}
+
+    async def create(name, description):
+        response = await client.post("/items/", headers=headers, json={
+            "name_item": name,
+            "description": description,
+            "price": 10,
+            "category_id": category.id_category,
+        })
+        assert response.status_code == 201
+        return response.json()["id_item"]
+
+    async def search(q, **params):
+        response = await client.get("/items/search", params=dict(params, q=q))
+        assert response.status_code == 200
+        return response
+
+    camera_id = await create("Vintage zebracam", "Film camera in good condition")
+    bag_id = await create("Padded bag", "Fits a zebracam and two lenses")
+
+    response = await search("zebracam")
+    assert [item["id_item"] for item in response.json()] == [camera_id, bag_id]
+
+    first_page = await search("zebracam", limit=1)
+    assert [item["id_item"] for item in first_page.json()] == [camera_id]
+    second_page = await search("zebracam", limit=1, cursor=first_page.headers["X-Next-Cursor"])
+    assert [item["id_item"] for item in second_page.json()] == [bag_id]
+    assert "X-Next-Cursor" not in second_page.headers
+
+    response = await client.put(f"/items/{camera_id}", headers=headers, json={"name_item": "Vintage okapicam"})
+    assert response.status_code == 200
+    assert [item["id_item"] for item in (await search("okapicam")).json()] == [camera_id]
+
+    response = await client.delete(f"/items/{bag_id}", headers=headers)
+    assert response.status_code == 204
+    assert (await search("zebracam")).json() == []
+
+    # Thai text has no spaces between words
+    phone_id = await create("ขายโทรศัพท์มือถือสภาพดี", "ใช้งานได้ปกติ ราคา๑๒๐๐บาท")
+    assert [item["id_item"] for item in (await search("มือถือ")).json()] == [phone_id]
+    assert [item["id_item"] for item in (await search("สภาพดี 1200")).json()] == [phone_id]
+
+
+@pytest.mark.asyncio
+async def test_list_items_sparse_fieldset(client, session):
+    from sqlalchemy import event
+    from rubhew import models
+
+    owner = models.DBUser(
+        username="sparse_owner",
+        password="x",
+        email="sparse_owner@test.com",
+        first_name="Owner",
+        last_name="Lastname",
+    )
+    category = models.Category(name_category="Sparse Category", category_image="img")
+    session.add(owner)
+    session.add(category)
+    await session.commit()
+    for i in range(3):
+        session.add(models.Item(
+            name_item=f"Sparse {i}",
+            description="a long description " * 50,
+            price=float(i),
+            detail={"size": i},
+            category_id=category.id_category,
+            id_user=owner.id,
+        ))
+    await session.commit()
+
+    statements = []
+
+    def record_statement(*args, **kwargs):
+        statements.append(args[2])
+
+    event.listen(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        response = await client.get("/items/", params={
+            "category_id": category.id_category,
+            "sort": "price_asc",
+            "limit": 2,
+            "fields": "name_item,price",
+        })
+    finally:
+        event.remove(models.engine.sync_engine, "before_cursor_execute", record_statement)
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id_item": response.json()[0]["id_item"], "name_item": "Sparse 0", "price": 0.0},
+        {"id_item": response.json()[1]["id_item"], "name_item": "Sparse 1", "price": 1.0},
+    ]
+    assert "X-Next-Cursor" in response.headers
+    # Neither the large columns nor the tags and owner are read
+    item_statements = [statement for statement in statements if "collection_versions" not in statement]
+    assert len(item_statements) == 1
+    assert "description" not in item_statements[0] and "detail" not in item_statements[0]
+
+    response = await client.get("/items/", params={"fields": "name_item,password"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_list_items_ndjson_stream(client, session):
+    import json
+    from rubhew import models
+
+    owner = models.DBUser(
+        username="stream_owner",
+        password="x",
+        email="stream_owner@test.com",
+        first_name="Owner",
+        last_name="Lastname",
+    )
+    tag = models.Tags(name_tags="Streamed Tag")
+    category = models.Category(name_category="Streamed Category", category_image="img")
+    session.add(owner)
+    session.add(tag)
+    session.add(category)
+    await session.commit()
+    for i in range(7):
+        item = models.Item(
+            name_item=f"Streamed {i}",
+            description="desc",
+            price=float(i),
+            category_id=category.id_category,
+            id_user=owner.id,
+        )
+        session.add(item)
+        await session.commit()
+        session.add(models.ItemTagsLink(item_id=item.id_item, tag_id=tag.id_tags))
+    await session.commit()
+
+    params = {"category_id": category.id_category, "sort": "price_desc", "limit": 2}
+    response = await client.get("/items/", params=params, headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    streamed = [json.loads(line) for line in response.text.splitlines()]
+
+    # Same rows as paging through the JSON endpoint, but in one response
+    paged = (await client.get("/items/", params=dict(params, limit=200))).json()
+    assert streamed == paged
+    assert [item["name_item"] for item in streamed] == [f"Streamed {i}" for i in reversed(range(7))]
+    assert streamed[0]["tags"] == [{"id_tags": tag.id_tags, "name_tags": "Streamed Tag"}]
+
+    response = await client.get(
+        "/items/",
+        params=dict(params, fields="price"),
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert [json.loads(line)["price"] for line in response.text.splitlines()] == [6.0, 5.0, 4.0, 3.0, 2.0, 1.0, 0.0]
+
+
+@pytest.mark.asyncio
+async def test_create_items_bulk(client, session):
+    from rubhew import models, security
+
+    seller = models.DBUser(
+        username="bulk_seller",
+        password="x",
+        email="bulk_seller@test.com",
+        first_name="Seller",
+        last_name="Lastname",
+    )
+    tag = models.Tags(name_tags="Bulk Tag")
+    category = models.Category(name_category="Bulk Category", category_image="img")
+    session.add_all([seller, tag, category])
+    await session.commit()
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': seller.id})}"}
+
+    payload = [
+        {
+            "name_item": f"Bulk {i}",
+            "description": "desc",
+            "price": i,
+            "category_id": category.id_category,
+            "tags": [tag.id_tags] if i % 2 else [],
+        }
+        for i in range(5)
+    ]
+    response = await client.post("/items/bulk", json=payload, headers=headers)
+    assert response.status_code == 201
+    created = response.json()
+    assert [item["name_item"] for item in created] == [item["name_item"] for item in payload]
+
+    response = await client.get("/items/my-items/", headers=headers)
+    tags = {item["id_item"]: [t["id_tags"] for t in item["tags"]] for item in response.json()}
+    assert [tags[item["id_item"]] for item in created] == [item["tags"] for item in payload]
+
+    # An unknown id rejects the whole batch
+    payload.append({**payload[0], "category_id": 999999})
+    response = await client.post("/items/bulk", json=payload, headers=headers)
+    assert response.status_code == 400
+    response = await client.get("/items/my-items/", headers=headers)
+    assert len(response.json()) == 5
+
+
+@pytest.mark.asyncio
+async def test_bulk_status_and_delete(client, session):
+    from rubhew import models, security
+
+    seller, other = [
+        models.DBUser(
+            username=f"closing_{name}",
+            password="x",
+            email=f"closing_{name}@test.com",
+            first_name="Seller",
+            last_name="Lastname",
+        )
+        for name in ("seller", "other")
+    ]
+    tag = models.Tags(name_tags="Closing Tag")
+    category = models.Category(name_category="Closing Category", category_image="img")
+    session.add_all([seller, other, tag, category])
+    await session.commit()
+    items = [
+        models.Item(
+            name_item=f"Closing {i}",
+            description="desc",
+            price=1,
+            category_id=category.id_category,
+            id_user=(seller if i < 3 else other).id,
+        )
+        for i in range(4)
+    ]
+    session.add_all(items)
+    await session.commit()
+    session.add_all([models.ItemTagsLink(item_id=item.id_item, tag_id=tag.id_tags) for item in items])
+    await session.commit()
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': seller.id})}"}
+    ids = [item.id_item for item in items] + [999999]
+
+    # Oversize (or empty) batches are rejected whole, not truncated
+    response = await client.put(
+        "/items/status", json={"ids": ids * 101, "status": "Sold"}, headers=headers
+    )
+    assert response.status_code == 422
+    response = await client.put("/items/status", json={"ids": [], "status": "Sold"}, headers=headers)
+    assert response.status_code == 422
+
+    response = await client.put("/items/status", json={"ids": ids, "status": "Sold"}, headers=headers)
+    assert response.status_code == 200
+    assert [result["outcome"] for result in response.json()] == ["updated"] * 3 + ["not_found"] * 2
+
+    response = await client.delete("/items", params={"ids": ids}, headers=headers)
+    assert response.status_code == 200
+    assert [result["outcome"] for result in response.json()] == ["deleted"] * 3 + ["not_found"] * 2
+
+    remaining = (await session.exec(
+        models.select(models.Item.id_item, models.Item.status).where(models.Item.id_item.in_(ids))
+    )).all()
+    assert remaining == [(items[3].id_item, "Available")]
+    links = (await session.exec(
+        models.select(models.ItemTagsLink.item_id).where(models.ItemTagsLink.item_id.in_(ids))
+    )).all()
+    assert links == [items[3].id_item]
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_keeps_requested_items(client, session):
+    from rubhew import models, security
+
+    seller, buyer = [
+        models.DBUser(
+            username=f"requested_{name}",
+            password="x",
+            email=f"requested_{name}@test.com",
+            first_name="Seller",
+            last_name="Lastname",
+        )
+        for name in ("seller", "buyer")
+    ]
+    category = models.Category(name_category="Requested Category", category_image="img")
+    session.add_all([seller, buyer, category])
+    await session.commit()
+    items = [
+        models.Item(
+            name_item=f"Requested {i}", description="desc", price=1,
+            category_id=category.id_category, id_user=seller.id,
+        )
+        for i in range(2)
+    ]
+    session.add_all(items)
+    await session.commit()
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': seller.id})}"}
+    buyer_headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': buyer.id})}"}
+    response = await client.post("/requests/", json={"id_item": items[0].id_item}, headers=buyer_headers)
+    assert response.status_code == 201
+
+    ids = [item.id_item for item in items]
+    response = await client.delete("/items", params={"ids": ids}, headers=headers)
+    assert [result["outcome"] for result in response.json()] == ["conflict", "deleted"]
+    remaining = (await session.exec(
+        models.select(models.Item.id_item).where(models.Item.id_item.in_(ids))
+    )).all()
+    assert remaining == [items[0].id_item]
+    response = await client.delete(f"/items/{items[0].id_item}", headers=headers)
+    assert response.status_code == 409
+    response = await client.get("/requests/counts", headers=headers)
+    assert response.json()["incoming_pending"] == 1
+
+
+@pytest.mark.asyncio
+async def test_update_item_writes_only_changed_tag_links(client, session):
+    from sqlalchemy import event
+    from rubhew import models, security
+
+    seller = models.DBUser(
+        username="tag_editor",
+        password="x",
+        email="tag_editor@test.com",
+        first_name="Seller",
+        last_name="Lastname",
+    )
+    tags = [models.Tags(name_tags=f"Edit Tag {i}") for i in range(3)]
+    category = models.Category(name_category="Edit Category", category_image="img")
+    session.add_all([seller, category, *tags])
+    await session.commit()
+    item = models.Item(
+        name_item="Edited", description="desc", price=1, category_id=category.id_category, id_user=seller.id
+    )
+    session.add(item)
+    await session.commit()
+    session.add_all([models.ItemTagsLink(item_id=item.id_item, tag_id=tag.id_tags) for tag in tags[:2]])
+    await session.commit()
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': seller.id})}"}
+    statements = []
+
+    def record_statement(*args, **kwargs):
+        statements.append(args[2])
+
+    async def put_tags(tag_ids):
+        statements.clear()
+        event.listen(models.engine.sync_engine, "before_cursor_execute", record_statement)
+        try:
+            response = await client.put(f"/items/{item.id_item}", json={"tags": tag_ids}, headers=headers)
+        finally:
+            event.remove(models.engine.sync_engine, "before_cursor_execute", record_statement)
+        assert response.status_code == 200
+        writes = [s for s in statements if "item_tags_link" in s and not s.lstrip().startswith("SELECT")]
+        return sorted(tag["id_tags"] for tag in response.json()["tags"]), writes
+
+    ids = [tag.id_tags for tag in tags]
+    assert await put_tags([ids[1], ids[0]]) == (ids[:2], [])
+    tag_ids, writes = await put_tags(ids[1:])
+    assert tag_ids == ids[1:]
+    assert len(writes) == 2  # One DELETE of the dropped link, one INSERT of the new one
+
+    response = await client.put(f"/items/{item.id_item}", json={"tags": [999999]}, headers=headers)
+    assert response.status_code == 400
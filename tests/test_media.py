@@ -0,0 +1,122 @@
+import base64
+import io
+
+import pytest
+from httpx import AsyncClient
+from rubhew import models, security
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+
+async def create_user(session: models.AsyncSession, username: str) -> dict:
+    user = models.DBUser(
+        username=username,
+        password="x",
+        email=f"{username}@test.com",
+        first_name="Firstname",
+        last_name="Lastname",
+    )
+    session.add(user)
+    await session.commit()
+    return {"Authorization": f"Bearer {security.create_access_token(data={'sub': user.id})}"}
+
+
+@pytest.mark.asyncio
+async def test_upload_and_serve_media(client: AsyncClient, session: models.AsyncSession):
+    headers = await create_user(session, "media_uploader")
+
+    response = await client.post("/media/", headers=headers, files={"file": ("a.png", PNG, "image/png")})
+    assert response.status_code == 201
+    url = response.json()["url"]
+    assert url == f"/media/{response.json()['hash']}"
+
+    response = await client.get(url)
+    assert response.status_code == 200
+    assert response.content == PNG
+    assert response.headers["content-type"] == "image/png"
+    assert "immutable" in response.headers["cache-control"]
+
+    response = await client.post("/media/", headers=headers, files={"file": ("a.txt", b"hello", "text/plain")})
+    assert response.status_code == 400
+    assert (await client.get("/media/" + "0" * 64)).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_item_base64_images_are_stored_once(client: AsyncClient, session: models.AsyncSession):
+    headers = await create_user(session, "media_seller")
+    category = models.Category(name_category="Media Category", category_image="img")
+    session.add(category)
+    await session.commit()
+
+    encoded = base64.b64encode(PNG).decode()
+    response = await client.post("/items/", headers=headers, json={
+        "name_item": "Item with images",
+        "description": "desc",
+        "price": 1,
+        "category_id": category.id_category,
+        "images": [encoded, "data:image/png;base64," + encoded, "https://example.com/a.jpg"],
+    })
+    assert response.status_code == 201
+    images = response.json()["images"]
+    assert images[0] == images[1]
+    assert images[0].startswith("/media/")
+    assert images[2] == "https://example.com/a.jpg"
+
+
+@pytest.mark.asyncio
+async def test_item_base64_images_are_capped(client: AsyncClient, session: models.AsyncSession, monkeypatch):
+    from rubhew import media
+
+    headers = await create_user(session, "media_capped")
+    category = models.Category(name_category="Capped Category", category_image="img")
+    session.add(category)
+    await session.commit()
+    monkeypatch.setattr(media, "max_bytes", len(PNG))
+
+    async def create(image: bytes):
+        return await client.post("/items/", headers=headers, json={
+            "name_item": "Item with a large image", "description": "desc", "price": 1,
+            "category_id": category.id_category, "images": [base64.b64encode(image).decode()],
+        })
+
+    assert (await create(PNG)).status_code == 201
+    # Rejected once decoded, and before decoding when the text alone is too long
+    assert (await create(PNG + b"\x00")).status_code == 413
+    assert (await create(PNG + b"\x00" * 64)).status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_thumbnails_are_served_to_list_endpoints(client: AsyncClient, session: models.AsyncSession):
+    Image = pytest.importorskip("PIL.Image")
+    headers = await create_user(session, "thumbnail_seller")
+    category = models.Category(name_category="Thumbnail Category", category_image="img")
+    session.add(category)
+    await session.commit()
+
+    output = io.BytesIO()
+    Image.new("RGB", (1024, 768), "red").save(output, "PNG")
+    response = await client.post("/items/", headers=headers, json={
+        "name_item": "Item with a large image",
+        "description": "desc",
+        "price": 1,
+        "category_id": category.id_category,
+        "images": [base64.b64encode(output.getvalue()).decode()],
+    })
+    assert response.status_code == 201
+    original = response.json()["images"][0]
+    id_item = response.json()["id_item"]
+
+    # Thumbnails are rendered by a background task once the item is saved
+    response = await client.get(f"{original}/128")
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+    with Image.open(io.BytesIO(response.content)) as thumbnail:
+        assert max(thumbnail.size) == 128
+
+    assert (await client.get(f"{original}/100")).status_code == 404
+
+    # Lists get the card-sized thumbnail, the detail endpoint the original
+    response = await client.get("/items/my-items/", headers=headers)
+    assert response.json()[0]["images"] == [f"{original}/512"]
+    response = await client.get(f"/items/{id_item}", headers=headers)
+    assert response.json()["images"] == [original]
@@ -0,0 +1,278 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+from rubhew import models, security
+
+
+async def create_user(session: models.AsyncSession, username: str):
+    user = models.DBUser(
+        username=username,
+        password="x",
+        email=f"{username}@test.com",
+        first_name="Firstname",
+        last_name="Lastname",
+    )
+    session.add(user)
+    await session.commit()
+    return user, {"Authorization": f"Bearer {security.create_access_token(data={'sub': user.id})}"}
+
+
+@pytest.mark.asyncio
+async def test_my_requests_sparse_fieldset(client: AsyncClient, session: models.AsyncSession):
+    owner, owner_headers = await create_user(session, "detail_owner")
+    buyer, buyer_headers = await create_user(session, "detail_buyer")
+    category = models.Category(name_category="Detail Category", category_image="img")
+    session.add(category)
+    await session.commit()
+    item = models.Item(
+        name_item="Requested item",
+        description="desc",
+        price=1,
+        category_id=category.id_category,
+        id_user=owner.id,
+    )
+    session.add(item)
+    await session.commit()
+
+    response = await client.post(
+        "/requests/", headers=buyer_headers, json={"id_item": item.id_item, "message": "Still available?"}
+    )
+    assert response.status_code == 201
+    id_request = response.json()["id"]
+
+    response = await client.get("/requests/my-requests", headers=owner_headers)
+    assert response.status_code == 200
+    [detail] = response.json()
+    assert detail["sender"]["username"] == "detail_buyer"
+    assert detail["receiver"]["username"] == "detail_owner"
+    assert detail["item"]["name_item"] == "Requested item"
+
+    response = await client.get(
+        "/requests/my-requests", headers=owner_headers, params={"fields": "message,sender"}
+    )
+    assert response.status_code == 200
+    assert response.json() == [{
+        "id": id_request,
+        "message": "Still available?",
+        "sender": {
+            "username": "detail_buyer",
+            "email": "detail_buyer@test.com",
+            "first_name": "Firstname",
+            "last_name": "Lastname",
+        },
+    }]
+
+    response = await client.get("/requests/my-requests", headers=owner_headers, params={"fields": "secret"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_all_requests_ndjson_stream(client: AsyncClient, session: models.AsyncSession):
+    import json
+
+    owner, owner_headers = await create_user(session, "stream_request_owner")
+    buyer, buyer_headers = await create_user(session, "stream_request_buyer")
+    category = models.Category(name_category="Stream Request Category", category_image="img")
+    session.add(category)
+    await session.commit()
+    item = models.Item(
+        name_item="Streamed request item",
+        description="desc",
+        price=1,
+        category_id=category.id_category,
+        id_user=owner.id,
+    )
+    session.add(item)
+    await session.commit()
+    response = await client.post("/requests/", headers=buyer_headers, json={"id_item": item.id_item})
+    assert response.status_code == 201
+
+    expected = (await client.get("/requests/", headers=owner_headers)).json()
+    response = await client.get(
+        "/requests/", headers=dict(owner_headers, Accept="application/x-ndjson")
+    )
+    assert response.status_code == 200
+    assert [json.loads(line) for line in response.text.splitlines()] == expected
+
+
+@pytest.mark.asyncio
+async def test_my_requests_single_query_and_cursor(client: AsyncClient, session: models.AsyncSession):
+    owner, owner_headers = await create_user(session, "inbox_owner")
+    buyer, buyer_headers = await create_user(session, "inbox_buyer")
+    category = models.Category(name_category="Inbox Category", category_image="img")
+    session.add(category)
+    await session.commit()
+    items = [
+        models.Item(name_item=f"Inbox item {n}", description="desc", price=1,
+                    category_id=category.id_category, id_user=owner.id)
+        for n in range(3)
+    ]
+    session.add_all(items)
+    await session.commit()
+    for item in items:
+        response = await client.post("/requests/", headers=buyer_headers, json={"id_item": item.id_item})
+        assert response.status_code == 201
+
+    statements = []
+
+    def record_statement(*args, **kwargs):
+        statements.append(args[2])
+
+    event.listen(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        response = await client.get("/requests/my-requests", headers=owner_headers, params={"limit": 2})
+    finally:
+        event.remove(models.engine.sync_engine, "before_cursor_execute", record_statement)
+    assert response.status_code == 200
+    # Sender, receiver and item come from the same query as the requests
+    assert len([statement for statement in statements if "FROM requests" in statement]) == 1
+    assert len([statement for statement in statements if "FROM items" in statement]) == 0
+
+    first_page = response.json()
+    assert [detail["item"]["name_item"] for detail in first_page] == ["Inbox item 2", "Inbox item 1"]
+    assert first_page[0]["sender"]["username"] == "inbox_buyer"
+    response = await client.get(
+        "/requests/my-requests",
+        headers=owner_headers,
+        params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]},
+    )
+    assert [detail["item"]["name_item"] for detail in response.json()] == ["Inbox item 0"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_my_requests_merges_sent_and_received(client: AsyncClient, session: models.AsyncSession):
+    first, first_headers = await create_user(session, "inbox_first")
+    second, second_headers = await create_user(session, "inbox_second")
+    category = models.Category(name_category="Merged Inbox Category", category_image="img")
+    session.add(category)
+    await session.commit()
+    items = [
+        models.Item(name_item=f"Merged item {n}", description="desc", price=1,
+                    category_id=category.id_category, id_user=owner.id)
+        for n, owner in enumerate([first, second, first, second])
+    ]
+    session.add_all(items)
+    await session.commit()
+    # Received, sent, received, sent by the first user, oldest first
+    for item in items:
+        headers = second_headers if item.id_user == first.id else first_headers
+        response = await client.post("/requests/", headers=headers, json={"id_item": item.id_item})
+        assert response.status_code == 201
+
+    names, cursor = [], None
+    while True:
+        params = {"limit": 1, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/requests/my-requests", headers=first_headers, params=params)
+        names += [detail["item"]["name_item"] for detail in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert names == ["Merged item 3", "Merged item 2", "Merged item 1", "Merged item 0"]
+
+
+@pytest.mark.asyncio
+async def test_request_counts(client: AsyncClient, session: models.AsyncSession):
+    owner, owner_headers = await create_user(session, "counts_owner")
+    buyer, buyer_headers = await create_user(session, "counts_buyer")
+    category = models.Category(name_category="Counts Category", category_image="img")
+    session.add(category)
+    await session.commit()
+    items = [
+        models.Item(name_item=f"Counted item {n}", description="desc", price=1,
+                    category_id=category.id_category, id_user=owner.id)
+        for n in range(2)
+    ]
+    session.add_all(items)
+    await session.commit()
+
+    async def counts(headers):
+        response = await client.get("/requests/counts", headers=headers)
+        assert response.status_code == 200
+        return response.json()
+
+    assert await counts(owner_headers) == {"incoming_pending": 0, "outgoing_pending": 0, "unread_responses": 0}
+    id_requests = []
+    for item in items:
+        response = await client.post("/requests/", headers=buyer_headers, json={"id_item": item.id_item})
+        id_requests.append(response.json()["id"])
+    assert (await counts(owner_headers))["incoming_pending"] == 2
+    assert (await counts(buyer_headers))["outgoing_pending"] == 2
+
+    response = await client.put(
+        f"/requests/{id_requests[0]}/respond", headers=owner_headers, json={"res_message": "Deal"}
+    )
+    assert response.status_code == 200
+    assert response.json()["response_read"] is False
+    assert (await counts(owner_headers))["incoming_pending"] == 1
+    assert await counts(buyer_headers) == {"incoming_pending": 0, "outgoing_pending": 1, "unread_responses": 1}
+
+    response = await client.put(f"/requests/{id_requests[0]}/read", headers=owner_headers)
+    assert response.status_code == 403
+    response = await client.put(f"/requests/{id_requests[0]}/read", headers=buyer_headers)
+    assert response.status_code == 204
+    response = await client.delete(f"/requests/{id_requests[1]}", headers=buyer_headers)
+    assert response.status_code == 204
+    assert await counts(owner_headers) == {"incoming_pending": 0, "outgoing_pending": 0, "unread_responses": 0}
+    assert await counts(buyer_headers) == {"incoming_pending": 0, "outgoing_pending": 0, "unread_responses": 0}
+
+    # A rebuild from the requests agrees with the incremental counts
+    await client.put(f"/requests/{id_requests[0]}/respond", headers=owner_headers, json={"res_message": "Still?"})
+    expected = await counts(buyer_headers)
+    await models.rebuild_request_counters(session)
+    assert await counts(buyer_headers) == expected == {
+        "incoming_pending": 0, "outgoing_pending": 0, "unread_responses": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_request_messages(client: AsyncClient, session: models.AsyncSession):
+    owner, owner_headers = await create_user(session, "thread_owner")
+    buyer, buyer_headers = await create_user(session, "thread_buyer")
+    _, stranger_headers = await create_user(session, "thread_stranger")
+    category = models.Category(name_category="Thread Category", category_image="img")
+    session.add(category)
+    await session.commit()
+    item = models.Item(
+        name_item="Discussed item", description="desc", price=1,
+        category_id=category.id_category, id_user=owner.id,
+    )
+    session.add(item)
+    await session.commit()
+    response = await client.post("/requests/", headers=buyer_headers, json={"id_item": item.id_item})
+    id_request = response.json()["id"]
+    url = f"/requests/{id_request}/messages"
+
+    for n, headers in enumerate([buyer_headers, owner_headers, buyer_headers]):
+        response = await client.post(url, headers=headers, json={"body": f"Message {n}"})
+        assert response.status_code == 201
+    response = await client.post(url, headers=stranger_headers, json={"body": "Hi"})
+    assert response.status_code == 403
+    assert (await client.get(url, headers=stranger_headers)).status_code == 403
+
+    response = await client.get(url, headers=owner_headers, params={"limit": 2})
+    page = response.json()
+    assert [message["body"] for message in page] == ["Message 0", "Message 1"]
+    assert [message["id_user"] for message in page] == [buyer.id, owner.id]
+    response = await client.get(url, headers=owner_headers, params={"after": page[-1]["id"]})
+    page = response.json()
+    assert [message["body"] for message in page] == ["Message 2"]
+
+    # A long poll after the last message returns as soon as a new one is posted
+    poll = asyncio.create_task(
+        client.get(url, headers=owner_headers, params={"after": page[-1]["id"], "wait": 10})
+    )
+    await asyncio.sleep(0.1)
+    assert not poll.done()
+    response = await client.post(url, headers=buyer_headers, json={"body": "Any news?"})
+    assert response.status_code == 201
+    response = await asyncio.wait_for(poll, 5)
+    assert [message["body"] for message in response.json()] == ["Any news?"]
+
+    # Nothing new: an empty answer once the wait ends
+    response = await client.get(url, headers=owner_headers, params={"after": response.json()[-1]["id"], "wait": 0.05})
+    assert response.json() == []
+
+    assert (await client.delete(f"/requests/{id_request}", headers=buyer_headers)).status_code == 204
+    assert (await client.get(url, headers=owner_headers)).status_code == 404
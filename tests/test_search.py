@@ -0,0 +1,72 @@
+import pytest
+from httpx import AsyncClient
+from rubhew import models, security
+from rubhew.models.fuzzy import TrigramIndex
+
+
+def test_trigram_index_ranks_closest_names_first():
+    index = TrigramIndex()
+    index.add(1, "Keyboard")
+    index.add(2, "Keyboard cover")
+    index.add(3, "Bicycle")
+
+    assert [id_ for id_, _, _ in index.search("keybord", 10)] == [1, 2]
+    assert [id_ for id_, _, _ in index.search("keybord", 1)] == [1]
+
+    index.add(2, "Mouse pad")
+    assert [id_ for id_, _, _ in index.search("keybord", 10)] == [1]
+    index.remove(1)
+    assert index.search("keybord", 10) == []
+
+
+def test_trigram_index_finds_misspelt_thai_words():
+    index = TrigramIndex()
+    index.add(1, "เคสโทรศัพท์มือถือ สีดำ")
+    index.add(2, "จักรยาน")
+
+    # Thai has no spaces: "โทรศัพ" (for "โทรศัพท์") is matched against the
+    # tokenizer's words, not the whole run "เคสโทรศัพท์มือถือ"
+    assert [id_ for id_, _, _ in index.search("โทรศัพ", 10)] == [1]
+    assert [id_ for id_, _, _ in index.search("มือถอ", 10)] == [1]
+    assert [id_ for id_, _, _ in index.search("จักรยาร", 10)] == [2]
+
+
+@pytest.mark.asyncio
+async def test_fuzzy_search(client: AsyncClient, session: models.AsyncSession):
+    admin = models.DBUser(
+        username="fuzzy_admin",
+        password="x",
+        email="fuzzy_admin@test.com",
+        first_name="Admin",
+        last_name="Lastname",
+        role="admin",
+    )
+    category = models.Category(name_category="Fuzzy Category", category_image="img")
+    session.add(admin)
+    session.add(category)
+    await session.commit()
+    headers = {"Authorization": f"Bearer {security.create_access_token(data={'sub': admin.id})}"}
+
+    response = await client.post("/tags/", headers=headers, json={"name_tags": "Photography"})
+    assert response.status_code == 201
+    tag_id = response.json()["id_tags"]
+    response = await client.post("/items/", headers=headers, json={
+        "name_item": "Polaroid instant camera",
+        "description": "desc",
+        "price": 10,
+        "category_id": category.id_category,
+    })
+    assert response.status_code == 201
+    item_id = response.json()["id_item"]
+
+    response = await client.get("/search/fuzzy", params={"q": "polariod camera"})
+    assert response.status_code == 200
+    assert [match["id_item"] for match in response.json()["items"]] == [item_id]
+
+    response = await client.get("/search/fuzzy", params={"q": "fotography"})
+    assert [match["id_tags"] for match in response.json()["tags"]] == [tag_id]
+
+    response = await client.delete(f"/items/{item_id}", headers=headers)
+    assert response.status_code == 204
+    response = await client.get("/search/fuzzy", params={"q": "polariod camera"})
+    assert response.json()["items"] == []
@@ -0,0 +1,148 @@
+import datetime
+
+import pytest
+from httpx import AsyncClient
+from rubhew import models, security
+from rubhew.routers import sync
+
+
+async def create_user(session: models.AsyncSession, username: str):
+    user = models.DBUser(
+        username=username,
+        password="x",
+        email=f"{username}@test.com",
+        first_name="Firstname",
+        last_name="Lastname",
+    )
+    session.add(user)
+    await session.commit()
+    return user, {"Authorization": f"Bearer {security.create_access_token(data={'sub': user.id})}"}
+
+
+@pytest.mark.asyncio
+async def test_sync_returns_only_changes(client: AsyncClient, session: models.AsyncSession, monkeypatch):
+    monkeypatch.setattr(sync, "SYNC_OVERLAP", datetime.timedelta(0))
+    seller, headers = await create_user(session, "sync_seller")
+    buyer, buyer_headers = await create_user(session, "sync_buyer")
+    category = models.Category(name_category="Sync Category", category_image="img")
+    tag = models.Tags(name_tags="Sync Tag")
+    session.add(category)
+    session.add(tag)
+    await session.commit()
+
+    async def create(name):
+        response = await client.post("/items/", headers=headers, json={
+            "name_item": name, "description": "desc", "price": 1, "category_id": category.id_category,
+        })
+        return response.json()["id_item"]
+
+    kept_id, changed_id, deleted_id = await create("Kept"), await create("Changed"), await create("Deleted")
+
+    response = await client.get("/sync", headers=headers)
+    assert response.status_code == 200
+    full = response.json()
+    assert {kept_id, changed_id, deleted_id} <= {item["id_item"] for item in full["items"]}
+    assert category.id_category in [row["id_category"] for row in full["categories"]]
+
+    # Nothing changed: nothing but a new token
+    response = await client.get("/sync", headers=headers, params={"since": full["token"]})
+    empty = response.json()
+    assert empty["items"] == empty["requests"] == empty["tags"] == empty["categories"] == []
+
+    # Tag-only updates, status changes from requests and deletes are all picked up
+    await client.put(f"/items/{changed_id}", headers=headers, json={"tags": [tag.id_tags]})
+    await client.post("/requests/", headers=buyer_headers, json={"id_item": kept_id})
+    await client.delete(f"/items/{deleted_id}", headers=headers)
+
+    changes = (await client.get("/sync", headers=headers, params={"since": empty["token"]})).json()
+    assert sorted(item["id_item"] for item in changes["items"]) == [kept_id, changed_id]
+    assert [request["id_item"] for request in changes["requests"]] == [kept_id]
+    assert changes["deleted"]["items"] == [deleted_id]
+
+    response = await client.get("/sync", headers=headers, params={"since": "bogus"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_sync_sends_private_tombstones_to_parties_only(
+    client: AsyncClient, session: models.AsyncSession, monkeypatch
+):
+    monkeypatch.setattr(sync, "SYNC_OVERLAP", datetime.timedelta(0))
+    seller, seller_headers = await create_user(session, "tomb_seller")
+    buyer, buyer_headers = await create_user(session, "tomb_buyer")
+    _, stranger_headers = await create_user(session, "tomb_stranger")
+    category = models.Category(name_category="Tombstone Category", category_image="img")
+    session.add(category)
+    await session.commit()
+    item = models.Item(
+        name_item="Tombstoned", description="desc", price=1,
+        category_id=category.id_category, id_user=seller.id,
+    )
+    session.add(item)
+    await session.commit()
+    response = await client.post("/requests/", headers=buyer_headers, json={"id_item": item.id_item})
+    id_request = response.json()["id"]
+    transaction = models.Transaction(
+        price=1, address="addr", receipt="", id_item=item.id_item, id_user_customer=buyer.id
+    )
+    session.add(transaction)
+    await session.commit()
+    id_transaction = transaction.id_transaction
+
+    tokens = {
+        name: (await client.get("/sync", headers=headers)).json()["token"]
+        for name, headers in [("seller", seller_headers), ("buyer", buyer_headers), ("stranger", stranger_headers)]
+    }
+    assert (await client.delete(f"/requests/{id_request}", headers=buyer_headers)).status_code == 204
+    await session.delete(transaction)
+    await session.commit()
+    deleted_category = models.Category(name_category="Dropped Category", category_image="img")
+    session.add(deleted_category)
+    await session.commit()
+    await session.delete(deleted_category)
+    await session.commit()
+
+    for name, headers in [("seller", seller_headers), ("buyer", buyer_headers)]:
+        deleted = (await client.get("/sync", headers=headers, params={"since": tokens[name]})).json()["deleted"]
+        assert deleted["requests"] == [id_request]
+        assert deleted["transactions"] == [id_transaction]
+        assert deleted["categories"] == [deleted_category.id_category]
+
+    # Not a party to either: only the catalogue delete
+    deleted = (await client.get("/sync", headers=stranger_headers, params={"since": tokens["stranger"]})).json()["deleted"]
+    assert deleted["requests"] == deleted["transactions"] == []
+    assert deleted["categories"] == [deleted_category.id_category]
+
+
+@pytest.mark.asyncio
+async def test_sync_sends_transactions_to_the_seller(client: AsyncClient, session: models.AsyncSession, monkeypatch):
+    monkeypatch.setattr(sync, "SYNC_OVERLAP", datetime.timedelta(0))
+    seller, seller_headers = await create_user(session, "sale_seller")
+    customer, customer_headers = await create_user(session, "sale_customer")
+    _, stranger_headers = await create_user(session, "sale_stranger")
+    category = models.Category(name_category="Sale Category", category_image="img")
+    session.add(category)
+    await session.commit()
+    item = models.Item(
+        name_item="Sold online", description="desc", price=1,
+        category_id=category.id_category, id_user=seller.id,
+    )
+    session.add(item)
+    await session.commit()
+    tokens = {
+        name: (await client.get("/sync", headers=headers)).json()["token"]
+        for name, headers in [("seller", seller_headers), ("stranger", stranger_headers)]
+    }
+
+    response = await client.post("/transactions/", headers=customer_headers, json={
+        "price": 1, "address": "addr", "receipt": "", "id_item": item.id_item, "id_user_customer": customer.id,
+    })
+    id_transaction = response.json()["id_transaction"]
+    await client.put(f"/transactions/{id_transaction}/cancel", headers=customer_headers)
+
+    changes = (await client.get("/sync", headers=seller_headers, params={"since": tokens["seller"]})).json()
+    assert [(row["id_transaction"], row["status"]) for row in changes["transactions"]] == [
+        (id_transaction, "Cancel")
+    ]
+    changes = (await client.get("/sync", headers=stranger_headers, params={"since": tokens["stranger"]})).json()
+    assert changes["transactions"] == []
@@ -0,0 +1,31 @@
+from rubhew import tokenizers
+
+
+def test_thai_maximal_matching():
+    tokenizer = tokenizers.get_tokenizer("thai")
+
+    assert tokenizer.tokenize("ขายโทรศัพท์มือถือสภาพดีราคาถูก") == [
+        "ขาย", "โทรศัพท์มือถือ", "สภาพดี", "ราคาถูก"
+    ]
+    # Latin words and numbers are split out of Thai runs and lowercased
+    assert tokenizer.tokenize("iPhoneสีขาว 128GB") == ["iphone", "สีขาว", "128gb"]
+    # Unknown text is kept as one token instead of single letters
+    assert tokenizer.tokenize("ขายกอฮฮฮโทรศัพท์") == ["ขาย", "กอฮฮฮ", "โทรศัพท์"]
+
+
+def test_compound_words_are_indexed_with_their_parts():
+    tokenizer = tokenizers.get_tokenizer("thai")
+
+    terms = tokenizer.index_terms("โทรศัพท์มือถือ")
+    assert terms[0] == "โทรศัพท์มือถือ"
+    assert {"โทรศัพท์", "มือถือ", "มือ", "ถือ"} <= set(terms)
+    assert tokenizer.query_terms("มือถือ") == ["มือถือ"]
+
+
+def test_normalize_thai_digits_and_marks():
+    assert tokenizers.normalize("๑๒๘") == "128"
+    # nikhahit + sara aa is the same character as sara am
+    assert tokenizers.normalize("นํ้า") == tokenizers.normalize("น้ํา") == "น้ำ"
+    # tone mark typed before the vowel, and a repeated tone mark
+    assert tokenizers.normalize("ก่ี") == "กี่"
+    assert tokenizers.normalize("ก่่า") == "ก่า"